@@ -0,0 +1 @@
+# Benchmarks do dashboard ( executar a partir da raiz do repositório )
@@ -0,0 +1,216 @@
+"""
+    Teste de carga da API de KPIs ( core/api.py ): vazão e latência p50 / p90 / p99
+
+    Abre --connections conexões keep-alive e, em cada cenário, faz requisições
+    pelo tempo de --duration segundos:
+
+    - cold: cada requisição com um filtro sorteado ( data e trânsito ), então a
+      maioria calcula a consulta no pool de threads do servidor
+    - warm: as consultas com os filtros padrão, servidas do cache de respostas
+    - conditional: as mesmas, com If-None-Match ( respostas 304, sem corpo )
+
+    Sem --url um servidor é iniciado em outro processo sobre um csv sintético
+    ( ou reamostrado de --source ) e encerrado no fim.
+
+    Uso:
+        python -m benchmarks.bench_api --rows 45000 --connections 16 --duration 10
+        python -m benchmarks.bench_api --url http://127.0.0.1:8600 --scenarios warm conditional
+"""
+# Bibliotecas
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode, urlsplit
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import resample_csv
+from benchmarks.synthetic import synthetic_csv
+from core.api import QUERY_PARAMS, TRAFFIC_OPTIONS
+from core.query import QUERIES
+
+SCENARIOS = ['cold', 'warm', 'conditional']
+
+# Datas sorteadas no cenário cold ( o intervalo do slider das páginas )
+DATE_RANGE = ( pd.Timestamp( 2022, 2, 11 ), pd.Timestamp( 2022, 4, 6 ) )
+
+
+def targets( scenario, n, seed=42 ):
+    """
+        Essa função gera os alvos ( caminho e query string ) das requisições de um cenário
+
+        Input: Cenário, quantidade de alvos e semente
+        Output: Lista de strings
+    """
+    nomes = list( QUERIES )
+    if scenario != 'cold':
+        return ['/v1/queries/' + nome for nome in nomes]
+
+    rng = np.random.default_rng( seed )
+    dias = ( DATE_RANGE[1] - DATE_RANGE[0] ).days + 1
+    alvos = []
+    for _ in range( n ):
+        data = DATE_RANGE[0] + pd.Timedelta( days=int( rng.integers( dias ) ) )
+        transito = [t for t in TRAFFIC_OPTIONS if rng.random() < 0.7] or TRAFFIC_OPTIONS[:1]
+        nome = nomes[rng.integers( len( nomes ) )]
+        params = { 'date': data.strftime( '%Y-%m-%d' ), 'traffic': ','.join( transito ) }
+        if nome in QUERY_PARAMS:
+            params['k'] = int( rng.choice( [5, 10, 20] ) )
+        alvos.append( '/v1/queries/{}?{}'.format( nome, urlencode( params ) ) )
+
+    return alvos
+
+
+async def _request( reader, writer, host, target, etag=None ):
+    linhas = ['GET {} HTTP/1.1'.format( target ), 'Host: {}'.format( host ), 'Accept: application/json']
+    if etag:
+        linhas.append( 'If-None-Match: {}'.format( etag ) )
+    writer.write( ( '\r\n'.join( linhas ) + '\r\n\r\n' ).encode( 'latin-1' ) )
+    await writer.drain()
+
+    status = int( ( await reader.readline() ).split()[1] )
+    tamanho, etag = 0, None
+    while True:
+        linha = await reader.readline()
+        if not linha.strip():
+            break
+        nome, _, valor = linha.decode( 'latin-1' ).partition( ':' )
+        nome = nome.strip().lower()
+        if nome == 'content-length':
+            tamanho = int( valor )
+        elif nome == 'etag':
+            etag = valor.strip()
+    corpo = await reader.readexactly( tamanho ) if tamanho else b''
+
+    return status, etag, corpo
+
+
+async def _worker( url, alvos, inicio, duration, etags, latencias, status ):
+    host, port = url.hostname, url.port or 80
+    reader, writer = await asyncio.open_connection( host, port )
+    i = inicio
+    try:
+        fim = time.perf_counter() + duration
+        while time.perf_counter() < fim:
+            alvo = alvos[i % len( alvos )]
+            i += 1
+            t0 = time.perf_counter()
+            codigo, _, _ = await _request( reader, writer, url.netloc, alvo, etags.get( alvo ) )
+            latencias.append( time.perf_counter() - t0 )
+            status[codigo] = status.get( codigo, 0 ) + 1
+    finally:
+        writer.close()
+
+
+async def run_scenario( base_url, scenario, connections=16, duration=10.0, seed=42 ):
+    """
+        Essa função executa um cenário do teste de carga
+
+        Input: URL do servidor, cenário, conexões simultâneas, duração ( segundos ) e semente
+        Output: Dicionário com vazão, latências ( ms ) e contagem de status
+    """
+    url = urlsplit( base_url )
+    alvos = targets( scenario, 100_000, seed )
+
+    # warm e conditional: uma passada antes para preencher o cache e obter os ETags
+    etags = {}
+    if scenario != 'cold':
+        reader, writer = await asyncio.open_connection( url.hostname, url.port or 80 )
+        for alvo in alvos:
+            _, etag, _ = await _request( reader, writer, url.netloc, alvo )
+            if scenario == 'conditional':
+                etags[alvo] = etag
+        writer.close()
+
+    latencias, status = [], {}
+    inicio = time.perf_counter()
+    await asyncio.gather( *[_worker( url, alvos, c * len( alvos ) // connections, duration, etags, latencias, status )
+                            for c in range( connections )] )
+    decorrido = time.perf_counter() - inicio
+
+    ms = np.asarray( latencias ) * 1000
+    return { 'scenario': scenario, 'connections': connections, 'requests': len( ms ),
+             'throughput': len( ms ) / decorrido,
+             'p50_ms': float( np.percentile( ms, 50 ) ), 'p90_ms': float( np.percentile( ms, 90 ) ),
+             'p99_ms': float( np.percentile( ms, 99 ) ), 'max_ms': float( ms.max() ),
+             'status': { str( k ): v for k, v in sorted( status.items() ) } }
+
+
+def start_server( path, backend=None, workers=None ):
+    """
+        Essa função inicia o servidor da API em outro processo, em uma porta livre
+
+        Input: csv do dataset, backend e threads do pool ( None usa os padrões do servidor )
+        Output: Tupla ( processo, URL do servidor )
+    """
+    comando = [sys.executable, '-m', 'core.api', '--port', '0', '--path', path]
+    if backend:
+        comando += ['--backend', backend]
+    if workers:
+        comando += ['--workers', str( workers )]
+
+    # O servidor calcula localmente, mesmo com CURRY_API_URL no ambiente
+    ambiente = { k: v for k, v in os.environ.items() if k != 'CURRY_API_URL' }
+    processo = subprocess.Popen( comando, stdout=subprocess.PIPE, env=ambiente, text=True )
+    linha = processo.stdout.readline()
+    if not linha:
+        processo.wait()
+        sys.exit( 'O servidor da API não iniciou ( código {} )'.format( processo.returncode ) )
+
+    return processo, linha.split()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--url', default=None, help='servidor já iniciado ( sem ele, um é iniciado )' )
+    parser.add_argument( '--rows', type=int, default=45_000 )
+    parser.add_argument( '--source', default=None, help='csv reamostrado no lugar do gerador sintético' )
+    parser.add_argument( '--seed', type=int, default=42 )
+    parser.add_argument( '--backend', default=None, choices=['pandas', 'duckdb'] )
+    parser.add_argument( '--workers', type=int, default=None, help='threads do pool do servidor' )
+    parser.add_argument( '--connections', type=int, default=16 )
+    parser.add_argument( '--duration', type=float, default=10.0 )
+    parser.add_argument( '--scenarios', nargs='+', default=SCENARIOS, choices=SCENARIOS )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    parser.add_argument( '--output', default=None, help='arquivo JSON com os resultados' )
+    args = parser.parse_args()
+
+    processo, url = None, args.url
+    if url is None:
+        if args.source:
+            path = resample_csv( args.source, args.rows, os.path.join( args.workdir, 'train_{}.csv'.format( args.rows ) ),
+                                 seed=args.seed )
+        else:
+            path = synthetic_csv( args.rows, os.path.join( args.workdir, 'synthetic_{}_{}.csv'.format( args.rows, args.seed ) ),
+                                  seed=args.seed )
+        processo, url = start_server( path, args.backend, args.workers )
+
+    print( '{:>12} {:>6} {:>9} {:>10} {:>9} {:>9} {:>9}  {}'.format(
+        'cenário', 'conex', 'reqs', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'status' ) )
+    resultados = []
+    try:
+        for scenario in args.scenarios:
+            r = asyncio.run( run_scenario( url, scenario, args.connections, args.duration, args.seed ) )
+            resultados.append( r )
+            print( '{:>12} {:>6} {:>9} {:>10.1f} {:>9.2f} {:>9.2f} {:>9.2f}  {}'.format(
+                scenario, r['connections'], r['requests'], r['throughput'], r['p50_ms'], r['p90_ms'], r['p99_ms'],
+                r['status'] ), flush=True )
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+
+    if args.output:
+        with open( args.output, 'w' ) as f:
+            json.dump( { 'url': url, 'rows': args.rows if args.url is None else None, 'results': resultados }, f, indent=1 )
+
+
+if __name__ == '__main__':
+    main()
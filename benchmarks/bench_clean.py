@@ -0,0 +1,75 @@
+"""
+    Benchmark da limpeza: clean_code original x clean_code vetorizado ( core/data.py )
+
+    Uso:
+        python -m benchmarks.bench_clean --source train.csv --sizes 45000 1000000 10000000
+"""
+# Bibliotecas
+import argparse
+import os
+import tempfile
+
+# Bibliotecas necessárias
+import pandas as pd
+
+from benchmarks.common import fmt_bytes, measure, resample_csv
+from benchmarks.legacy import legacy_load
+from core.data import clean_code, read_raw
+from core.geo import RESTAURANT_COLUMNS
+
+
+def new_load( path ):
+    return clean_code( read_raw( path ) )
+
+
+def check_parity( path ):
+    """
+        Essa função confere se as duas limpezas geram o mesmo dataframe
+
+        As coordenadas do restaurante ( sinal corrigido ) e a coluna distance
+        não existem na limpeza original, e a week_of_year ( semana '%U' ) não
+        existe na nova: ficam de fora da comparação. A nova
+        limpeza ordena as linhas por data, então a comparação é feita pelo índice.
+
+        Input: Caminho do csv
+        Output: None ( levanta AssertionError se forem diferentes )
+    """
+    old = legacy_load( path )
+    new = new_load( path )
+
+    cols = [col for col in old.columns if col not in RESTAURANT_COLUMNS and col != 'week_of_year']
+    old, new = old[cols], new[cols].sort_index()
+
+    for col in new.columns:
+        if isinstance( new[col].dtype, pd.CategoricalDtype ):
+            new[col] = new[col].astype( object )
+
+    pd.testing.assert_frame_equal( old, new, check_dtype=False )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--source', default='train.csv' )
+    parser.add_argument( '--sizes', nargs='+', type=int, default=[45_000, 1_000_000, 10_000_000] )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    args = parser.parse_args()
+
+    check_parity( args.source )
+    print( 'Paridade ok: clean_code original == clean_code vetorizado' )
+
+    print( '{:>12} {:>10} {:>12} {:>12} {:>12} {:>8}'.format(
+        'linhas', 'versão', 'tempo (s)', 'pico mem', 'linhas/s', 'ganho' ) )
+    for size in args.sizes:
+        path = resample_csv( args.source, size, os.path.join( args.workdir, 'train_{}.csv'.format( size ) ) )
+
+        _, old_time, old_peak = measure( legacy_load, path )
+        _, new_time, new_peak = measure( new_load, path )
+
+        for name, seconds, peak in [( 'original', old_time, old_peak ), ( 'vetorizado', new_time, new_peak )]:
+            print( '{:>12} {:>10} {:>12.3f} {:>12} {:>12.0f} {:>8}'.format(
+                size, name, seconds, fmt_bytes( peak ), size / seconds,
+                '{:.1f}x'.format( old_time / seconds ) ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+    Benchmark da distância: apply linha a linha com o pacote haversine x haversine vetorizado
+
+    Uso:
+        python -m benchmarks.bench_distance --sizes 45000 1000000 10000000
+"""
+# Bibliotecas
+import argparse
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+from haversine import haversine as haversine_row
+
+from benchmarks.common import fmt_bytes, measure
+from core.geo import haversine
+
+# O apply é medido em uma amostra e extrapolado ( leva minutos em 10M linhas )
+ROW_SAMPLE = 100_000
+
+
+def random_points( n_rows, seed=42 ):
+    rng = np.random.default_rng( seed )
+    lat = rng.uniform( 10, 30, n_rows )
+    lon = rng.uniform( 70, 90, n_rows )
+
+    return pd.DataFrame( {
+        'Restaurant_latitude': lat,
+        'Restaurant_longitude': lon,
+        'Delivery_location_latitude': lat + rng.uniform( -0.1, 0.1, n_rows ),
+        'Delivery_location_longitude': lon + rng.uniform( -0.1, 0.1, n_rows ),
+    } )
+
+
+def row_wise( df ):
+    return df.apply( lambda x:
+                     haversine_row(
+                         (x['Restaurant_latitude'], x['Restaurant_longitude']),
+                         (x['Delivery_location_latitude'], x['Delivery_location_longitude']) ), axis=1 )
+
+
+def vectorized( df, dtype ):
+    return haversine( df['Restaurant_latitude'], df['Restaurant_longitude'],
+                      df['Delivery_location_latitude'], df['Delivery_location_longitude'], dtype=dtype )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--sizes', nargs='+', type=int, default=[45_000, 1_000_000, 10_000_000] )
+    args = parser.parse_args()
+
+    sample = random_points( ROW_SAMPLE )
+    expected, row_time, _ = measure( row_wise, sample )
+    for dtype in ( np.float64, np.float32 ):
+        got = vectorized( sample, dtype )
+        print( 'erro máximo {}: {:.2e} km'.format( np.dtype( dtype ).name, np.max( np.abs( got - expected ) ) ) )
+
+    print( '{:>12} {:>16} {:>12} {:>12}'.format( 'linhas', 'versão', 'tempo (s)', 'pico mem' ) )
+    for size in args.sizes:
+        df = random_points( size )
+        print( '{:>12} {:>16} {:>12.3f} {:>12}'.format(
+            size, 'apply (estimado)', row_time * size / ROW_SAMPLE, '-' ) )
+        for dtype in ( np.float64, np.float32 ):
+            _, seconds, peak = measure( vectorized, df, dtype )
+            print( '{:>12} {:>16} {:>12.3f} {:>12}'.format(
+                size, np.dtype( dtype ).name, seconds, fmt_bytes( peak ) ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+    Benchmark de memória: dataframe da limpeza original x tipos compactos ( core/data.py )
+
+    Mostra o relatório por coluna ( memory_report ) dos dois dataframes e o RSS
+    de um processo novo depois de carregar cada um, como um worker do Streamlit.
+
+    Com --workers N, sobe N processos ao mesmo tempo e mostra quanto de cada um
+    é memória privada ( anônima ) e quanto é dividido com os outros pelo cache
+    colunar mapeado ( PSS = memória proporcional de cada processo ).
+
+    Uso:
+        python -m benchmarks.bench_memory --source train.csv --sizes 45000 1000000 --workers 4
+"""
+# Bibliotecas
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Bibliotecas necessárias
+import pandas as pd
+
+from benchmarks.common import fmt_bytes, resample_csv
+
+# Código executado no processo novo: RSS depois dos imports e depois da carga
+# ( compact usa o load_data, o mesmo caminho de um worker, com o cache colunar já gerado )
+CHILD = """
+import gc, json, resource, sys
+import pandas as pd
+from benchmarks.legacy import legacy_load
+from core.data import load_data
+
+def rss():
+    with open( '/proc/self/statm' ) as f:
+        return int( f.read().split()[1] ) * resource.getpagesize()
+
+path, mode = sys.argv[1], sys.argv[2]
+antes = rss()
+df1 = legacy_load( path ) if mode == 'legacy' else load_data( path )
+gc.collect()
+print( json.dumps( { 'rss': rss() - antes, 'frame': int( df1.memory_usage( deep=True ).sum() ) } ) )
+"""
+
+
+# Processo que carrega o dataset, informa a memória e espera o pai liberar
+WORKER = """
+import gc, json, sys
+from benchmarks.legacy import legacy_load
+from core.data import load_data
+
+def smaps():
+    campos = {}
+    with open( '/proc/self/smaps_rollup' ) as f:
+        for linha in f:
+            partes = linha.split()
+            if len( partes ) == 3 and partes[2] == 'kB':
+                campos[partes[0].rstrip( ':' )] = int( partes[1] ) * 1024
+    return campos
+
+path, mode = sys.argv[1], sys.argv[2]
+antes = smaps()
+df1 = legacy_load( path ) if mode == 'legacy' else load_data( path )
+gc.collect()
+depois = smaps()
+print( json.dumps( { k: depois[k] - antes[k] for k in ['Rss', 'Pss', 'Anonymous'] } ), flush=True )
+sys.stdin.read()
+"""
+
+
+def shared_memory( path, mode, workers ):
+    """
+        Essa função sobe vários workers ao mesmo tempo e mede a memória de cada um
+
+        Input: Caminho do csv, modo ( legacy ou compact ) e quantidade de workers
+        Output: Lista de dicionários com Rss, Pss e Anonymous de cada worker ( bytes )
+    """
+    procs = [subprocess.Popen( [sys.executable, '-c', WORKER, path, mode], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, text=True, cwd=os.getcwd() )
+             for _ in range( workers )]
+    try:
+        # Todos ficam vivos até o último responder, então o PSS divide as páginas entre eles
+        linhas = [p.stdout.readline() for p in procs]
+        result = [json.loads( linha ) for linha in linhas]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+
+    return result
+
+
+def process_memory( path, mode ):
+    out = subprocess.run( [sys.executable, '-c', CHILD, path, mode],
+                          check=True, capture_output=True, text=True, cwd=os.getcwd() )
+
+    return json.loads( out.stdout.strip().splitlines()[-1] )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--source', default='train.csv' )
+    parser.add_argument( '--sizes', nargs='+', type=int, default=[45_000, 1_000_000] )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    parser.add_argument( '--workers', type=int, default=0 )
+    args = parser.parse_args()
+
+    from benchmarks.legacy import legacy_load
+    from core.data import clean_code, load_data, memory_report, read_raw
+
+    # Relatório por coluna no csv de origem
+    old = memory_report( legacy_load( args.source ) )
+    new = memory_report( clean_code( read_raw( args.source ) ) )
+    report = old.join( new, lsuffix='_original', rsuffix='_compacto', how='outer' )
+    report['reducao'] = report['bytes_original'] / report['bytes_compacto']
+    with pd.option_context( 'display.width', 200, 'display.max_columns', 20 ):
+        print( report[['dtype_original', 'dtype_compacto', 'bytes_original', 'bytes_compacto', 'reducao']]
+                 .sort_values( 'bytes_original', ascending=False ) )
+    print()
+
+    print( '{:>12} {:>12} {:>14} {:>14} {:>10}'.format( 'linhas', 'limpeza', 'dataframe', 'rss', 'redução' ) )
+    for size in args.sizes:
+        path = resample_csv( args.source, size, os.path.join( args.workdir, 'train_{}.csv'.format( size ) ) )
+
+        # Gera o cache colunar ( etapa de build )
+        load_data( path )
+
+        result = { mode: process_memory( path, mode ) for mode in ['legacy', 'compact'] }
+        for mode, name in [( 'legacy', 'original' ), ( 'compact', 'compacto' )]:
+            print( '{:>12} {:>12} {:>14} {:>14} {:>9.1f}x'.format(
+                size, name, fmt_bytes( result[mode]['frame'] ), fmt_bytes( result[mode]['rss'] ),
+                result['legacy']['rss'] / max( result[mode]['rss'], 1 ) ) )
+
+        if args.workers:
+            for mode, name in [( 'legacy', 'original' ), ( 'compact', 'compacto' )]:
+                medidas = shared_memory( path, mode, args.workers )
+                print( '{:>12} {:>12} {:>2} workers: privada {} por worker, pss total {}'.format(
+                    size, name, args.workers,
+                    fmt_bytes( sum( m['Anonymous'] for m in medidas ) / len( medidas ) ),
+                    fmt_bytes( sum( m['Pss'] for m in medidas ) ) ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+    Paridade e escalabilidade do cálculo paralelo dos KPIs ( core/parallel.py )
+
+    Uso:
+        python -m benchmarks.bench_parallel --source train.csv --rows 50000000 --workers 1 2 4 8 16 32
+"""
+# Bibliotecas
+import argparse
+import os
+import tempfile
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import measure, resample_csv
+from core.data import clean_code, read_raw
+from core.parallel import parallel_kpis, serial_kpis
+
+
+def assert_same_kpis( expected, got ):
+    """
+        Essa função confere se dois dicionários de KPIs são iguais
+
+        Input: KPIs do caminho serial e do caminho paralelo
+        Output: None ( levanta AssertionError se forem diferentes )
+    """
+    assert expected.keys() == got.keys()
+    for name in expected:
+        a, b = expected[name], got[name]
+        if isinstance( a, pd.DataFrame ):
+            pd.testing.assert_frame_equal( a.reset_index( drop=True ), b.reset_index( drop=True ),
+                                           check_categorical=False, rtol=1e-9 )
+        else:
+            assert np.isclose( a, b, rtol=1e-9 ), '{}: {} != {}'.format( name, a, b )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--source', default='train.csv' )
+    parser.add_argument( '--rows', type=int, default=1_000_000 )
+    parser.add_argument( '--workers', nargs='+', type=int, default=[1, 2, 4, 8] )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    args = parser.parse_args()
+
+    df1 = clean_code( read_raw( args.source ) )
+    expected = serial_kpis( df1 )
+    for by in ( 'date', 'City' ):
+        for executor in ( 'process', 'thread' ):
+            assert_same_kpis( expected, parallel_kpis( df1, workers=4, by=by, executor=executor ) )
+    print( 'Paridade ok: serial == paralelo ( date/City, process/thread )' )
+
+    path = resample_csv( args.source, args.rows, os.path.join( args.workdir, 'train_{}.csv'.format( args.rows ) ) )
+    df1 = clean_code( read_raw( path ) )
+
+    print( '{:>8} {:>12} {:>10}'.format( 'workers', 'tempo (s)', 'speedup' ) )
+    base = None
+    for workers in args.workers:
+        _, seconds, _ = measure( parallel_kpis, df1, workers=workers )
+        base = base or seconds
+        print( '{:>8} {:>12.3f} {:>9.1f}x'.format( workers, seconds, base / seconds ) )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+    Paridade e tempo dos backends de consulta ( core/query.py )
+
+    Executa todas as consultas das páginas em vários estados de filtro nos dois
+    backends e confere se os resultados são iguais ( levanta AssertionError se não ).
+    A paridade usa os sketches exatos dos rollups ( CURRY_SKETCHES=exact ); os
+    aproximados são conferidos à parte, contra os limites de query_error_bounds.
+
+    Uso:
+        python -m benchmarks.bench_query --source train.csv --sizes 45000 1000000
+"""
+# Bibliotecas
+import argparse
+import os
+import tempfile
+import time
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import resample_csv
+
+# Estados de filtro conferidos ( data limite, condições de trânsito )
+STATES = [
+    ( pd.Timestamp( 2022, 4, 13 ), ( 'High', 'Jam', 'Low', 'Medium' ) ),
+    ( pd.Timestamp( 2022, 3, 1 ), ( 'High', 'Jam', 'Low', 'Medium' ) ),
+    ( pd.Timestamp( 2022, 4, 6 ), ( 'Jam', 'Low' ) ),
+    ( pd.Timestamp( 2022, 2, 20 ), ( 'Medium', ) ),
+    ( pd.Timestamp( 2022, 4, 13 ), () ),
+]
+
+
+def assert_same_result( expected, got, name ):
+    """
+        Essa função confere se dois resultados de consulta são iguais
+
+        Input: Resultado do pandas, resultado do outro backend e nome da consulta
+        Output: None ( levanta AssertionError se forem diferentes )
+    """
+    try:
+        pd.testing.assert_frame_equal( expected, got, check_dtype=False, rtol=1e-5 )
+    except AssertionError as e:
+        raise AssertionError( '{}: {}'.format( name, e ) ) from None
+
+
+def check_parity( path, backend ):
+    """
+        Essa função roda todas as consultas nos dois backends e compara
+
+        Input: Caminho do csv e backend comparado com o pandas
+        Output: Dicionário nome -> ( segundos no pandas, segundos no backend )
+    """
+    from core.query import QUERIES, run_query
+
+    tempos = {}
+    for name in QUERIES:
+        extras = [{}] + ( [{ 'k': 3, 'metric': 'distance' }] if name.startswith( 'top_' ) else [] )
+        for params in extras:
+            total = [0.0, 0.0]
+            for state in STATES:
+                resultados = []
+                for i, b in enumerate( ['pandas', backend] ):
+                    start = time.perf_counter()
+                    resultados.append( run_query( name, state, backend=b, path=path, **params ) )
+                    total[i] += time.perf_counter() - start
+                assert_same_result( resultados[0], resultados[1], '{} {} {}'.format( name, state, params ) )
+            tempos[name] = tuple( total )
+
+    return tempos
+
+
+def _rank_error( values, x, q ):
+    # Distância entre q e o intervalo de postos do valor x nos valores exatos
+    valores = np.sort( np.asarray( values, dtype=np.float64 ) )
+    valores = valores[~np.isnan( valores )]
+    baixo = np.searchsorted( valores, x, side='left' ) / len( valores )
+    alto = np.searchsorted( valores, x, side='right' ) / len( valores )
+
+    return max( baixo - q, q - alto, 0.0 )
+
+
+def check_sketches( path ):
+    """
+        Essa função confere as consultas com sketches aproximados do backend pandas
+
+        Sequência de passos:
+        1. Distintos ( entregadores e restaurantes, total e por semana ): erro relativo
+           contra os sketches exatos, até 4 vezes o erro típico do HyperLogLog
+        2. Quantis ( tempo e distância, total e por cidade, e medianas do mapa ): erro de
+           posto contra os pedidos filtrados, até 2 vezes o limite do KLL
+
+        Input: Caminho do csv
+        Output: Dicionário com os limites e o maior erro observado de cada tipo
+    """
+    from core import rollups
+    from core.filters import filter_orders, load_filter_index
+    from core.query import DELIVERY_QUANTILES, query_error_bounds, run_query
+
+    modo = rollups.SKETCH_MODE
+    rollups.SKETCH_MODE = 'approx'
+    try:
+        limites = query_error_bounds( 'pandas', path )
+        piores = { 'distinct': 0.0, 'quantile': 0.0 }
+        for state in STATES:
+            aproximado = { name: run_query( name, state, backend='pandas', path=path )
+                           for name in ['unique_couriers', 'order_share_by_week', 'delivery_quantiles',
+                                        'delivery_quantiles_by_city', 'city_centers'] }
+
+            # Distintos contra os sketches exatos
+            rollups.SKETCH_MODE = 'exact'
+            for name, cols in [( 'unique_couriers', ['couriers', 'restaurants'] ), ( 'order_share_by_week', ['couriers'] )]:
+                exato = run_query( name, state, backend='pandas', path=path )
+                for col in cols:
+                    erro = ( aproximado[name][col] / exato[col].where( exato[col] > 0 ) - 1 ).abs().max()
+                    piores['distinct'] = max( piores['distinct'], 0.0 if np.isnan( erro ) else erro )
+            rollups.SKETCH_MODE = 'approx'
+
+            # Quantis contra os pedidos filtrados
+            df1 = filter_orders( load_filter_index( path ), state[0], Road_traffic_density=list( state[1] ) )
+            grupos = [( 'delivery_quantiles', [], {} ), ( 'delivery_quantiles_by_city', ['City'], {} ),
+                      ( 'city_centers', ['City', 'Road_traffic_density'],
+                        { 'Delivery_location_latitude': 'Delivery_location_latitude',
+                          'Delivery_location_longitude': 'Delivery_location_longitude' } )]
+            for name, keys, colunas in grupos:
+                if not colunas:
+                    colunas = { '{}_p{:g}'.format( prefixo, q * 100 ): ( col, q )
+                                for col, prefixo in [( 'Time_taken(min)', 'time' ), ( 'distance', 'distance' )]
+                                for q in DELIVERY_QUANTILES }
+                for _, linha in aproximado[name].iterrows():
+                    linhas = df1
+                    for key in keys:
+                        linhas = linhas[linhas[key].astype( object ) == linha[key]]
+                    if len( linhas ) == 0:
+                        continue
+                    for saida, alvo in colunas.items():
+                        col, q = alvo if isinstance( alvo, tuple ) else ( alvo, 0.5 )
+                        piores['quantile'] = max( piores['quantile'], _rank_error( linhas[col], linha[saida], q ) )
+    finally:
+        rollups.SKETCH_MODE = modo
+
+    for tipo, tolerancia in [( 'distinct', 4 ), ( 'quantile', 2 )]:
+        if piores[tipo] > tolerancia * limites[tipo]:
+            raise AssertionError( 'Erro de {} acima do limite: {:.4f} > {} x {:.4f}'.format(
+                tipo, piores[tipo], tolerancia, limites[tipo] ) )
+
+    return { 'bounds': limites, 'worst': piores }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--source', default='train.csv' )
+    parser.add_argument( '--sizes', nargs='+', type=int, default=[45_000, 1_000_000] )
+    parser.add_argument( '--backend', default='duckdb' )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    args = parser.parse_args()
+
+    from core import rollups
+    from core.data import load_data
+
+    rollups.SKETCH_MODE = 'exact'
+
+    for size in args.sizes:
+        path = resample_csv( args.source, size, os.path.join( args.workdir, 'train_{}.csv'.format( size ) ) )
+        load_data( path )
+
+        # Primeira passada aquece as estruturas derivadas ( cubo, índices, conexão )
+        check_parity( path, args.backend )
+        tempos = check_parity( path, args.backend )
+
+        print( '{} linhas: {} consultas iguais nos dois backends'.format( size, len( tempos ) ) )
+        print( '{:>24} {:>12} {:>12}'.format( 'consulta', 'pandas (s)', args.backend + ' (s)' ) )
+        for name, ( t_pandas, t_backend ) in tempos.items():
+            print( '{:>24} {:>12.4f} {:>12.4f}'.format( name, t_pandas, t_backend ) )
+
+        sketches = check_sketches( path )
+        print( 'sketches aproximados: distintos {:.2%} ( típico {:.2%} ), quantis {:.2%} de posto ( limite {:.2%} )'.format(
+            sketches['worst']['distinct'], sketches['bounds']['distinct'],
+            sketches['worst']['quantile'], sketches['bounds']['quantile'] ) )
+
+
+if __name__ == '__main__':
+    main()
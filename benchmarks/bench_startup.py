@@ -0,0 +1,73 @@
+"""
+    Benchmark de partida a frio: csv + clean_code x cache colunar ( core/storage.py )
+
+    Cada medição roda em um processo Python novo, como um servidor recém iniciado.
+
+    Uso:
+        python -m benchmarks.bench_startup --source train.csv --sizes 45000 1000000
+"""
+# Bibliotecas
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import resample_csv
+
+# Código executado no processo novo: mede apenas a carga, não o import do pandas
+CHILD = """
+import json, sys, time
+import pandas as pd
+from benchmarks.legacy import legacy_load
+from core.data import clean_code, file_digest, read_raw
+from core.storage import read_columnar
+
+path, mode = sys.argv[1], sys.argv[2]
+start = time.perf_counter()
+if mode == 'legacy':
+    df1 = legacy_load( path )
+elif mode == 'csv':
+    df1 = clean_code( read_raw( path ) )
+else:
+    df1 = read_columnar( path, file_digest( path ) )
+    assert df1 is not None, 'cache colunar ausente'
+print( json.dumps( { 'seconds': time.perf_counter() - start, 'rows': len( df1 ) } ) )
+"""
+
+
+def cold_load( path, mode ):
+    out = subprocess.run( [sys.executable, '-c', CHILD, path, mode],
+                          check=True, capture_output=True, text=True, cwd=os.getcwd() )
+
+    return json.loads( out.stdout.strip().splitlines()[-1] )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--source', default='train.csv' )
+    parser.add_argument( '--sizes', nargs='+', type=int, default=[45_000, 1_000_000] )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    args = parser.parse_args()
+
+    from core.data import dataset_version, load_data
+    from core.storage import cache_path
+
+    print( '{:>12} {:>24} {:>12} {:>12}'.format( 'linhas', 'carga', 'tempo (s)', 'tamanho' ) )
+    for size in args.sizes:
+        path = resample_csv( args.source, size, os.path.join( args.workdir, 'train_{}.csv'.format( size ) ) )
+
+        # Gera o cache colunar ( etapa de build )
+        load_data( path )
+
+        for mode, name, arquivo in [( 'legacy', 'csv + clean_code original', path ),
+                                    ( 'csv', 'csv + clean_code', path ),
+                                    ( 'columnar', 'cache colunar ( mmap )', cache_path( path, dataset_version( path ) ) )]:
+            result = cold_load( path, mode )
+            print( '{:>12} {:>24} {:>12.3f} {:>9.1f} MB'.format(
+                result['rows'], name, result['seconds'], os.path.getsize( arquivo ) / 2**20 ) )
+
+
+if __name__ == '__main__':
+    main()
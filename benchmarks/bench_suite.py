@@ -0,0 +1,425 @@
+"""
+    Suíte de benchmarks das páginas: cada função e o rerun completo de cada página
+
+    Os dados vêm do gerador sintético ( benchmarks/synthetic.py ) ou de um csv
+    reamostrado com --source. Para cada tamanho são medidos:
+
+    - startup: leitura, limpeza e construção das estruturas derivadas
+    - uma linha por função de cada página ( a parte de dados; as figuras do
+      plotly e o mapa do folium ficam de fora )
+    - rerun: a página inteira com o cache de resultados vazio ( mudança de filtro )
+    - rerun_cached: a página inteira de novo, com os resultados em cache
+    - rerun_panels / first_panel: o rerun frio com as funções como painéis
+      ( core/render.py ), e o tempo até o primeiro painel ficar pronto
+
+    Cada medida tem a mediana e o mínimo do tempo e o pico de memória
+    ( tracemalloc ). O resultado é gravado em JSON com o commit e as versões das
+    bibliotecas, e --compare mostra a razão contra um JSON anterior.
+
+    Uso:
+        python -m benchmarks.bench_suite --sizes 45000 1000000 --output results.json
+        python -m benchmarks.bench_suite --sizes 45000 --compare results.json --threshold 1.2
+"""
+# Bibliotecas
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import fmt_bytes, profile_call, resample_csv
+from benchmarks.synthetic import synthetic_csv
+from core import query, rollups
+from core.cache import clear_result_cache, filter_state, memoize
+from core.charts import VIEWPORT_WIDTH, downsample, max_points
+from core.cube import build_cube
+from core.data import clean_code, dataset_version, load_data, read_raw
+from core.filters import build_filter_index, filter_orders, load_filter_index
+from core.geo import DELIVERY_COLUMNS, RESTAURANT_COLUMNS, bin_points
+from core.profiles import PROFILE_COLUMNS, build_profiles, courier_profile, leaderboard
+from core.render import add_panel, render_panels
+from core.rollups import build_rollups
+from core.spatial import build_spatial_index, load_spatial_index, nearest_restaurants, orders_within, zone_stats
+from core.storage import cache_path, read_columnar
+
+# Estado dos filtros medido ( o padrão da barra lateral )
+DEFAULT_STATE = filter_state( pd.Timestamp( 2022, 4, 13 ), ['Low', 'Medium', 'High', 'Jam'] )
+
+# Zona do drill-down da página 1 ( Indore, 10 km )
+ZONE = ( 22.72, 75.86, 10 )
+
+# Versão do formato do JSON de resultados
+RESULTS_FORMAT = 1
+
+# Colunas do df1 filtrado lidas pelas páginas ( mapa de calor e perfis dos entregadores )
+FRAME_COLUMNS = DELIVERY_COLUMNS + RESTAURANT_COLUMNS + PROFILE_COLUMNS
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Funções das páginas ( parte de dados )
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Mesma assinatura para todas: ( state, path, df1 ) -> resultado. O df1 fica
+# fora da chave do memoize, como nas páginas.
+
+def _order_metric( state, path, df1 ):
+    df_aux = query.run_query( 'orders_by_day', state, path=path )
+    return downsample( df_aux, 'Order_Date', 'count', max_points( VIEWPORT_WIDTH ), method='minmax' )
+
+
+def _traffic_order_share( state, path, df1 ):
+    return query.run_query( 'traffic_order_share', state, path=path )
+
+
+def _traffic_order_city( state, path, df1 ):
+    return query.run_query( 'traffic_order_city', state, path=path )
+
+
+def _order_by_week( state, path, df1 ):
+    df_aux = query.run_query( 'orders_by_week', state, path=path )
+    return downsample( df_aux, 'week_start', 'count', max_points( VIEWPORT_WIDTH ) )
+
+
+def _order_share_by_week( state, path, df1 ):
+    df_aux = query.run_query( 'order_share_by_week', state, path=path )
+    return downsample( df_aux, 'week_start', 'order_by_delivery', max_points( VIEWPORT_WIDTH ) )
+
+
+def _country_maps( state, path, df1 ):
+    return ( query.run_query( 'city_centers', state, path=path ),
+             bin_points( df1['Delivery_location_latitude'], df1['Delivery_location_longitude'] ),
+             bin_points( df1['Restaurant_latitude'], df1['Restaurant_longitude'] ) )
+
+
+def _zone_drilldown( state, path, df1 ):
+    lat, lon, raio = ZONE
+    spatial = load_spatial_index( path )
+    df_zona = orders_within( spatial, lat, lon, raio )
+    df_zona = df_zona[( df_zona['Order_Date'] < state[0] ) & df_zona['Road_traffic_density'].isin( state[1] )]
+
+    return zone_stats( df_zona ), nearest_restaurants( spatial, lat, lon, k=5 )
+
+
+def _overall_metrics( state, path, df1 ):
+    return query.run_query( 'extremes', state, path=path )
+
+
+def _courier_leaderboard( state, path, df1 ):
+    profiles = build_profiles( df1 )
+    df_pagina, _ = leaderboard( profiles, by='rating_mean' )
+
+    return df_pagina, courier_profile( profiles, df_pagina['Delivery_person_ID'].iloc[0] ) if len( df_pagina ) else None
+
+
+def _ratings_by_traffic( state, path, df1 ):
+    return query.run_query( 'ratings_by_traffic', state, path=path )
+
+
+def _ratings_by_weather( state, path, df1 ):
+    return query.run_query( 'ratings_by_weather', state, path=path )
+
+
+def _top_delivers( state, path, df1 ):
+    return ( query.run_query( 'top_fastest', state, path=path ),
+             query.run_query( 'top_slowest', state, path=path ) )
+
+
+def _unique_couriers( state, path, df1 ):
+    return query.run_query( 'unique_couriers', state, path=path )
+
+
+def _distance( state, path, df1 ):
+    return ( query.run_query( 'avg_distance', state, path=path ),
+             query.run_query( 'distance_by_city', state, path=path ) )
+
+
+def _avg_std_time_delivery( state, path, df1 ):
+    return query.run_query( 'time_by_festival', state, path=path )
+
+
+def _delivery_quantiles( state, path, df1 ):
+    return query.run_query( 'delivery_quantiles', state, path=path )
+
+
+def _avg_std_time_graph( state, path, df1 ):
+    return ( query.run_query( 'time_by_city', state, path=path ),
+             query.run_query( 'delivery_quantiles_by_city', state, path=path ) )
+
+
+def _avg_std_time_on_traffic( state, path, df1 ):
+    return query.run_query( 'time_by_city_traffic', state, path=path )
+
+
+def _time_by_city_order( state, path, df1 ):
+    return query.run_query( 'time_by_city_order', state, path=path )
+
+
+# Página -> funções, na ordem em que a página as chama
+PAGES = {
+    'visao_empresa': {
+        'order_metric': _order_metric,
+        'traffic_order_share': _traffic_order_share,
+        'traffic_order_city': _traffic_order_city,
+        'order_by_week': _order_by_week,
+        'order_share_by_week': _order_share_by_week,
+        'country_maps': _country_maps,
+        'zone_drilldown': _zone_drilldown,
+    },
+    'visao_entregadores': {
+        'overall_metrics': _overall_metrics,
+        'leaderboard': _courier_leaderboard,
+        'ratings_by_traffic': _ratings_by_traffic,
+        'ratings_by_weather': _ratings_by_weather,
+        'top_delivers': _top_delivers,
+    },
+    'visao_restaurantes': {
+        'unique_couriers': _unique_couriers,
+        'distance': _distance,
+        'avg_std_time_delivery': _avg_std_time_delivery,
+        'delivery_quantiles': _delivery_quantiles,
+        'avg_std_time_graph': _avg_std_time_graph,
+        'avg_std_time_on_traffic': _avg_std_time_on_traffic,
+        'time_by_city_order': _time_by_city_order,
+    },
+}
+
+
+def rerun( page, state, path ):
+    """
+        Essa função executa a parte de dados de uma página como em um rerun do Streamlit
+
+        Input: Nome da página ( PAGES ), estado dos filtros e caminho do csv
+        Output: None
+    """
+    df1 = filter_orders( load_filter_index( path ), state[0], columns=FRAME_COLUMNS,
+                         Road_traffic_density=list( state[1] ) )
+    for fn in PAGES[page].values():
+        memoize( fn, state, path, df1, key=state, path=path )
+
+
+class _Placeholder:
+    # Placeholder sem Streamlit: guarda o instante em que o painel foi desenhado
+    def __init__( self, inicio ):
+        self.inicio = inicio
+        self.pronto = None
+
+    def caption( self, text ):
+        pass
+
+    def exception( self, e ):
+        raise e
+
+
+def _panel_done( placeholder, result ):
+    placeholder.pronto = time.perf_counter() - placeholder.inicio
+
+
+def rerun_panels( page, state, path, workers=None ):
+    """
+        Essa função executa a parte de dados de uma página pelo render_panels, como as páginas
+
+        Input: Nome da página ( PAGES ), estado dos filtros, caminho do csv e threads ( None usa RENDER_WORKERS )
+        Output: Segundos até o primeiro painel ficar pronto
+    """
+    inicio = time.perf_counter()
+    df1 = filter_orders( load_filter_index( path ), state[0], columns=FRAME_COLUMNS,
+                         Road_traffic_density=list( state[1] ) )
+    paineis = []
+    for name, fn in PAGES[page].items():
+        add_panel( paineis, name, _Placeholder( inicio ), memoize, _panel_done, fn, state, path, df1,
+                   key=state, path=path )
+    render_panels( paineis, workers=workers )
+
+    return min( panel['placeholder'].pronto for panel in paineis )
+
+
+def _rebuild_database( path ):
+    banco = cache_path( path, dataset_version( path ), query.DATABASE_SUFFIX )
+    if os.path.exists( banco ):
+        os.remove( banco )
+
+    return query.build_database( path )
+
+
+def startup_steps( path ):
+    """
+        Essa função lista as etapas feitas uma vez por versão do dataset
+
+        Input: Caminho do csv
+        Output: Dicionário nome -> função sem argumentos
+    """
+    raw = read_raw( path )
+    df1 = load_data( path )
+    steps = {
+        'read_raw': lambda: read_raw( path ),
+        'clean_code': lambda: clean_code( raw ),
+        'read_columnar': lambda: read_columnar( path, dataset_version( path ) ),
+        'build_cube': lambda: build_cube( df1 ),
+        'build_rollups': lambda: build_rollups( df1 ),
+        'build_filter_index': lambda: build_filter_index( df1 ),
+        'build_spatial_index': lambda: build_spatial_index( df1 ),
+        'build_profiles': lambda: build_profiles( df1 ),
+    }
+    if query.duckdb is not None:
+        steps['build_database'] = lambda: _rebuild_database( path )
+
+    return steps
+
+
+def run_suite( path, size, backends, repeat=3, state=DEFAULT_STATE ):
+    """
+        Essa função mede todas as etapas, funções e reruns das páginas para um csv
+
+        Input: Caminho do csv, número de linhas, backends de consulta, repetições e estado dos filtros
+        Output: Lista de dicionários ( uma linha por medida )
+    """
+    linhas = []
+
+    def registrar( group, name, backend, fn ):
+        medida = profile_call( fn, repeat )
+        linhas.append( dict( { 'size': size, 'group': group, 'name': name, 'backend': backend }, **medida ) )
+        print( '{:>10} {:>20} {:>24} {:>8} {:>10.4f} {:>12}'.format(
+            size, group, name, backend or '-', medida['wall_s'], fmt_bytes( medida['peak_bytes'] ) ), flush=True )
+
+    for name, fn in startup_steps( path ).items():
+        registrar( 'startup', name, 'duckdb' if name == 'build_database' else None, fn )
+
+    df1 = filter_orders( load_filter_index( path ), state[0], columns=FRAME_COLUMNS,
+                         Road_traffic_density=list( state[1] ) )
+    for backend in backends:
+        # O backend não entra na chave do cache de resultados
+        query.DEFAULT_BACKEND = backend
+        clear_result_cache()
+        for page, funcoes in PAGES.items():
+            # Primeira passada carrega as estruturas derivadas e a conexão
+            rerun( page, state, path )
+            for name, fn in funcoes.items():
+                registrar( page, name, backend, lambda: fn( state, path, df1 ) )
+
+            def frio():
+                clear_result_cache()
+                rerun( page, state, path )
+
+            registrar( page, 'rerun', backend, frio )
+            registrar( page, 'rerun_cached', backend, lambda: rerun( page, state, path ) )
+
+            def paineis_frio():
+                clear_result_cache()
+                return rerun_panels( page, state, path )
+
+            registrar( page, 'rerun_panels', backend, paineis_frio )
+            primeiros = [paineis_frio() for _ in range( repeat )]
+            medida = { 'wall_s': float( np.median( primeiros ) ), 'wall_min_s': min( primeiros ), 'peak_bytes': 0 }
+            linhas.append( dict( { 'size': size, 'group': page, 'name': 'first_panel', 'backend': backend }, **medida ) )
+            print( '{:>10} {:>20} {:>24} {:>8} {:>10.4f} {:>12}'.format(
+                size, page, 'first_panel', backend or '-', medida['wall_s'], '-' ), flush=True )
+
+    return linhas
+
+
+def _git_commit():
+    try:
+        raiz = os.path.dirname( os.path.dirname( os.path.abspath( __file__ ) ) )
+        commit = subprocess.run( ['git', 'rev-parse', 'HEAD'], cwd=raiz, capture_output=True, text=True, check=True )
+        sujo = subprocess.run( ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=raiz,
+                               capture_output=True, text=True, check=True )
+        return commit.stdout.strip(), bool( sujo.stdout.strip() )
+    except ( OSError, subprocess.CalledProcessError ):
+        return None, None
+
+
+def environment( seed, repeat ):
+    """
+        Essa função descreve onde os resultados foram medidos
+
+        Input: Semente do gerador e repetições
+        Output: Dicionário com commit, versões e máquina
+    """
+    commit, sujo = _git_commit()
+
+    return {
+        'format': RESULTS_FORMAT,
+        'commit': commit,
+        'dirty': sujo,
+        'timestamp': datetime.datetime.now( datetime.timezone.utc ).isoformat( timespec='seconds' ),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'duckdb': getattr( query.duckdb, '__version__', None ),
+        'sketches': rollups.SKETCH_MODE,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+    }
+
+
+def compare( baseline, current, threshold=1.2 ):
+    """
+        Essa função compara duas execuções da suíte medida a medida
+
+        Input: Dois JSONs da suíte ( anterior e atual ) e a razão de tempo considerada regressão
+        Output: Dataframe com os tempos, a razão e se houve regressão
+    """
+    chave = ['size', 'group', 'name', 'backend']
+    antes = pd.DataFrame( baseline['results'] )
+    depois = pd.DataFrame( current['results'] )
+    for df_aux in ( antes, depois ):
+        df_aux['backend'] = df_aux['backend'].fillna( '-' )
+
+    df_aux = antes[chave + ['wall_s', 'peak_bytes']].merge( depois[chave + ['wall_s', 'peak_bytes']],
+                                                           on=chave, suffixes=( '_antes', '_depois' ) )
+    df_aux['razao'] = df_aux['wall_s_depois'] / df_aux['wall_s_antes']
+    df_aux['regressao'] = df_aux['razao'] > threshold
+
+    return df_aux
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--sizes', nargs='+', type=int, default=[45_000, 1_000_000] )
+    parser.add_argument( '--source', default=None, help='csv reamostrado no lugar do gerador sintético' )
+    parser.add_argument( '--seed', type=int, default=42 )
+    parser.add_argument( '--repeat', type=int, default=3 )
+    parser.add_argument( '--backends', nargs='+', default=query.available_backends() )
+    parser.add_argument( '--workdir', default=tempfile.gettempdir() )
+    parser.add_argument( '--output', default=None, help='arquivo JSON com os resultados' )
+    parser.add_argument( '--compare', default=None, help='JSON de uma execução anterior' )
+    parser.add_argument( '--threshold', type=float, default=1.2 )
+    args = parser.parse_args()
+
+    print( '{:>10} {:>20} {:>24} {:>8} {:>10} {:>12}'.format( 'linhas', 'grupo', 'medida', 'backend',
+                                                              'tempo (s)', 'pico mem' ) )
+    resultados = []
+    for size in args.sizes:
+        if args.source:
+            path = resample_csv( args.source, size, os.path.join( args.workdir, 'train_{}.csv'.format( size ) ),
+                                 seed=args.seed )
+        else:
+            path = synthetic_csv( size, os.path.join( args.workdir, 'synthetic_{}_{}.csv'.format( size, args.seed ) ),
+                                  seed=args.seed )
+        resultados.extend( run_suite( path, size, args.backends, args.repeat ) )
+
+    current = { 'meta': environment( args.seed, args.repeat ), 'results': resultados }
+    if args.output:
+        with open( args.output, 'w' ) as f:
+            json.dump( current, f, indent=1 )
+
+    if args.compare:
+        with open( args.compare ) as f:
+            baseline = json.load( f )
+        df_aux = compare( baseline, current, args.threshold )
+        with pd.option_context( 'display.width', 200, 'display.max_rows', None, 'display.max_columns', 20 ):
+            print( df_aux[['size', 'group', 'name', 'backend', 'wall_s_antes', 'wall_s_depois', 'razao', 'regressao']] )
+        if df_aux['regressao'].any():
+            sys.exit( '{} medidas mais lentas que {}x'.format( int( df_aux['regressao'].sum() ), args.threshold ) )
+
+
+if __name__ == '__main__':
+    main()
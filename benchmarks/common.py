@@ -0,0 +1,83 @@
+# Bibliotecas
+import gc
+import os
+import time
+import tracemalloc
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+
+def measure( fn, *args, **kwargs ):
+    """
+        Essa função mede o tempo e o pico de memória alocada de uma chamada
+
+        Input: Função e seus argumentos
+        Output: Tupla ( resultado, segundos, pico de memória em bytes )
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn( *args, **kwargs )
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, seconds, peak
+
+
+def profile_call( fn, repeat=3 ):
+    """
+        Essa função mede uma chamada várias vezes: o tempo sem o tracemalloc
+        ( que deixa as alocações mais lentas ) e o pico de memória em uma passada a mais
+
+        Input: Função sem argumentos e quantidade de repetições
+        Output: Dicionário com a mediana e o mínimo dos tempos ( segundos ) e o pico de memória ( bytes )
+    """
+    tempos = []
+    for _ in range( repeat ):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        tempos.append( time.perf_counter() - start )
+    _, _, peak = measure( fn )
+
+    return { 'wall_s': float( np.median( tempos ) ), 'wall_min_s': min( tempos ), 'peak_bytes': int( peak ) }
+
+
+def resample_csv( source, n_rows, dest, seed=42 ):
+    """
+        Essa função gera um csv com n_rows linhas sorteadas ( com reposição ) do csv original
+
+        O arquivo é escrito em blocos para não precisar de n_rows linhas em memória.
+
+        Input: csv de origem, número de linhas, csv de destino e semente
+        Output: Caminho do csv gerado
+    """
+    if os.path.exists( dest ):
+        return dest
+
+    base = pd.read_csv( source, dtype=str, keep_default_na=False )
+    rng = np.random.default_rng( seed )
+
+    chunk = 1_000_000
+    with open( dest, 'w', newline='' ) as f:
+        for start in range( 0, n_rows, chunk ):
+            size = min( chunk, n_rows - start )
+            rows = base.iloc[rng.integers( 0, len( base ), size )]
+            rows.to_csv( f, index=False, header=( start == 0 ) )
+
+    return dest
+
+
+def fmt_bytes( n ):
+    """
+        Essa função formata um número de bytes em MB
+
+        Input: Bytes
+        Output: String
+    """
+    return '{:.1f} MB'.format( n / 2**20 )
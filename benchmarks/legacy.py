@@ -0,0 +1,76 @@
+# Implementação original do clean_code ( antes do core/data.py ), mantida
+# apenas como referência para os benchmarks.
+
+# Bibliotecas necessárias
+import pandas as pd
+
+
+def legacy_load( path ):
+    """
+        Essa função reproduz a carga original das páginas: pd.read_csv + clean_code
+
+        Input: Caminho do csv
+        Output: Dataframe
+    """
+    return legacy_clean_code( pd.read_csv( path ) )
+
+
+def legacy_clean_code( df1 ):
+    """
+        Esta função tem a responsabilidade de limpar o dataframe
+
+        Tipos de limpeza
+        1. Remoção dos dados NaN
+        2. Mudança do tipo da coluna de dados
+        3. Reoção dos espaços das variáveis de texo
+        4. Formatação da coluna de datas
+        5. Lipeza da coluna de tempo ( remoção do texto da variável numérica )
+
+        Input: Dataframe
+        Output: Dataframe
+    """
+
+    # 1. Convertendo a coluna Age de texto para número
+    linhas_selecionadas = df1['Delivery_person_Age'] != 'NaN '
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+
+    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype( int )
+
+    # 2. Convertendo a coluna Ratings de texto para número decimal (float)
+    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype( float )
+
+    # 3. Convertendo a coluna order_date de texto para data
+    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format='%d-%m-%Y')
+
+    # 4. Convertendo multiple_deliveries de texto para numero inteiro 9( int )
+    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype( int )
+
+    # Removendo linhas NaN
+    linhas_selecionadas = df1['Road_traffic_density'] != 'NaN '
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+
+    linhas_selecionadas = df1['City'] != 'NaN '
+    df1 = df1.loc[linhas_selecionadas, :].copy()
+
+    # inserindo a coluna semana no data frame
+    df1['week_of_year'] = df1['Order_Date'].dt.strftime( '%U')
+
+    # 5. Removendo os espaços deentro de strings/texto/object
+    # df1 = df1.reset_index( drop=True )
+    # for i in range( len( df1 )):
+    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
+
+    df1.loc[:, 'ID'] = df1.loc[:, 'ID'].str.strip()
+    df1.loc[:, 'Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
+    df1.loc[:, 'Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
+    df1.loc[:, 'Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
+    df1.loc[:, 'City'] = df1.loc[:, 'City'].str.strip()
+    df1.loc[:, 'Festival'] = df1.loc[:, 'Festival'].str.strip()
+
+    # Limpando a coluna de time taken
+    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min)' )[1] )
+    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype( int )
+
+    return df1
@@ -0,0 +1,252 @@
+"""
+    Gerador de pedidos sintéticos no formato do train.csv
+
+    As linhas seguem o esquema e as manias do arquivo original: sentinelas
+    'NaN ' ( com espaço ), tempos '(min) NN', textos com espaço no final,
+    'conditions Sunny', coordenadas do restaurante com o sinal trocado ou
+    zeradas. Entregadores ficam presos a uma cidade e a um restaurante, e o
+    tempo de entrega depende do trânsito, do clima e do festival, então as
+    agregações das páginas têm a mesma forma que no arquivo real.
+
+    A mesma semente e o mesmo número de linhas geram sempre o mesmo arquivo.
+
+    Uso:
+        python -m benchmarks.synthetic --rows 1000000 --out /tmp/train_1000000.csv
+"""
+# Bibliotecas
+import argparse
+import os
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.data import NA_SENTINEL
+
+# Colunas do train.csv, na ordem do arquivo
+COLUMNS = ['ID', 'Delivery_person_ID', 'Delivery_person_Age', 'Delivery_person_Ratings',
+           'Restaurant_latitude', 'Restaurant_longitude', 'Delivery_location_latitude',
+           'Delivery_location_longitude', 'Order_Date', 'Time_Orderd', 'Time_Order_picked',
+           'Weatherconditions', 'Road_traffic_density', 'Vehicle_condition', 'Type_of_order',
+           'Type_of_vehicle', 'multiple_deliveries', 'Festival', 'City', 'Time_taken(min)']
+
+# Prefixos dos IDs dos entregadores e o centro aproximado de cada cidade ( lat, lon )
+CITIES = {
+    'INDO': ( 22.72, 75.86 ), 'BANG': ( 12.97, 77.59 ), 'COIMB': ( 11.02, 76.96 ), 'CHEN': ( 13.08, 80.27 ),
+    'HYD': ( 17.39, 78.49 ), 'RANCHI': ( 23.34, 85.31 ), 'MYS': ( 12.30, 76.64 ), 'DEH': ( 30.32, 78.03 ),
+    'KOC': ( 9.93, 76.27 ), 'PUNE': ( 18.52, 73.86 ), 'LUDH': ( 30.90, 75.86 ), 'KNP': ( 26.45, 80.33 ),
+    'MUM': ( 19.08, 72.88 ), 'KOL': ( 22.57, 88.36 ), 'JAP': ( 26.91, 75.79 ), 'SUR': ( 21.17, 72.83 ),
+    'GOA': ( 15.49, 73.83 ), 'AURG': ( 19.88, 75.34 ), 'AGR': ( 27.18, 78.01 ), 'VAD': ( 22.31, 73.18 ),
+    'ALH': ( 25.44, 81.85 ), 'BHP': ( 23.26, 77.41 ),
+}
+
+# Valores das colunas categóricas e a frequência de cada um ( o último de cada lista é a sentinela )
+TRAFFIC = { 'Low ': 0.34, 'Jam ': 0.31, 'Medium ': 0.24, 'High ': 0.10, NA_SENTINEL: 0.01 }
+CITY_TYPES = { 'Metropolitian ': 0.74, 'Urban ': 0.22, 'Semi-Urban ': 0.01, NA_SENTINEL: 0.03 }
+FESTIVAL = { 'No ': 0.975, 'Yes ': 0.02, NA_SENTINEL: 0.005 }
+WEATHER = { 'conditions Fog': 0.17, 'conditions Stormy': 0.17, 'conditions Cloudy': 0.17,
+            'conditions Sandstorms': 0.16, 'conditions Windy': 0.16, 'conditions Sunny': 0.16,
+            'conditions NaN': 0.01 }
+ORDER_TYPES = { 'Snack ': 0.25, 'Meal ': 0.25, 'Drinks ': 0.25, 'Buffet ': 0.25 }
+VEHICLES = { 'motorcycle ': 0.58, 'scooter ': 0.33, 'electric_scooter ': 0.08, 'bicycle ': 0.01 }
+
+# Minutos a mais no tempo de entrega
+TRAFFIC_DELAY = { 'Low ': 0, 'Medium ': 6, 'High ': 8, 'Jam ': 12, NA_SENTINEL: 0 }
+WEATHER_DELAY = { 'conditions Sunny': 0, 'conditions Windy': 4, 'conditions Cloudy': 6, 'conditions Fog': 6,
+                  'conditions Stormy': 4, 'conditions Sandstorms': 4, 'conditions NaN': 0 }
+
+# Proporções das linhas com problema
+MISSING_COURIER = 0.04      # Age, Ratings e Time_Orderd com 'NaN ' ( juntos, como no original )
+MISSING_DELIVERIES = 0.02   # multiple_deliveries com 'NaN '
+FLIPPED_SIGN = 0.03         # Coordenadas do restaurante com o sinal trocado
+NULL_ISLAND = 0.008         # Coordenadas do restaurante zeradas
+
+# Pedidos por entregador e entregadores por restaurante no original
+ORDERS_PER_COURIER = 34
+COURIERS_PER_RESTAURANT = 3
+
+# Primeiro dia e quantidade de dias do original ( 11-02-2022 a 06-04-2022 )
+START_DATE = '2022-02-11'
+DAYS = 55
+
+# Linhas geradas e escritas por vez
+CHUNK_ROWS = 500_000
+
+
+def _pick( rng, options, size ):
+    valores = np.array( list( options ), dtype=object )
+    pesos = np.array( list( options.values() ) )
+
+    return valores[rng.choice( len( valores ), size, p=pesos / pesos.sum() )]
+
+
+def couriers( n_rows, seed=42 ):
+    """
+        Essa função cria os entregadores e os restaurantes de um dataset sintético
+
+        A quantidade de entregadores cresce com o número de linhas, mantendo
+        ORDERS_PER_COURIER pedidos por entregador como no original.
+
+        Input: Número de linhas e semente
+        Output: Dicionário com os IDs, a cidade e as coordenadas do restaurante de cada entregador
+    """
+    rng = np.random.default_rng( [seed, 0] )
+    prefixos = list( CITIES )
+    n = max( n_rows // ORDERS_PER_COURIER, len( prefixos ) )
+
+    cidade = np.arange( n ) % len( prefixos )
+    posicao = np.arange( n ) // len( prefixos )
+    restaurante = posicao // COURIERS_PER_RESTAURANT + 1
+    entregador = posicao % COURIERS_PER_RESTAURANT + 1
+
+    centros = np.array( [CITIES[p] for p in prefixos] )
+    # Restaurantes espalhados até ~0.2 grau do centro da cidade
+    chave = cidade * ( restaurante.max() + 1 ) + restaurante
+    _, restaurante_idx = np.unique( chave, return_inverse=True )
+    espalhamento = rng.uniform( -0.2, 0.2, ( restaurante_idx.max() + 1, 2 ) )
+
+    return {
+        'ids': np.array( ['{}RES{:02d}DEL{:02d} '.format( prefixos[c], r, d )
+                          for c, r, d in zip( cidade, restaurante, entregador )], dtype=object ),
+        'lat': ( centros[cidade, 0] + espalhamento[restaurante_idx, 0] ).round( 6 ),
+        'lon': ( centros[cidade, 1] + espalhamento[restaurante_idx, 1] ).round( 6 ),
+        'age': rng.integers( 20, 40, n ),
+        'rating': np.clip( rng.normal( 4.6, 0.3, n ), 2.5, 5.0 ),
+        'vehicle': _pick( rng, VEHICLES, n ),
+    }
+
+
+def generate_chunk( pool, start, size, seed=42, start_date=START_DATE, days=DAYS ):
+    """
+        Essa função gera um bloco de pedidos sintéticos como texto, no formato do train.csv
+
+        Cada bloco tem o seu gerador aleatório ( semente, início do bloco ), então
+        o resultado não depende da ordem em que os blocos são gerados.
+
+        Input:
+            - pool: Entregadores ( couriers )
+            - start: Posição da primeira linha do bloco ( define os IDs dos pedidos )
+            - size: Número de linhas
+            - seed: Semente
+            - start_date / days: Primeiro dia e quantidade de dias das datas dos pedidos
+        Output: Dataframe com as colunas de COLUMNS
+    """
+    rng = np.random.default_rng( [seed, 1, start] )
+
+    quem = rng.integers( 0, len( pool['ids'] ), size )
+    trafego = _pick( rng, TRAFFIC, size )
+    clima = _pick( rng, WEATHER, size )
+    festival = _pick( rng, FESTIVAL, size )
+    multiplas = rng.choice( 4, size, p=[0.31, 0.62, 0.045, 0.025] )
+
+    # Restaurante do entregador, com os erros de sinal e as coordenadas zeradas do original
+    lat, lon = pool['lat'][quem], pool['lon'][quem]
+    entrega_lat = ( lat + rng.uniform( 0.01, 0.15, size ) * rng.choice( [-1, 1], size ) ).round( 6 )
+    entrega_lon = ( lon + rng.uniform( 0.01, 0.15, size ) * rng.choice( [-1, 1], size ) ).round( 6 )
+    sorteio = rng.random( size )
+    troca = sorteio < FLIPPED_SIGN
+    zero = ( sorteio >= FLIPPED_SIGN ) & ( sorteio < FLIPPED_SIGN + NULL_ISLAND )
+    rest_lat = np.where( zero, 0.0, np.where( troca, -lat, lat ) )
+    rest_lon = np.where( zero, 0.0, np.where( troca, -lon, lon ) )
+    entrega_lat = np.where( zero, ( entrega_lat - lat ).round( 6 ), entrega_lat )
+    entrega_lon = np.where( zero, ( entrega_lon - lon ).round( 6 ), entrega_lon )
+
+    # Horário do pedido em passos de 5 minutos e a coleta 5 a 15 minutos depois
+    pedido = rng.integers( 8 * 12, 24 * 12, size ) * 5
+    coleta = ( pedido + rng.choice( [5, 10, 15], size ) ) % ( 24 * 60 )
+    horario = lambda minutos: pd.Series( minutos // 60 ).map( '{:02d}'.format ).str.cat(
+        pd.Series( minutos % 60 ).map( '{:02d}:00'.format ), sep=':' ).to_numpy( dtype=object )
+
+    datas = pd.date_range( start_date, periods=days ).strftime( '%d-%m-%Y' ).to_numpy( dtype=object )
+
+    tempo = ( 15 + pd.Series( trafego ).map( TRAFFIC_DELAY ).to_numpy()
+              + pd.Series( clima ).map( WEATHER_DELAY ).to_numpy()
+              + np.where( festival == 'Yes ', 18, 0 ) + 4 * multiplas
+              + rng.normal( 0, 4, size ) ).round().clip( 10, 54 ).astype( int )
+
+    nota = ( pool['rating'][quem] + rng.normal( 0, 0.2, size ) ).clip( 2.5, 5.0 ).round( 1 )
+
+    df_aux = pd.DataFrame( {
+        'ID': pd.Series( np.arange( start, start + size ) ).map( '0x{:x} '.format ).to_numpy( dtype=object ),
+        'Delivery_person_ID': pool['ids'][quem],
+        'Delivery_person_Age': pool['age'][quem].astype( str ).astype( object ),
+        'Delivery_person_Ratings': nota.astype( str ).astype( object ),
+        'Restaurant_latitude': rest_lat,
+        'Restaurant_longitude': rest_lon,
+        'Delivery_location_latitude': entrega_lat,
+        'Delivery_location_longitude': entrega_lon,
+        'Order_Date': datas[rng.integers( 0, days, size )],
+        'Time_Orderd': horario( pedido ),
+        'Time_Order_picked': horario( coleta ),
+        'Weatherconditions': clima,
+        'Road_traffic_density': trafego,
+        'Vehicle_condition': rng.integers( 0, 4, size ),
+        'Type_of_order': _pick( rng, ORDER_TYPES, size ),
+        'Type_of_vehicle': pool['vehicle'][quem],
+        'multiple_deliveries': multiplas.astype( str ).astype( object ),
+        'Festival': festival,
+        'City': _pick( rng, CITY_TYPES, size ),
+        'Time_taken(min)': pd.Series( tempo ).map( '(min) {}'.format ).to_numpy( dtype=object ),
+    }, columns=COLUMNS )
+
+    # Sentinelas 'NaN ' nas mesmas colunas do original
+    sem_cadastro = rng.random( size ) < MISSING_COURIER
+    for col in ['Delivery_person_Age', 'Delivery_person_Ratings', 'Time_Orderd']:
+        df_aux.loc[sem_cadastro, col] = NA_SENTINEL
+    df_aux.loc[rng.random( size ) < MISSING_DELIVERIES, 'multiple_deliveries'] = NA_SENTINEL
+
+    return df_aux
+
+
+def generate_orders( n_rows, seed=42, start_date=START_DATE, days=DAYS ):
+    """
+        Essa função gera n_rows pedidos sintéticos em memória
+
+        Input: Número de linhas, semente, primeiro dia e quantidade de dias
+        Output: Dataframe de texto no formato do train.csv
+    """
+    pool = couriers( n_rows, seed )
+    blocos = [generate_chunk( pool, start, min( CHUNK_ROWS, n_rows - start ), seed, start_date, days )
+              for start in range( 0, n_rows, CHUNK_ROWS )]
+
+    return pd.concat( blocos, ignore_index=True ) if blocos else pd.DataFrame( columns=COLUMNS )
+
+
+def synthetic_csv( n_rows, dest, seed=42, start_date=START_DATE, days=DAYS ):
+    """
+        Essa função grava um csv sintético com n_rows pedidos
+
+        O arquivo é escrito em blocos de CHUNK_ROWS linhas, então a memória não
+        cresce com o tamanho pedido. Se o arquivo já existir, ele é reaproveitado.
+
+        Input: Número de linhas, csv de destino, semente, primeiro dia e quantidade de dias
+        Output: Caminho do csv gerado
+    """
+    if os.path.exists( dest ):
+        return dest
+
+    pool = couriers( n_rows, seed )
+    tmp = '{}.{}.tmp'.format( dest, os.getpid() )
+    with open( tmp, 'w', newline='' ) as f:
+        for start in range( 0, max( n_rows, 1 ), CHUNK_ROWS ):
+            size = min( CHUNK_ROWS, n_rows - start )
+            generate_chunk( pool, start, size, seed, start_date, days ).to_csv( f, index=False, header=( start == 0 ) )
+    os.replace( tmp, dest )
+
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument( '--rows', type=int, default=45_000 )
+    parser.add_argument( '--out', default='train_synthetic.csv' )
+    parser.add_argument( '--seed', type=int, default=42 )
+    parser.add_argument( '--start-date', default=START_DATE )
+    parser.add_argument( '--days', type=int, default=DAYS )
+    args = parser.parse_args()
+
+    print( synthetic_csv( args.rows, args.out, args.seed, args.start_date, args.days ) )
+
+
+if __name__ == '__main__':
+    main()
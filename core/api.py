@@ -0,0 +1,506 @@
+"""
+    API HTTP de KPIs: as consultas das páginas ( core/query.py ) em JSON
+
+    Servidor asyncio sem dependências além da biblioteca padrão. As consultas
+    rodam em um pool de threads ( no backend pandas ou duckdb ) e as respostas
+    ficam em cache pelo ETag, que é derivado da versão do dataset, do backend e
+    dos parâmetros. Requisições com If-None-Match recebem 304 sem calcular nada.
+    Cada requisição fixa uma versão do dataset ( snapshot de core/data.py ): um
+    csv novo é carregado em segundo plano e as respostas trocam de versão juntas.
+
+    Rotas ( GET ou HEAD ):
+        /v1/health                    estado do servidor e contadores
+        /v1/version                   versão do dataset, backend e filtros aceitos
+        /v1/queries                   consultas disponíveis e suas colunas chave
+        /v1/queries/<nome>            resultado de uma consulta
+        /v1/error_bounds              limites de erro dos sketches ( 0 quando exatos )
+
+    Parâmetros das consultas ( os mesmos filtros da barra lateral ):
+        date=2022-04-13               data limite ( padrão: a data padrão das páginas )
+        traffic=Low,Medium,High,Jam   condições de trânsito ( vazio: nenhuma )
+        k=10&metric=distance          apenas em top_fastest / top_slowest
+
+    Uso:
+        python -m core.api --port 8600
+        CURRY_API_URL=http://127.0.0.1:8600 streamlit run Home.py
+"""
+# Bibliotecas
+import argparse
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+# Bibliotecas necessárias
+import pandas as pd
+
+from core import query, rollups
+from core.cache import filter_state, memoize, result_cache_stats
+from core.client import API_URL
+from core.data import DATA_PATH, acquire_snapshot, current_snapshot, pinned, refresh_snapshot, release_snapshot, snapshot_stats
+from core.query import QUERIES, RANK_METRICS, query_error_bounds, run_query
+
+# Endereço do servidor
+API_HOST = os.environ.get( 'CURRY_API_HOST', '127.0.0.1' )
+API_PORT = int( os.environ.get( 'CURRY_API_PORT', 8600 ) )
+
+# Consultas calculadas ao mesmo tempo ( threads do pool )
+API_WORKERS = int( os.environ.get( 'CURRY_API_WORKERS', 4 ) )
+
+# Consultas esperando cálculo; acima disso o servidor responde 503 com Retry-After
+API_MAX_PENDING = int( os.environ.get( 'CURRY_API_MAX_PENDING', 64 ) )
+
+# Memória máxima ( MB ) das respostas serializadas em cache
+RESPONSE_CACHE_MB = float( os.environ.get( 'CURRY_API_CACHE_MB', 64 ) )
+
+# Segundos sem requisição antes de fechar uma conexão keep-alive
+IDLE_TIMEOUT = 30
+
+# Tamanho máximo de uma linha da requisição ( request line ou cabeçalho )
+MAX_LINE_BYTES = 16 * 1024
+
+# Filtros aceitos, com os padrões da barra lateral das páginas
+TRAFFIC_OPTIONS = ['Low', 'Medium', 'High', 'Jam']
+DEFAULT_DATE = pd.Timestamp( 2022, 4, 13 )
+
+# Parâmetros aceitos por consulta além dos filtros
+QUERY_PARAMS = { 'top_fastest': ( 'k', 'metric' ), 'top_slowest': ( 'k', 'metric' ) }
+
+_STATUS = { 200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error', 503: 'Service Unavailable' }
+
+
+class BadRequest( ValueError ):
+    """
+        Parâmetro inválido na requisição ( resposta 400 )
+    """
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Estado do servidor
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+def create_app( path=DATA_PATH, backend=None, workers=API_WORKERS, max_pending=API_MAX_PENDING ):
+    """
+        Essa função cria o estado do servidor da API
+
+        Input: Caminho do csv, backend das consultas ( None usa o DEFAULT_BACKEND ),
+               threads do pool e limite da fila
+        Output: Dicionário com o estado do servidor
+    """
+    backend = backend or query.DEFAULT_BACKEND
+    if backend == 'api' or API_URL:
+        raise ValueError( 'O servidor da API calcula as consultas localmente: '
+                          'use o backend pandas ou duckdb e não defina CURRY_API_URL' )
+    if backend not in query.available_backends():
+        raise ValueError( 'Backend {} não disponível ( {} )'.format( backend, query.available_backends() ) )
+
+    return { 'path': path, 'backend': backend, 'max_pending': max_pending,
+             'executor': concurrent.futures.ThreadPoolExecutor( max_workers=workers, thread_name_prefix='api' ),
+             'reload': None,
+             'pending': 0, 'inflight': {}, 'responses': OrderedDict(), 'bytes': 0,
+             'stats': { 'requests': 0, 'not_modified': 0, 'cache_hits': 0, 'computed': 0,
+                        'coalesced': 0, 'rejected': 0, 'errors': 0 } }
+
+
+async def _snapshot( app ):
+    """
+        Essa função fixa ( pin ) a versão do dataset usada por uma requisição
+
+        Quando o csv muda, a versão nova é carregada no pool de threads e publicada
+        por refresh_snapshot ( core/data.py ); até a troca, as requisições seguem
+        na versão atual, sem esperar a releitura. Solta com release_snapshot.
+
+        Input: Estado do servidor
+        Output: Snapshot
+    """
+    loop = asyncio.get_running_loop()
+    snapshot = current_snapshot( app['path'] )
+    if snapshot is None:
+        snapshot = await loop.run_in_executor( app['executor'], refresh_snapshot, app['path'] )
+    elif app['reload'] is None:
+        stat = os.stat( app['path'] )
+        if ( stat.st_mtime, stat.st_size ) != ( snapshot['mtime'], snapshot['size'] ):
+            app['reload'] = loop.run_in_executor( app['executor'], refresh_snapshot, app['path'] )
+            app['reload'].add_done_callback( lambda f: _reloaded( app, f ) )
+
+    return acquire_snapshot( app['path'], snapshot )
+
+
+def _reloaded( app, future ):
+    app['reload'] = None
+    if not future.cancelled() and future.exception() is not None:
+        erro = future.exception()
+        traceback.print_exception( type( erro ), erro, erro.__traceback__ )
+
+
+def _pinned_build( app, snapshot, build ):
+    # O cálculo no pool usa a versão da requisição, mesmo que outra seja publicada no meio
+    def executar():
+        with pinned( app['path'], snapshot ):
+            return build()
+
+    return executar
+
+
+def _etag( *parts ):
+    return '"' + hashlib.sha1( json.dumps( parts, default=str ).encode() ).hexdigest() + '"'
+
+
+def _matches( headers, etag ):
+    pedidos = headers.get( 'if-none-match' )
+    if pedidos is None:
+        return False
+
+    pedidos = [p.strip() for p in pedidos.split( ',' )]
+    return '*' in pedidos or etag in pedidos or 'W/' + etag in pedidos
+
+
+def _store_response( app, etag, corpo ):
+    if etag in app['responses']:
+        return
+
+    app['responses'][etag] = corpo
+    app['bytes'] += len( corpo )
+    limite = RESPONSE_CACHE_MB * 2**20
+    while app['bytes'] > limite and len( app['responses'] ) > 1:
+        _, antigo = app['responses'].popitem( last=False )
+        app['bytes'] -= len( antigo )
+
+
+async def cached_response( app, etag, build ):
+    """
+        Essa função retorna o corpo de uma resposta, calculando apenas no miss
+
+        Sequência de passos:
+        1. Hit no cache de respostas ( LRU por bytes ): retorna o corpo guardado
+        2. Mesma resposta já em cálculo: espera o mesmo cálculo ( sem repetir )
+        3. Fila cheia: levanta OverflowError ( resposta 503 )
+        4. Calcula build() no pool de threads e guarda o corpo pelo ETag
+
+        Input: Estado do servidor, ETag e função sem argumentos que gera o corpo ( bytes )
+        Output: Corpo da resposta
+    """
+    stats = app['stats']
+    if etag in app['responses']:
+        app['responses'].move_to_end( etag )
+        stats['cache_hits'] += 1
+        return app['responses'][etag]
+
+    tarefa = app['inflight'].get( etag )
+    if tarefa is not None:
+        stats['coalesced'] += 1
+        return await asyncio.shield( tarefa )
+
+    if app['pending'] >= app['max_pending']:
+        stats['rejected'] += 1
+        raise OverflowError( 'Fila de consultas cheia ( {} )'.format( app['pending'] ) )
+
+    loop = asyncio.get_running_loop()
+    tarefa = asyncio.ensure_future( loop.run_in_executor( app['executor'], build ) )
+    app['pending'] += 1
+    app['inflight'][etag] = tarefa
+
+    def concluir( t ):
+        app['pending'] -= 1
+        app['inflight'].pop( etag, None )
+        if not t.cancelled() and t.exception() is None:
+            _store_response( app, etag, t.result() )
+
+    tarefa.add_done_callback( concluir )
+    stats['computed'] += 1
+
+    return await asyncio.shield( tarefa )
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Parâmetros e respostas
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+def parse_filters( name, params ):
+    """
+        Essa função valida os parâmetros de uma consulta
+
+        Input: Nome da consulta e parâmetros da URL ( parse_qs )
+        Output: Tupla ( estado dos filtros, dicionário com k / metric )
+    """
+    aceitos = { 'date', 'traffic' } | set( QUERY_PARAMS.get( name, () ) )
+    desconhecidos = sorted( set( params ) - aceitos )
+    if desconhecidos:
+        raise BadRequest( 'Parâmetros não aceitos em {}: {}'.format( name, ', '.join( desconhecidos ) ) )
+
+    repetidos = sorted( p for p, valores in params.items() if len( valores ) > 1 )
+    if repetidos:
+        raise BadRequest( 'Parâmetros repetidos: {}'.format( ', '.join( repetidos ) ) )
+
+    valores = { p: v[0] for p, v in params.items() }
+    try:
+        data = pd.Timestamp( valores['date'] ) if 'date' in valores else DEFAULT_DATE
+    except ValueError:
+        raise BadRequest( 'Data inválida: {}'.format( valores['date'] ) ) from None
+    if pd.isna( data ):
+        raise BadRequest( 'Data inválida: {}'.format( valores['date'] ) )
+
+    transito = TRAFFIC_OPTIONS
+    if 'traffic' in valores:
+        transito = [t.strip() for t in valores['traffic'].split( ',' ) if t.strip()]
+        invalidos = sorted( set( transito ) - set( TRAFFIC_OPTIONS ) )
+        if invalidos:
+            raise BadRequest( 'Condições de trânsito inválidas: {} ( aceitas: {} )'.format(
+                ', '.join( invalidos ), ', '.join( TRAFFIC_OPTIONS ) ) )
+
+    extras = {}
+    if 'k' in valores:
+        try:
+            extras['k'] = int( valores['k'] )
+        except ValueError:
+            raise BadRequest( 'k deve ser inteiro: {}'.format( valores['k'] ) ) from None
+        if not 1 <= extras['k'] <= 100:
+            raise BadRequest( 'k deve estar entre 1 e 100' )
+    if 'metric' in valores:
+        if valores['metric'] not in RANK_METRICS:
+            raise BadRequest( 'Métrica inválida: {} ( aceitas: {} )'.format( valores['metric'], ', '.join( RANK_METRICS ) ) )
+        extras['metric'] = valores['metric']
+
+    return filter_state( data, list( dict.fromkeys( transito ) ) ), extras
+
+
+def _json( obj ):
+    return json.dumps( obj, default=str ).encode()
+
+
+def query_body( app, name, state, params, version ):
+    """
+        Essa função calcula uma consulta e serializa a resposta ( roda no pool de threads )
+
+        O resultado usa o formato orient='table' do pandas ( esquema + linhas ), que
+        o pd.read_json reconstrói com os tipos das colunas ( core/client.py ).
+
+        Input: Estado do servidor, nome da consulta, estado dos filtros, parâmetros e versão do dataset
+        Output: Corpo JSON ( bytes )
+    """
+    # Mesmo cache de resultados das páginas ( core/cache.py )
+    df_aux = memoize( run_query, name, state, app['backend'], app['path'], key=state, path=app['path'], **params )
+    meta = { 'query': name, 'keys': QUERIES[name], 'dataset_version': version, 'backend': app['backend'],
+             'filters': { 'date': state[0].isoformat(), 'traffic': list( state[1] ) }, 'params': params }
+    tabela = df_aux.to_json( orient='table', index=False, date_format='iso' )
+
+    return _json( meta )[:-1] + b', "result": ' + tabela.encode() + b'}'
+
+
+async def respond( app, method, target, headers ):
+    """
+        Essa função responde uma requisição
+
+        Input: Estado do servidor, método, alvo ( caminho e query string ) e cabeçalhos ( minúsculos )
+        Output: Tupla ( status, corpo, cabeçalhos extras )
+    """
+    if method not in ( 'GET', 'HEAD' ):
+        return 405, _json( { 'error': 'Método não aceito: {}'.format( method ) } ), { 'Allow': 'GET, HEAD' }
+
+    url = urlsplit( target )
+    rota = url.path.rstrip( '/' )
+    params = parse_qs( url.query, keep_blank_values=True )
+
+    if rota == '/v1/health':
+        return 200, _json( { 'status': 'ok', 'pending': app['pending'], 'inflight': len( app['inflight'] ),
+                             'responses': len( app['responses'] ), 'response_bytes': app['bytes'],
+                             'stats': app['stats'], 'result_cache': result_cache_stats(),
+                             'snapshots': snapshot_stats( app['path'] ) } ), { 'Cache-Control': 'no-store' }
+
+    snapshot = await _snapshot( app )
+    try:
+        return await _respond_versioned( app, rota, url, params, headers, snapshot )
+    finally:
+        release_snapshot( snapshot )
+
+
+async def _respond_versioned( app, rota, url, params, headers, snapshot ):
+    version = snapshot['version']
+    sketches = rollups.SKETCH_MODE if app['backend'] == 'pandas' else 'exact'
+
+    if rota == '/v1/version':
+        etag = _etag( version, app['backend'], sketches )
+        build = lambda: _json( { 'dataset_version': version, 'backend': app['backend'], 'sketches': sketches,
+                                 'filters': { 'traffic': TRAFFIC_OPTIONS, 'default_date': DEFAULT_DATE.isoformat() },
+                                 'rank_metrics': RANK_METRICS } )
+    elif rota == '/v1/queries':
+        etag = _etag( version, 'queries' )
+        build = lambda: _json( { 'queries': { n: { 'keys': k, 'params': list( QUERY_PARAMS.get( n, () ) ) }
+                                              for n, k in QUERIES.items() } } )
+    elif rota == '/v1/error_bounds':
+        etag = _etag( version, app['backend'], sketches, 'error_bounds' )
+        build = lambda: _json( { 'dataset_version': version, 'backend': app['backend'],
+                                 'error_bounds': query_error_bounds( app['backend'], app['path'] ) } )
+    elif rota.startswith( '/v1/queries/' ):
+        name = rota[len( '/v1/queries/' ):]
+        if name not in QUERIES:
+            return 404, _json( { 'error': 'Consulta desconhecida: {}'.format( name ) } ), {}
+
+        state, extras = parse_filters( name, params )
+        etag = _etag( version, app['backend'], sketches, name, state, sorted( extras.items() ) )
+        build = lambda: query_body( app, name, state, extras, version )
+    else:
+        return 404, _json( { 'error': 'Rota desconhecida: {}'.format( url.path ) } ), {}
+
+    # A resposta só muda com a versão do dataset: o cliente revalida com o ETag
+    extras_headers = { 'ETag': etag, 'Cache-Control': 'no-cache', 'X-Dataset-Version': version }
+    if _matches( headers, etag ):
+        app['stats']['not_modified'] += 1
+        return 304, b'', extras_headers
+
+    corpo = await cached_response( app, etag, _pinned_build( app, snapshot, build ) )
+
+    return 200, corpo, extras_headers
+
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# HTTP
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+def _write( writer, status, corpo, headers, keep_alive, head=False ):
+    linhas = ['HTTP/1.1 {} {}'.format( status, _STATUS[status] ),
+              'Content-Type: application/json; charset=utf-8',
+              'Connection: {}'.format( 'keep-alive' if keep_alive else 'close' )]
+    # o 304 não tem corpo ( nem Content-Length, que seria o da resposta 200 )
+    if status != 304:
+        linhas.append( 'Content-Length: {}'.format( len( corpo ) ) )
+    linhas += ['{}: {}'.format( k, v ) for k, v in headers.items()]
+    writer.write( ( '\r\n'.join( linhas ) + '\r\n\r\n' ).encode( 'latin-1' ) )
+    if not head and status != 304:
+        writer.write( corpo )
+
+
+async def handle_connection( app, reader, writer ):
+    """
+        Essa função atende uma conexão HTTP/1.1, com keep-alive
+
+        Input: Estado do servidor e streams da conexão
+        Output: None
+    """
+    try:
+        while True:
+            linha = await asyncio.wait_for( reader.readline(), IDLE_TIMEOUT )
+            if not linha:
+                break
+            if not linha.strip():
+                continue
+
+            partes = linha.decode( 'latin-1' ).split()
+            headers = {}
+            while True:
+                cabecalho = await asyncio.wait_for( reader.readline(), IDLE_TIMEOUT )
+                if not cabecalho.strip():
+                    break
+                nome, _, valor = cabecalho.decode( 'latin-1' ).partition( ':' )
+                headers[nome.strip().lower()] = valor.strip()
+
+            if len( partes ) != 3 or not partes[2].startswith( 'HTTP/' ):
+                _write( writer, 400, _json( { 'error': 'Requisição inválida' } ), {}, False )
+                await writer.drain()
+                break
+
+            method, target, versao = partes
+            if int( headers.get( 'content-length', 0 ) or 0 ):
+                await reader.readexactly( int( headers['content-length'] ) )
+
+            conexao = headers.get( 'connection', '' ).lower()
+            keep_alive = conexao != 'close' if versao == 'HTTP/1.1' else conexao == 'keep-alive'
+
+            app['stats']['requests'] += 1
+            try:
+                status, corpo, extras = await respond( app, method, target, headers )
+            except BadRequest as e:
+                status, corpo, extras = 400, _json( { 'error': str( e ) } ), {}
+            except OverflowError as e:
+                status, corpo, extras = 503, _json( { 'error': str( e ) } ), { 'Retry-After': '1' }
+            except Exception as e:
+                app['stats']['errors'] += 1
+                traceback.print_exc()
+                status, corpo, extras = 500, _json( { 'error': '{}: {}'.format( type( e ).__name__, e ) } ), {}
+
+            _write( writer, status, corpo, extras, keep_alive, head=method == 'HEAD' )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ( asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError ):
+        # conexão ociosa, fechada pelo cliente ou linha maior que MAX_LINE_BYTES
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def warmup( app ):
+    """
+        Essa função carrega o dataset e as estruturas derivadas antes de aceitar conexões
+
+        Input: Estado do servidor
+        Output: Segundos gastos
+    """
+    inicio = time.perf_counter()
+    with pinned( app['path'] ) as snapshot:
+        state = filter_state( DEFAULT_DATE, TRAFFIC_OPTIONS )
+        for name in QUERIES:
+            query_body( app, name, state, {}, snapshot['version'] )
+        query_error_bounds( app['backend'], app['path'] )
+
+    return time.perf_counter() - inicio
+
+
+async def serve( app, host=API_HOST, port=API_PORT ):
+    """
+        Essa função abre o servidor e atende as conexões até ser interrompida
+
+        Input: Estado do servidor, endereço e porta ( 0 escolhe uma porta livre )
+        Output: None
+    """
+    server = await asyncio.start_server( lambda r, w: handle_connection( app, r, w ), host, port,
+                                         limit=MAX_LINE_BYTES, backlog=1024 )
+    endereco = server.sockets[0].getsockname()
+    # A primeira linha da saída é lida pelo benchmarks/bench_api.py
+    print( 'API de KPIs em http://{}:{}'.format( endereco[0], endereco[1] ), flush=True )
+
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser( description='API HTTP de KPIs ( consultas de core/query.py em JSON )' )
+    parser.add_argument( '--host', default=API_HOST )
+    parser.add_argument( '--port', type=int, default=API_PORT )
+    parser.add_argument( '--path', default=DATA_PATH, help='csv do dataset' )
+    parser.add_argument( '--backend', default=None, choices=['pandas', 'duckdb'] )
+    parser.add_argument( '--workers', type=int, default=API_WORKERS )
+    parser.add_argument( '--max-pending', type=int, default=API_MAX_PENDING )
+    parser.add_argument( '--no-warmup', action='store_true' )
+    args = parser.parse_args()
+
+    try:
+        app = create_app( args.path, args.backend, args.workers, args.max_pending )
+    except ValueError as e:
+        sys.exit( str( e ) )
+
+    if not args.no_warmup:
+        print( 'Aquecimento: {:.2f} s'.format( warmup( app ) ), file=sys.stderr, flush=True )
+
+    try:
+        asyncio.run( serve( app, args.host, args.port ) )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app['executor'].shutdown( cancel_futures=True )
+
+
+if __name__ == '__main__':
+    main()
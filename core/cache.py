@@ -0,0 +1,145 @@
+# Bibliotecas
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+# Bibliotecas necessárias
+import pandas as pd
+
+from core.client import API_URL, remote_version
+from core.data import DATA_PATH, dataset_version, on_reclaim
+from core.profiling import span
+
+# Memória máxima ( MB ) usada pelos resultados em cache, configurável por variável de ambiente
+CACHE_BUDGET_MB = float( os.environ.get( 'CURRY_RESULT_CACHE_MB', 256 ) )
+
+# Assim como o cache do dataset, os resultados vivem no processo do servidor
+# e são compartilhados por todas as sessões.
+_lock = threading.Lock()
+_results = OrderedDict()
+_stats = { 'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0 }
+
+
+def filter_state( date_slider, traffic_options ):
+    """
+        Essa função normaliza os filtros da barra lateral para serem usados como chave
+
+        Input: Data limite e lista de condições de trânsito
+        Output: Tupla ( a ordem das condições selecionadas não importa )
+    """
+    return ( pd.Timestamp( date_slider ), tuple( sorted( traffic_options ) ) )
+
+
+def _sizeof( obj ):
+    """
+        Essa função estima a memória ocupada por um resultado
+
+        Input: Dataframe, Series, figura ou outro objeto
+        Output: Bytes
+    """
+    if isinstance( obj, pd.DataFrame ):
+        return int( obj.memory_usage( deep=True ).sum() )
+    if isinstance( obj, pd.Series ):
+        return int( obj.memory_usage( deep=True ) )
+
+    try:
+        return len( pickle.dumps( obj, protocol=pickle.HIGHEST_PROTOCOL ) )
+    except Exception:
+        return sys.getsizeof( obj )
+
+
+def memoize( fn, *args, key, path=DATA_PATH, **kwargs ):
+    """
+        Essa função retorna o resultado de fn( *args, **kwargs ) do cache, calculando apenas no miss
+
+        A chave é ( versão do dataset, função, key, argumentos que não são
+        dataframes ). Com CURRY_API_URL a versão é a do dataset do servidor
+        ( core/client.py ), sem carregar o csv no processo das páginas. Os dataframes passados para a função são determinados pelos
+        filtros, que já estão em key ( ver filter_state ), e ficam de fora da chave.
+
+        Quando a memória passa de CACHE_BUDGET_MB, os resultados usados há mais
+        tempo são descartados ( LRU ). O resultado é compartilhado entre as
+        sessões e não deve ser modificado.
+
+        Input:
+            - fn: Função que gera o dataframe ou a figura
+            - args / kwargs: Argumentos da função
+            - key: Estado dos filtros ( filter_state )
+            - path: Caminho do csv ( define a versão do dataset )
+        Output: Resultado da função
+    """
+    escalares = tuple( a for a in args if not isinstance( a, ( pd.DataFrame, pd.Series ) ) )
+    nomeados = tuple( sorted( ( k, v ) for k, v in kwargs.items()
+                              if not isinstance( v, ( pd.DataFrame, pd.Series ) ) ) )
+    # As páginas rodam como __main__, então o arquivo identifica a origem da função
+    codigo = getattr( fn, '__code__', None )
+    origem = codigo.co_filename if codigo is not None else fn.__module__
+    versao = remote_version() if API_URL else dataset_version( path )
+    chave = ( versao, origem, fn.__qualname__, key, escalares, nomeados )
+
+    # Span com o nome da função ( core/profiling.py ): hit ou miss, e o tempo do cálculo
+    with span( fn.__qualname__ ) as info:
+        with _lock:
+            if chave in _results:
+                _results.move_to_end( chave )
+                _stats['hits'] += 1
+                info['cache'] = 'hit'
+                return _results[chave][0]
+            _stats['misses'] += 1
+
+        info['cache'] = 'miss'
+        result = fn( *args, **kwargs )
+        tamanho = _sizeof( result )
+
+        with _lock:
+            if chave not in _results:
+                _results[chave] = ( result, tamanho )
+                _stats['bytes'] += tamanho
+
+            limite = CACHE_BUDGET_MB * 2**20
+            while _stats['bytes'] > limite and len( _results ) > 1:
+                _, ( _, tamanho_antigo ) = _results.popitem( last=False )
+                _stats['bytes'] -= tamanho_antigo
+                _stats['evictions'] += 1
+
+        return result
+
+
+def result_cache_stats():
+    """
+        Essa função retorna as estatísticas do cache de resultados
+
+        Output: Dicionário com hits, misses, evictions, bytes e entries
+    """
+    with _lock:
+        return dict( _stats, entries=len( _results ) )
+
+
+@on_reclaim
+def drop_version( version ):
+    """
+        Essa função descarta os resultados de uma versão do dataset que saiu do cache
+
+        Chamada pelo core/data.py quando o último pin da versão antiga é solto.
+
+        Input: Versão ( hash do conteúdo )
+        Output: Quantidade de resultados descartados
+    """
+    with _lock:
+        chaves = [chave for chave in _results if chave[0] == version]
+        for chave in chaves:
+            _, tamanho = _results.pop( chave )
+            _stats['bytes'] -= tamanho
+
+    return len( chaves )
+
+
+def clear_result_cache():
+    """
+        Essa função descarta todos os resultados em cache
+    """
+    with _lock:
+        _results.clear()
+        _stats['bytes'] = 0
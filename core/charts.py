@@ -0,0 +1,221 @@
+# Bibliotecas
+import os
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+try:
+    import plotly.io as pio
+except ImportError:
+    pio = None
+
+# Largura ( px ) da área dos gráficos. O Streamlit não informa a largura da janela,
+# então ela vem do ?width= na URL ou deste padrão ( layout wide em uma tela comum )
+VIEWPORT_WIDTH = int( os.environ.get( 'CURRY_CHART_WIDTH', 1200 ) )
+
+# Pontos por figura ( soma dos traços ): o JSON enviado ao navegador fica com
+# tamanho limitado, qualquer que seja o número de linhas dos dados
+POINT_BUDGET = int( os.environ.get( 'CURRY_CHART_POINTS', 2000 ) )
+
+# Altura ( px ) dos gráficos ( a mesma do plotly ) e largura dos que não ocupam a coluna
+CHART_HEIGHT = int( os.environ.get( 'CURRY_CHART_HEIGHT', 450 ) )
+CHART_WIDTH = 700
+
+# De onde o navegador carrega o plotly.js: 'cdn' ( padrão ) ou 'inline' para embutir
+# no HTML de cada gráfico ( ~3.5 MB cada, para ambientes sem acesso à internet )
+PLOTLYJS = os.environ.get( 'CURRY_PLOTLYJS', 'cdn' )
+PLOTLYJS = True if PLOTLYJS.lower() in ( '1', 'true', 'inline' ) else PLOTLYJS
+
+# Linhas por página das tabelas ( st.dataframe )
+TABLE_PAGE_ROWS = int( os.environ.get( 'CURRY_TABLE_ROWS', 50 ) )
+
+
+def viewport_width( query_params ):
+    """
+        Essa função retorna a largura da área dos gráficos
+
+        Input: Parâmetros da URL ( st.experimental_get_query_params() )
+        Output: Largura em px ( ?width= ou VIEWPORT_WIDTH, entre 200 e 4000 )
+    """
+    try:
+        largura = int( query_params.get( 'width', [VIEWPORT_WIDTH] )[0] )
+    except ValueError:
+        largura = VIEWPORT_WIDTH
+
+    return min( max( largura, 200 ), 4000 )
+
+
+def max_points( width, traces=1 ):
+    """
+        Essa função calcula quantos pontos cada traço de um gráfico pode ter
+
+        Um ponto por pixel já desenha a série inteira; o POINT_BUDGET limita o
+        total quando o gráfico tem vários traços.
+
+        Input: Largura do gráfico ( px ) e quantidade de traços
+        Output: Pontos por traço
+    """
+    return max( min( int( width ), POINT_BUDGET // max( traces, 1 ) ), 3 )
+
+
+def lttb_indices( x, y, n ):
+    """
+        Essa função escolhe n pontos de uma série pelo Largest-Triangle-Three-Buckets
+
+        Sequência de passos:
+        1. Mantém o primeiro e o último ponto e divide os demais em n - 2 baldes
+        2. Em cada balde escolhe o ponto que forma o maior triângulo com o ponto
+           escolhido no balde anterior e a média do balde seguinte
+
+        Preserva o formato da linha ( picos e vales ) com bem menos pontos.
+
+        Input: x e y numéricos ( x crescente ) e quantidade de pontos
+        Output: Índices dos pontos escolhidos, em ordem
+    """
+    tamanho = len( y )
+    if n >= tamanho or n < 3:
+        return np.arange( tamanho )
+
+    x = np.asarray( x, dtype=np.float64 )
+    y = np.asarray( y, dtype=np.float64 )
+    bordas = np.linspace( 1, tamanho - 1, n - 1 ).astype( np.int64 )
+
+    indices = np.empty( n, dtype=np.int64 )
+    indices[0], indices[-1] = 0, tamanho - 1
+    a = 0
+    for i in range( n - 2 ):
+        ini, fim = bordas[i], bordas[i + 1]
+        # média do balde seguinte ( o último ponto, no último balde )
+        prox_ini, prox_fim = ( bordas[i + 1], bordas[i + 2] ) if i + 2 < n - 1 else ( tamanho - 1, tamanho )
+        mx, my = x[prox_ini:prox_fim].mean(), y[prox_ini:prox_fim].mean()
+
+        area = np.abs( ( x[a] - mx ) * ( y[ini:fim] - y[a] ) - ( x[a] - x[ini:fim] ) * ( my - y[a] ) )
+        a = ini + int( np.argmax( np.nan_to_num( area, nan=-1.0 ) ) )
+        indices[i + 1] = a
+
+    return indices
+
+
+def minmax_indices( y, n ):
+    """
+        Essa função escolhe até n pontos de uma série pelo mínimo e máximo de cada balde
+
+        Indicada para barras: os valores mostrados são os originais e os picos
+        de cada intervalo não somem.
+
+        Input: Valores e quantidade de pontos
+        Output: Índices dos pontos escolhidos, em ordem
+    """
+    tamanho = len( y )
+    if n >= tamanho or n < 2:
+        return np.arange( tamanho )
+
+    if n < 4:
+        return np.unique( np.linspace( 0, tamanho - 1, n ).astype( np.int64 ) )
+
+    y = np.nan_to_num( np.asarray( y, dtype=np.float64 ), nan=0.0 )
+    # o primeiro e o último ponto entram além dos baldes, então cabem ( n - 2 ) / 2 baldes
+    bordas = np.unique( np.linspace( 0, tamanho, max( ( n - 2 ) // 2, 1 ) + 1 ).astype( np.int64 ) )
+    escolhidos = [0, tamanho - 1]
+    for ini, fim in zip( bordas[:-1], bordas[1:] ):
+        escolhidos += [ini + int( np.argmin( y[ini:fim] ) ), ini + int( np.argmax( y[ini:fim] ) )]
+
+    return np.unique( escolhidos )
+
+
+def downsample( df, x, y, n, method='lttb', by=None ):
+    """
+        Essa função reduz as linhas de uma série temporal antes de montar o gráfico
+
+        Input:
+            - df: Dataframe ordenado por x
+            - x / y: Colunas do eixo x ( data ou número ) e do valor
+            - n: Pontos por traço ( max_points )
+            - method: 'lttb' ( linhas ) ou 'minmax' ( barras )
+            - by: Coluna dos traços ( color do plotly ), cada um reduzido separadamente
+        Output: Dataframe com no máximo n linhas por traço ( o próprio df se já cabe )
+    """
+    if by is not None:
+        partes = [downsample( parte, x, y, n, method ) for _, parte in df.groupby( by, sort=False )]
+        return pd.concat( partes ) if partes else df
+
+    if len( df ) <= n:
+        return df
+
+    valores = df[y].to_numpy()
+    if method == 'minmax':
+        indices = minmax_indices( valores, n )
+    else:
+        eixo = df[x]
+        eixo = eixo.astype( 'int64' ) if pd.api.types.is_datetime64_any_dtype( eixo ) else eixo
+        indices = lttb_indices( eixo.to_numpy(), valores, n )
+
+    return df.iloc[indices]
+
+
+def figure_html( fig, height=CHART_HEIGHT ):
+    """
+        Essa função serializa uma figura do plotly em HTML ( JSON da figura + chamada ao plotly.js )
+
+        O resultado vai para o memoize junto com a função do gráfico, então a
+        figura é serializada uma única vez por estado dos filtros e largura; o
+        plotly_chart do Streamlit serializa a figura de novo em todo rerun.
+
+        Input: Figura e altura ( px )
+        Output: String HTML
+    """
+    return pio.to_html( fig, include_plotlyjs=PLOTLYJS, full_html=False,
+                        default_width='100%', default_height='{}px'.format( height ),
+                        config={ 'displaylogo': False } )
+
+
+def show_figure( placeholder, html, use_container_width=True, height=CHART_HEIGHT ):
+    """
+        Essa função desenha no placeholder uma figura já serializada ( figure_html )
+
+        O HTML vem pronto do memoize: o rerun só envia a string ao navegador,
+        sem montar nem serializar a figura de novo.
+
+        Input: Placeholder ( st.empty() ), HTML da figura, se ocupa a largura da coluna e altura ( px )
+        Output: None
+    """
+    # o streamlit só é importado aqui: benchmarks e testes usam o core sem ele
+    import streamlit.components.v1 as components
+
+    with placeholder.container():
+        components.html( html, width=None if use_container_width else CHART_WIDTH, height=height + 10 )
+
+
+def paginate( df, page=0, size=TABLE_PAGE_ROWS ):
+    """
+        Essa função retorna uma página de um dataframe
+
+        Input: Dataframe, página ( a partir de 0 ) e linhas por página
+        Output: Tupla ( linhas da página, quantidade de páginas )
+    """
+    paginas = max( int( np.ceil( len( df ) / size ) ), 1 )
+    page = min( max( int( page ), 0 ), paginas - 1 )
+
+    return df.iloc[page * size:( page + 1 ) * size], paginas
+
+
+def show_table( placeholder, df, key, size=TABLE_PAGE_ROWS ):
+    """
+        Essa função desenha um dataframe página a página no placeholder
+
+        Só as linhas da página escolhida são enviadas ao navegador; o seletor de
+        página aparece quando a tabela tem mais de uma.
+
+        Input: Placeholder ( st.empty() ), dataframe, chave única do seletor e linhas por página
+        Output: None
+    """
+    container = placeholder.container()
+    pagina = 0
+    if len( df ) > size:
+        paginas = int( np.ceil( len( df ) / size ) )
+        pagina = container.number_input( 'Página ( de {}, {} linhas )'.format( paginas, len( df ) ),
+                                         min_value=1, max_value=paginas, value=1, key=key ) - 1
+
+    df_pagina, _ = paginate( df, pagina, size )
+    container.dataframe( df_pagina )
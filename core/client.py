@@ -0,0 +1,151 @@
+# Bibliotecas
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+# Bibliotecas necessárias
+import pandas as pd
+
+# Servidor da API de KPIs ( core/api.py ). Com a variável definida as páginas
+# viram clientes dele: as consultas usam o backend 'api' ( core/query.py ) e o
+# cache de resultados segue a versão do dataset do servidor ( core/cache.py )
+API_URL = os.environ.get( 'CURRY_API_URL', '' ).rstrip( '/' )
+
+# Segundos em que a versão do dataset do servidor é reaproveitada sem perguntar de novo
+VERSION_TTL = float( os.environ.get( 'CURRY_API_VERSION_TTL', 2 ) )
+
+# Tempo máximo de uma requisição ( segundos )
+REQUEST_TIMEOUT = float( os.environ.get( 'CURRY_API_TIMEOUT', 30 ) )
+
+# Respostas guardadas para as requisições condicionais ( If-None-Match )
+CACHE_ENTRIES = 512
+
+_lock = threading.Lock()
+_responses = OrderedDict()
+_version = { 'value': None, 'checked': 0.0 }
+
+
+class APIError( RuntimeError ):
+    """
+        Erro devolvido pelo servidor da API ( status e mensagem do corpo JSON )
+    """
+
+    def __init__( self, status, message ):
+        super().__init__( 'API respondeu {}: {}'.format( status, message ) )
+        self.status = status
+
+
+def state_params( state ):
+    """
+        Essa função converte o estado dos filtros nos parâmetros da API
+
+        Input: Estado dos filtros ( filter_state )
+        Output: Dicionário date / traffic
+    """
+    data = state[0]
+    data = data.strftime( '%Y-%m-%d' ) if data == data.normalize() else data.isoformat()
+
+    return { 'date': data, 'traffic': ','.join( state[1] ) }
+
+
+def api_get( route, params=None, url=None ):
+    """
+        Essa função faz um GET na API, revalidando a resposta guardada com o ETag
+
+        Sequência de passos:
+        1. Monta a URL com os parâmetros em ordem ( a mesma consulta gera a mesma URL )
+        2. Envia o ETag da última resposta dessa URL no If-None-Match
+        3. 304: reaproveita a resposta guardada; 200: guarda a nova ( LRU )
+
+        Input: Rota ( '/v1/...' ), parâmetros e URL do servidor ( None usa API_URL )
+        Output: Corpo da resposta ( JSON decodificado )
+    """
+    base = ( url or API_URL ).rstrip( '/' )
+    if not base:
+        raise RuntimeError( 'CURRY_API_URL não definida' )
+
+    endereco = base + route
+    if params:
+        endereco += '?' + urllib.parse.urlencode( sorted( params.items() ) )
+
+    with _lock:
+        guardada = _responses.get( endereco )
+
+    pedido = urllib.request.Request( endereco, headers={ 'Accept': 'application/json' } )
+    if guardada is not None:
+        pedido.add_header( 'If-None-Match', guardada[0] )
+
+    try:
+        with urllib.request.urlopen( pedido, timeout=REQUEST_TIMEOUT ) as resposta:
+            corpo = json.loads( resposta.read() )
+            etag = resposta.headers.get( 'ETag' )
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and guardada is not None:
+            with _lock:
+                if endereco in _responses:
+                    _responses.move_to_end( endereco )
+            return guardada[1]
+
+        try:
+            mensagem = json.loads( e.read() ).get( 'error', e.reason )
+        except ValueError:
+            mensagem = e.reason
+        raise APIError( e.code, mensagem ) from None
+
+    if etag:
+        with _lock:
+            _responses[endereco] = ( etag, corpo )
+            _responses.move_to_end( endereco )
+            while len( _responses ) > CACHE_ENTRIES:
+                _responses.popitem( last=False )
+
+    return corpo
+
+
+def remote_version( url=None ):
+    """
+        Essa função retorna a versão do dataset servido pela API
+
+        A versão é guardada por VERSION_TTL segundos, então um rerun faz no
+        máximo uma requisição de versão.
+
+        Input: URL do servidor ( None usa API_URL )
+        Output: String hexadecimal
+    """
+    agora = time.monotonic()
+    with _lock:
+        if _version['value'] is not None and agora - _version['checked'] < VERSION_TTL:
+            return _version['value']
+
+    versao = api_get( '/v1/version', url=url )['dataset_version']
+    with _lock:
+        _version.update( value=versao, checked=agora )
+
+    return versao
+
+
+def remote_query( name, state, url=None, **params ):
+    """
+        Essa função executa uma consulta de core/query.py no servidor da API
+
+        Input: Nome da consulta ( QUERIES ), estado dos filtros, URL do servidor e parâmetros ( k, metric )
+        Output: Dataframe com as mesmas colunas do run_query local
+    """
+    corpo = api_get( '/v1/queries/' + name, dict( state_params( state ), **params ), url=url )
+
+    return pd.read_json( json.dumps( corpo['result'] ), orient='table' )
+
+
+def remote_error_bounds( url=None ):
+    """
+        Essa função retorna os limites de erro das consultas do servidor da API
+
+        Input: URL do servidor ( None usa API_URL )
+        Output: Dicionário com o erro dos distintos e dos quantis
+    """
+    return api_get( '/v1/error_bounds', url=url )['error_bounds']
@@ -0,0 +1,98 @@
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.data import DATA_PATH, derived
+
+# Dimensões do cubo ( todas de baixa cardinalidade )
+DIMENSIONS = ['Order_Date', 'City', 'Road_traffic_density', 'Type_of_order', 'Festival', 'Weatherconditions']
+
+# Medidas: nome curto -> coluna do dataframe limpo
+MEASURES = { 'time': 'Time_taken(min)', 'rating': 'Delivery_person_Ratings', 'distance': 'distance' }
+
+
+def build_cube( df1 ):
+    """
+        Essa função agrega o dataframe limpo em um cubo com uma linha por célula das dimensões
+
+        Cada célula guarda a quantidade de pedidos e, para cada medida, a quantidade
+        de valores não nulos, a soma e a soma dos quadrados. Com isso a média e o
+        desvio padrão de qualquer agrupamento saem somando células.
+
+        Input: Dataframe limpo
+        Output: Dataframe ( cubo )
+    """
+    aux = { col: df1[col] for col in DIMENSIONS }
+    aux['count'] = np.ones( len( df1 ), dtype=np.int64 )
+    for name, col in MEASURES.items():
+        valores = df1[col].astype( float )
+        aux[name + '_n'] = valores.notna().astype( np.int64 )
+        aux[name + '_sum'] = valores
+        aux[name + '_sumsq'] = valores ** 2
+
+    cube = (pd.DataFrame( aux, index=df1.index )
+              .groupby( DIMENSIONS, observed=True )
+              .sum()
+              .reset_index())
+
+    return cube
+
+
+def merge_cubes( *cubes ):
+    """
+        Essa função junta cubos somando as células iguais
+
+        Input: Cubos
+        Output: Dataframe ( cubo )
+    """
+    return (pd.concat( cubes, ignore_index=True )
+              .groupby( DIMENSIONS, observed=True )
+              .sum()
+              .reset_index())
+
+
+def load_cube( path=DATA_PATH ):
+    """
+        Essa função retorna o cubo da versão atual do dataset ( construído uma única vez )
+
+        Input: Caminho do csv
+        Output: Dataframe ( cubo )
+    """
+    return derived( 'cube', build_cube, path, update=lambda cube, df1, delta: merge_cubes( cube, build_cube( delta ) ) )
+
+
+def slice_cube( cube, date_slider, traffic_options ):
+    """
+        Essa função aplica os filtros da barra lateral nas células do cubo
+
+        Input: Cubo, data limite ( exclusiva ) e lista de condições de trânsito
+        Output: Dataframe ( cubo filtrado )
+    """
+    linhas_selecionadas = ( ( cube['Order_Date'] < date_slider )
+                            & cube['Road_traffic_density'].isin( traffic_options ) )
+
+    return cube.loc[linhas_selecionadas, :]
+
+
+def rollup( cube, by, measure='time' ):
+    """
+        Essa função agrega as células do cubo pelas dimensões escolhidas
+
+        Sequência de passos:
+        1. Soma count, n, soma e soma dos quadrados da medida por grupo ( ordenado pelas dimensões )
+        2. Calcula a média e o desvio padrão amostral ( mesmo ddof=1 do pandas )
+
+        Input:
+            - cube: Cubo ( ou fatia do cubo )
+            - by: Lista de dimensões
+            - measure: 'time', 'rating' ou 'distance'
+        Output: Dataframe com as dimensões e as colunas count, mean e std
+    """
+    n, s, sq = measure + '_n', measure + '_sum', measure + '_sumsq'
+    grupos = cube.groupby( by, observed=True )[['count', n, s, sq]].sum().sort_index()
+
+    mean = grupos[s] / grupos[n]
+    var = ( grupos[sq] - grupos[s] ** 2 / grupos[n] ) / ( grupos[n] - 1 )
+    std = np.sqrt( var.clip( lower=0 ) ).where( grupos[n] > 1 )
+
+    return pd.DataFrame( { 'count': grupos['count'], 'mean': mean, 'std': std } ).reset_index()
@@ -0,0 +1,907 @@
+# Bibliotecas
+import contextlib
+import ctypes
+import gc
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+from pandas.api.types import union_categoricals
+
+from core.geo import DELIVERY_COLUMNS, RESTAURANT_COLUMNS, delivery_distance, fix_sign
+from core.profiling import span
+from core.storage import pa, read_columnar, read_derived, write_columnar, write_derived
+
+logger = logging.getLogger( __name__ )
+
+DATA_PATH = 'train.csv'
+
+# Sentinela usada pelo csv para valores ausentes
+NA_SENTINEL = 'NaN '
+
+# Linhas com 'NaN ' em alguma dessas colunas são removidas pelo clean_code
+NA_COLUMNS = ['Delivery_person_Age', 'multiple_deliveries', 'Road_traffic_density', 'City']
+
+# Colunas categóricas que têm espaços no final dos valores
+STRIP_COLUMNS = ['Road_traffic_density', 'Type_of_order', 'Type_of_vehicle', 'City', 'Festival']
+
+# Tipos declarados na leitura do csv
+READ_DTYPES = {
+    'ID': 'object',
+    'Delivery_person_ID': 'category',
+    'Delivery_person_Age': 'float64',
+    'Delivery_person_Ratings': 'float64',
+    'Restaurant_latitude': 'float64',
+    'Restaurant_longitude': 'float64',
+    'Delivery_location_latitude': 'float64',
+    'Delivery_location_longitude': 'float64',
+    'Order_Date': 'category',
+    'Time_Orderd': 'category',
+    'Time_Order_picked': 'category',
+    'Weatherconditions': 'category',
+    'Road_traffic_density': 'category',
+    'Vehicle_condition': 'int64',
+    'Type_of_order': 'category',
+    'Type_of_vehicle': 'category',
+    'multiple_deliveries': 'float64',
+    'Festival': 'category',
+    'City': 'category',
+    'Time_taken(min)': 'category',
+}
+
+READ_NA_VALUES = { col: [NA_SENTINEL] for col in NA_COLUMNS + ['Delivery_person_Ratings'] }
+
+# Tipos compactos do dataframe limpo ( ver compact )
+INT_COLUMNS = ['Delivery_person_Age', 'Vehicle_condition', 'multiple_deliveries', 'Time_taken(min)']
+FLOAT32_COLUMNS = ['Delivery_person_Ratings'] + RESTAURANT_COLUMNS + DELIVERY_COLUMNS + ['distance']
+# IDs únicos por pedido: um buffer contíguo do Arrow em vez de um objeto Python por linha
+STRING_COLUMNS = ['ID']
+STRING_DTYPE = 'string[pyarrow]'
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Cache do dataset ( snapshots versionados )
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+# O Streamlit executa o script da página a cada interação, mas os módulos
+# importados vivem durante todo o processo do servidor. O cache fica aqui
+# para que todas as sessões e páginas compartilhem o mesmo dataframe limpo.
+#
+# Cada versão do csv é um snapshot imutável ( dataframe e estruturas derivadas ).
+# A versão nova é carregada fora do _lock e publicada trocando o snapshot atual;
+# quem fixou a versão anterior ( pin ) continua nela até soltar, e ela sai do
+# cache quando o último pin é solto.
+_lock = threading.RLock()
+_stores = {}
+_stats = { 'hits': 0, 'misses': 0, 'load_time': 0.0, 'published': 0, 'reclaimed': 0 }
+_local = threading.local()
+_reclaim_hooks = []
+
+# Segundos sem mudanças no csv antes de uma versão nova ser lida: um arquivo
+# ainda sendo escrito não é publicado pela metade
+RELOAD_SETTLE_SECONDS = float( os.environ.get( 'CURRY_RELOAD_SETTLE', 1.0 ) )
+def _file_hasher( path ):
+    """
+        Essa função calcula o hash (md5) do conteúdo de um arquivo
+
+        O objeto md5 é retornado ( e guardado no cache ) para que o hash possa
+        ser continuado quando novas linhas são anexadas ao arquivo.
+
+        Input: Caminho do arquivo
+        Output: Objeto hashlib.md5
+    """
+    digest = hashlib.md5()
+    with open( path, 'rb' ) as f:
+        for block in iter( lambda: f.read( 1 << 20 ), b'' ):
+            digest.update( block )
+
+    return digest
+
+
+def file_digest( path ):
+    """
+        Essa função calcula o hash (md5) do conteúdo de um arquivo
+
+        Input: Caminho do arquivo
+        Output: String hexadecimal
+    """
+    return _file_hasher( path ).hexdigest()
+
+
+def cache_stats():
+    """
+        Essa função retorna as estatísticas do cache do dataset
+
+        Output: Dicionário com hits, misses, load_time (segundos da última carga),
+                published e reclaimed ( versões publicadas e descartadas )
+    """
+    with _lock:
+        return dict( _stats )
+
+
+def read_raw( path=DATA_PATH, **kwargs ):
+    """
+        Essa função lê o csv bruto já com os tipos e as sentinelas de NaN declarados
+
+        Input: Caminho do csv e argumentos extras do pd.read_csv ( ex.: chunksize )
+        Output: Dataframe ( ou iterador de dataframes )
+    """
+    return pd.read_csv( path, dtype=READ_DTYPES, na_values=READ_NA_VALUES, **kwargs )
+
+
+def _typed( df1 ):
+    """
+        Essa função garante os tipos de READ_DTYPES em um dataframe lido sem o read_raw
+
+        Input: Dataframe
+        Output: Dataframe
+    """
+    colunas = {}
+    for col, dtype in READ_DTYPES.items():
+        if col not in df1.columns or df1[col].dtype == dtype:
+            continue
+
+        serie = df1[col]
+        if col in READ_NA_VALUES and serie.dtype == object:
+            serie = serie.mask( serie == NA_SENTINEL )
+        colunas[col] = serie.astype( dtype )
+
+    if colunas:
+        df1 = df1.assign( **colunas )
+
+    return df1
+
+
+def _from_categories( serie, parse, as_category=False ):
+    """
+        Essa função aplica a conversão apenas nos valores distintos de uma coluna categórica
+
+        Input: Series categórica, função de conversão das categorias e as_category
+               ( resultado categórico, para conversões com poucos valores distintos )
+        Output: Series
+    """
+    valores = np.asarray( parse( serie.cat.categories ) )
+    codigos = serie.cat.codes.to_numpy()
+
+    if as_category:
+        # O código -1 ( ausente ) pega o último elemento, que também é -1
+        novos, categorias = pd.factorize( valores, sort=True )
+        novos = np.append( novos, -1 )
+        return pd.Series( pd.Categorical.from_codes( novos[codigos], categories=categorias ), index=serie.index )
+
+    return pd.Series( take( valores, codigos, allow_fill=True ), index=serie.index )
+
+
+def _strip_categories( serie ):
+    """
+        Essa função remove os espaços das categorias de uma coluna categórica
+
+        Input: Series categórica
+        Output: Series categórica
+    """
+    categorias = serie.cat.categories.str.strip()
+    if categorias.is_unique:
+        return serie.cat.rename_categories( categorias )
+
+    return serie.astype( object ).str.strip().astype( 'category' )
+
+
+def clean_code( df1 ):
+    """
+        Esta função tem a responsabilidade de limpar o dataframe
+
+        Tipos de limpeza
+        1. Remoção dos dados NaN ( uma única máscara para todas as colunas )
+           e ordenação das linhas por Order_Date
+        2. Mudança do tipo da coluna de dados
+        3. Formatação da coluna de datas
+        4. Lipeza da coluna de tempo ( remoção do texto da variável numérica )
+        5. Reoção dos espaços das variáveis de texo
+        6. Correção das coordenadas e cálculo da distância da entrega
+        7. Tipos compactos ( compact )
+
+        Datas e tempo são convertidos apenas nos valores distintos ( categorias ),
+        então o custo não cresce com o número de linhas.
+
+        Input: Dataframe ( de preferência lido com read_raw )
+        Output: Dataframe
+    """
+    df1 = _typed( df1 )
+    datas = lambda c: pd.to_datetime( c, format='%d-%m-%Y' )
+
+    # 1. Removendo as linhas com 'NaN ' e ordenando por data em uma única cópia
+    linhas = np.flatnonzero( df1[NA_COLUMNS].notna().all( axis=1 ).to_numpy() )
+    ordem = np.argsort( np.asarray( datas( df1['Order_Date'].cat.categories ) ), kind='stable' )
+    rank = np.empty_like( ordem )
+    rank[ordem] = np.arange( len( ordem ) )
+    codigos = df1['Order_Date'].cat.codes.to_numpy()[linhas]
+    df1 = df1.take( linhas[np.argsort( rank[codigos], kind='stable' )] )
+
+    # 2. Convertendo Age e multiple_deliveries para número inteiro
+    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype( int )
+    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype( int )
+
+    # 3. Convertendo a coluna order_date de texto para data ( a semana ISO é
+    #    calculada nas agregações, ver core/rollups.py iso_week_key )
+    df1['Order_Date'] = _from_categories( df1['Order_Date'], datas )
+
+    # 4. Limpando a coluna de time taken
+    tempo = lambda c: c.str.split( '(min)', regex=False ).str[1].str.strip().astype( int )
+    df1['Time_taken(min)'] = _from_categories( df1['Time_taken(min)'], tempo ).astype( int )
+
+    # 5. Removendo os espaços das strings
+    df1['ID'] = df1['ID'].str.strip()
+    for col in STRIP_COLUMNS:
+        df1[col] = _strip_categories( df1[col] )
+
+    # 6. Corrigindo o sinal das coordenadas do restaurante e calculando a distância
+    for col, ref in zip( RESTAURANT_COLUMNS, DELIVERY_COLUMNS ):
+        df1[col] = fix_sign( df1[col].to_numpy(), df1[ref].to_numpy() )
+    df1['distance'] = delivery_distance( df1 )
+
+    # 7. Reduzindo a memória de cada coluna
+    return compact( df1 )
+
+
+def compact( df1 ):
+    """
+        Essa função converte as colunas do dataframe limpo para tipos compactos
+
+        Sequência de passos:
+        1. Texto com poucos valores distintos vira categoria ( códigos inteiros pequenos )
+        2. Inteiros são reduzidos ao menor tipo que comporta os valores
+        3. Avaliações, coordenadas e distância passam para float32
+        4. IDs únicos ficam em um array de strings do Arrow ( se o pyarrow estiver instalado )
+
+        As somas e médias que precisam de precisão ( cubo, perfis ) convertem os
+        valores para float64 antes de somar.
+
+        Input: Dataframe limpo
+        Output: Dataframe com os tipos compactos
+    """
+    colunas = {}
+    for col in df1.columns:
+        serie = df1[col]
+        if col in INT_COLUMNS:
+            colunas[col] = pd.to_numeric( serie, downcast='integer' )
+        elif col in FLOAT32_COLUMNS:
+            colunas[col] = serie.astype( np.float32 )
+        elif col in STRING_COLUMNS:
+            if pa is not None:
+                colunas[col] = serie.astype( STRING_DTYPE )
+        elif serie.dtype == object:
+            colunas[col] = serie.astype( 'category' )
+
+    return df1.assign( **colunas )
+
+
+def memory_report( df1 ):
+    """
+        Essa função mostra quanta memória cada coluna do dataframe ocupa
+
+        Input: Dataframe
+        Output: Dataframe com dtype, bytes, bytes por linha e participação de cada coluna
+    """
+    uso = df1.memory_usage( deep=True )
+    tipos = pd.Series( { col: str( df1[col].dtype ) for col in df1.columns } ).reindex( uso.index ).fillna( str( df1.index.dtype ) )
+    report = pd.DataFrame( { 'dtype': tipos, 'bytes': uso, 'bytes_per_row': uso / max( len( df1 ), 1 ),
+                             'share': uso / uso.sum() } )
+
+    return report.sort_values( 'bytes', ascending=False )
+
+
+def _trim_heap():
+    """
+        Essa função devolve ao sistema a memória liberada pelo processo ( glibc )
+
+        A leitura e a limpeza criam muitos objetos temporários; depois de liberados,
+        o malloc guarda as páginas para reutilizar e o RSS do worker continua no
+        pico. Em sistemas sem glibc a função não faz nada.
+
+        Input: Nenhum
+        Output: None
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL( 'libc.so.6' ).malloc_trim( 0 )
+    except ( OSError, AttributeError ):
+        pass
+
+
+def _store( path ):
+    with _lock:
+        if path not in _stores:
+            _stores[path] = { 'current': None, 'snapshots': {}, 'write_lock': threading.Lock(), 'failed': None }
+        return _stores[path]
+
+
+def _new_snapshot( path, stat, hasher, df1, derived=None, updaters=None ):
+    return { 'version': hasher.hexdigest(), 'path': path, 'mtime': stat.st_mtime, 'size': stat.st_size,
+             'hasher': hasher, 'df': df1, 'derived': derived or {}, 'updaters': updaters or {},
+             'refs': 0, 'lock': threading.RLock(), 'created': time.time() }
+
+
+def on_reclaim( callback ):
+    """
+        Essa função registra uma função chamada quando uma versão do dataset sai do cache
+
+        Usada pelos caches mantidos por versão fora deste módulo ( ex.: core/cache.py ).
+
+        Input: Função que recebe a versão ( hash do conteúdo )
+        Output: A própria função
+    """
+    _reclaim_hooks.append( callback )
+    return callback
+
+
+def _reclaim( store, snapshot ):
+    """
+        Essa função tira do cache um snapshot que não é o atual e não tem pins
+
+        O dataframe e as estruturas derivadas são liberados quando a última
+        referência a eles some ( ex.: uma consulta sem pin ainda em andamento ).
+        Chamada com o _lock; retorna as versões descartadas para os hooks.
+    """
+    if snapshot['refs'] > 0 or store['current'] is snapshot:
+        return []
+    if store['snapshots'].get( snapshot['version'] ) is not snapshot:
+        return []
+
+    del store['snapshots'][snapshot['version']]
+    _stats['reclaimed'] += 1
+    logger.info( 'Versão %s do dataset %s descartada', snapshot['version'][:12], snapshot['path'] )
+
+    return [snapshot['version']]
+
+
+def _run_reclaim_hooks( versoes ):
+    for versao in versoes:
+        for callback in _reclaim_hooks:
+            callback( versao )
+
+
+def _publish( store, snapshot ):
+    """
+        Essa função publica um snapshot como a versão atual do dataset
+
+        A troca é uma atribuição sob o _lock: as leituras seguintes veem a versão
+        nova inteira, e as que fixaram a anterior continuam nela.
+    """
+    with _lock:
+        anterior = store['current']
+        store['current'] = snapshot
+        store['snapshots'][snapshot['version']] = snapshot
+        store['failed'] = None
+        _stats['published'] += 1
+        versoes = _reclaim( store, anterior ) if anterior is not None else []
+
+    _run_reclaim_hooks( versoes )
+
+
+def _load_snapshot( path, store ):
+    """
+        Essa função lê uma versão nova do csv e a publica ( chamada com o write_lock do path )
+
+        Sequência de passos:
+        1. Se o ( mtime, tamanho ) do arquivo é o do snapshot atual, retorna o atual (hit)
+        2. Se o hash do conteúdo é o do atual ( ex.: touch ), apenas atualiza o mtime (hit)
+        3. Caso contrário ( miss ), lê o cache colunar gerado para esse mesmo hash
+           ( core/storage.py ) ou, se ele não existir, lê o csv, aplica o clean_code
+           e grava o cache colunar para o próximo processo
+        4. Se o arquivo mudou durante a leitura, descarta o que foi lido ( retorna None )
+        5. Publica o snapshot novo
+
+        Input: Caminho do csv e store do path
+        Output: Snapshot publicado, ou None
+    """
+    antes = os.stat( path )
+    with _lock:
+        atual = store['current']
+        if atual is not None and ( atual['mtime'], atual['size'] ) == ( antes.st_mtime, antes.st_size ):
+            _stats['hits'] += 1
+            return atual
+
+    # Spans ( core/profiling.py ) só quando o arquivo é relido
+    with span( 'file_digest' ):
+        hasher = _file_hasher( path )
+    digest = hasher.hexdigest()
+    if atual is not None and atual['version'] == digest:
+        with _lock:
+            atual['mtime'], atual['size'] = antes.st_mtime, antes.st_size
+            _stats['hits'] += 1
+        return atual
+
+    start = time.perf_counter()
+    with span( 'load_data' ) as info:
+        with span( 'read_columnar' ):
+            df1 = read_columnar( path, digest )
+        source = 'cache colunar'
+        if df1 is None:
+            with span( 'read_csv' ):
+                raw = read_raw( path )
+            with span( 'clean_code' ):
+                df1 = clean_code( raw )
+            del raw
+            source = 'csv'
+            with span( 'write_columnar' ):
+                write_columnar( path, df1, digest )
+        info.update( source=source, rows=len( df1 ) )
+    load_time = time.perf_counter() - start
+
+    depois = os.stat( path )
+    if ( depois.st_mtime, depois.st_size ) != ( antes.st_mtime, antes.st_size ):
+        logger.warning( 'Dataset %s mudou durante a leitura; a versão lida foi descartada', path )
+        return None
+
+    snapshot = _new_snapshot( path, antes, hasher, df1 )
+    _publish( store, snapshot )
+    with _lock:
+        _stats['misses'] += 1
+        _stats['load_time'] = load_time
+    # Sem isso o processo mantém a memória de pico da leitura
+    _trim_heap()
+    logger.info( 'Dataset %s carregado do %s em %.3fs (%d linhas, versão %s)',
+                 path, source, load_time, len( df1 ), digest[:12] )
+
+    return snapshot
+
+
+def refresh_snapshot( path=DATA_PATH ):
+    """
+        Essa função retorna o snapshot atual do dataset, carregando a versão nova quando o csv muda
+
+        Sequência de passos:
+        1. Sem mudança no ( mtime, tamanho ) do csv, retorna o snapshot atual
+        2. Com mudança há menos de RELOAD_SETTLE_SECONDS ( arquivo talvez ainda
+           sendo escrito ) ou já carregando em outra thread, também retorna o atual:
+           a recarga nunca bloqueia as leituras
+        3. Senão carrega e publica a versão nova ( _load_snapshot ). Se a leitura
+           falhar, a versão atual continua publicada até o arquivo mudar de novo
+
+        Só a primeira carga de cada csv espera a leitura.
+
+        Input: Caminho do csv
+        Output: Snapshot ( dicionário com version, df, derived, ... )
+    """
+    store = _store( path )
+    while True:
+        stat = os.stat( path )
+        with _lock:
+            atual = store['current']
+            if atual is not None:
+                marca = ( stat.st_mtime, stat.st_size )
+                if marca == ( atual['mtime'], atual['size'] ):
+                    _stats['hits'] += 1
+                    return atual
+                if marca == store['failed'] or time.time() - stat.st_mtime < RELOAD_SETTLE_SECONDS:
+                    _stats['hits'] += 1
+                    return atual
+
+        if not store['write_lock'].acquire( blocking=atual is None ):
+            return atual
+        try:
+            snapshot = _load_snapshot( path, store )
+        except Exception:
+            if atual is None:
+                raise
+            logger.exception( 'Falha ao recarregar o dataset %s; a versão %s continua publicada',
+                              path, atual['version'][:12] )
+            with _lock:
+                store['failed'] = ( stat.st_mtime, stat.st_size )
+            return atual
+        finally:
+            store['write_lock'].release()
+
+        if snapshot is not None:
+            return snapshot
+        if atual is not None:
+            return atual
+        # Primeira carga de um arquivo que ainda está sendo escrito
+        time.sleep( RELOAD_SETTLE_SECONDS )
+
+
+def current_snapshot( path=DATA_PATH ):
+    """
+        Essa função retorna o snapshot publicado, sem olhar o arquivo
+
+        Input: Caminho do csv
+        Output: Snapshot, ou None se o csv ainda não foi carregado
+    """
+    with _lock:
+        store = _stores.get( path )
+        return store['current'] if store is not None else None
+
+
+def acquire_snapshot( path=DATA_PATH, snapshot=None ):
+    """
+        Essa função fixa ( pin ) uma versão do dataset: ela não sai do cache até o release_snapshot
+
+        Input: Caminho do csv e snapshot a fixar ( None fixa o atual, via refresh_snapshot )
+        Output: Snapshot
+    """
+    if snapshot is None:
+        snapshot = refresh_snapshot( path )
+
+    store = _store( snapshot['path'] )
+    with _lock:
+        snapshot['refs'] += 1
+        # um snapshot já descartado volta para o cache enquanto estiver fixado
+        store['snapshots'].setdefault( snapshot['version'], snapshot )
+
+    return snapshot
+
+
+def release_snapshot( snapshot ):
+    """
+        Essa função solta um pin do acquire_snapshot; sem pins, a versão antiga sai do cache
+
+        Input: Snapshot
+        Output: None
+    """
+    store = _store( snapshot['path'] )
+    with _lock:
+        snapshot['refs'] -= 1
+        versoes = _reclaim( store, snapshot )
+
+    _run_reclaim_hooks( versoes )
+
+
+class SnapshotPin:
+    """
+        Pin de um snapshot, solto com release() ou quando o objeto é coletado
+        ( ex.: a sessão do Streamlit que guardava o pin terminou )
+    """
+
+    def __init__( self, snapshot ):
+        self.snapshot = snapshot
+        self._finalizer = weakref.finalize( self, release_snapshot, snapshot )
+
+    def release( self ):
+        self._finalizer()
+
+
+def _context():
+    return { 'pins': {}, 'lock': threading.Lock() }
+
+
+def _snapshot( path ):
+    """
+        Essa função retorna o snapshot usado pela thread: o fixado no contexto ( pin_session,
+        pinned ou bind_pins ) ou, sem contexto, o atual
+
+        No contexto, o primeiro acesso a cada csv fixa o snapshot atual, e os
+        seguintes usam o mesmo até o contexto acabar.
+    """
+    contexto = getattr( _local, 'context', None )
+    if contexto is None:
+        return refresh_snapshot( path )
+
+    pin = contexto['pins'].get( path )
+    if pin is None:
+        with contexto['lock']:
+            pin = contexto['pins'].get( path )
+            if pin is None:
+                pin = contexto['pins'][path] = SnapshotPin( acquire_snapshot( path ) )
+
+    return pin.snapshot
+
+
+def release_pins( context ):
+    """
+        Essa função solta os pins de um contexto ( pin_session / pinned )
+
+        Input: Contexto
+        Output: None
+    """
+    with context['lock']:
+        pins = list( context['pins'].values() )
+        context['pins'].clear()
+    for pin in pins:
+        pin.release()
+
+
+def pin_session( session ):
+    """
+        Essa função fixa a versão do dataset usada durante o rerun de uma sessão
+
+        Sequência de passos:
+        1. Solta os pins do rerun anterior da mesma sessão
+        2. Abre um contexto na thread do script: a primeira leitura de cada csv
+           fixa o snapshot atual, e as próximas do rerun usam o mesmo, mesmo que
+           uma versão nova seja publicada no meio. A versão nova aparece no
+           próximo rerun
+
+        Os painéis ( core/render.py ) recebem o contexto com current_pins e
+        bind_pins. Sem leituras locais ( ex.: com CURRY_API_URL ) nenhum csv é carregado.
+
+        Input: Estado da sessão ( st.session_state ou outro dicionário )
+        Output: Contexto
+    """
+    anterior = session.get( '_dataset_pins' )
+    if anterior is not None:
+        release_pins( anterior )
+
+    contexto = _context()
+    session['_dataset_pins'] = contexto
+    _local.context = contexto
+
+    return contexto
+
+
+def current_pins():
+    """
+        Essa função retorna o contexto de pins da thread atual
+
+        Output: Contexto, ou None
+    """
+    return getattr( _local, 'context', None )
+
+
+@contextlib.contextmanager
+def bind_pins( context ):
+    """
+        Essa função usa um contexto de pins em outra thread ( ex.: painéis de core/render.py )
+
+        Input: Contexto ( current_pins() da thread de origem ) ou None
+        Output: Context manager
+    """
+    anterior = getattr( _local, 'context', None )
+    _local.context = context
+    try:
+        yield context
+    finally:
+        _local.context = anterior
+
+
+@contextlib.contextmanager
+def pinned( path=DATA_PATH, snapshot=None ):
+    """
+        Essa função fixa uma versão do dataset durante um bloco
+
+        Todas as leituras do bloco ( load_data, dataset_version, derived,
+        memoize ) usam o mesmo snapshot, mesmo que uma versão nova seja
+        publicada no meio. Usada pela API ( uma versão por requisição ).
+
+        Input: Caminho do csv e snapshot ( None fixa o atual )
+        Output: Context manager que retorna o snapshot
+    """
+    pin = SnapshotPin( acquire_snapshot( path, snapshot ) )
+    contexto = _context()
+    contexto['pins'][pin.snapshot['path']] = pin
+    try:
+        with bind_pins( contexto ):
+            yield pin.snapshot
+    finally:
+        pin.release()
+
+
+def snapshot_stats( path=DATA_PATH ):
+    """
+        Essa função retorna as versões do dataset em cache
+
+        Input: Caminho do csv
+        Output: Lista de dicionários com version, current, refs, rows e derived
+    """
+    with _lock:
+        store = _stores.get( path )
+        if store is None:
+            return []
+        return [{ 'version': s['version'], 'current': s is store['current'], 'refs': s['refs'],
+                  'rows': len( s['df'] ), 'derived': sorted( s['derived'] ) }
+                for s in store['snapshots'].values()]
+
+
+def load_data( path=DATA_PATH ):
+    """
+        Essa função retorna o dataframe limpo, lendo e limpando o csv uma única vez por versão
+
+        O dataframe é o do snapshot fixado na thread ( pin_session / pinned ) ou,
+        sem pin, o do snapshot atual ( refresh_snapshot ). Ele é compartilhado
+        entre todas as sessões e não deve ser modificado pelas páginas.
+
+        Input: Caminho do csv
+        Output: Dataframe
+    """
+    return _snapshot( path )['df']
+
+
+def dataset_version( path=DATA_PATH ):
+    """
+        Essa função retorna a versão ( hash do conteúdo ) do dataset usado pela thread
+
+        Input: Caminho do csv
+        Output: String hexadecimal
+    """
+    return _snapshot( path )['version']
+
+
+def derived( name, builder, path=DATA_PATH, update=None ):
+    """
+        Essa função retorna uma estrutura derivada do dataset ( cubo, índices, ... ),
+        calculada uma única vez por versão do dataset
+
+        A estrutura fica no snapshot: quando o csv muda, a versão nova começa sem
+        estruturas e as da versão antiga seguem servindo quem a fixou. Quando
+        linhas são anexadas com o append_orders, as estruturas com update são
+        atualizadas para a nova versão e as demais são reconstruídas no próximo acesso.
+
+        As estruturas com update também são gravadas ao lado do csv ( write_derived ):
+        um processo que abre uma versão gravada pelo append_orders de outro processo
+        ( ex.: python -m core.ingest ) lê a estrutura atualizada em vez de reconstruí-la.
+
+        Input:
+            - name: Nome da estrutura derivada
+            - builder: Função que recebe o dataframe limpo e constrói a estrutura
+            - path: Caminho do csv
+            - update: Função ( estrutura, dataframe completo, linhas novas ) -> estrutura
+              nova ( sem modificar a recebida ), ou None
+        Output: Estrutura construída pelo builder
+    """
+    snapshot = _snapshot( path )
+    with snapshot['lock']:
+        if name not in snapshot['derived']:
+            estrutura = read_derived( path, snapshot['version'], name ) if update is not None else None
+            if estrutura is None:
+                # o builder lê a mesma versão ( ex.: build_database chama dataset_version )
+                with pinned( path, snapshot ):
+                    estrutura = builder( snapshot['df'] )
+                if update is not None:
+                    write_derived( path, snapshot['version'], name, estrutura )
+            snapshot['derived'][name] = estrutura
+            if update is not None:
+                snapshot['updaters'][name] = update
+
+        return snapshot['derived'][name]
+
+
+def _raw_ids( path ):
+    # IDs de todas as linhas do csv, inclusive as que o clean_code descarta
+    ids = pd.read_csv( path, usecols=['ID'], dtype=str, keep_default_na=False )['ID'].str.strip()
+
+    return pd.Index( ids.unique() )
+
+
+def _concat_orders( df1, delta ):
+    """
+        Essa função junta as linhas novas ao dataset mantendo a ordem por Order_Date
+
+        As colunas categóricas são unidas com union_categoricals, que mantém os
+        códigos das linhas antigas e só acrescenta as categorias novas.
+
+        Input: Dataframe limpo e dataframe limpo com as linhas novas
+        Output: Dataframe
+    """
+    inicio = df1.index.max() + 1 if len( df1 ) else 0
+    index = df1.index.append( delta.index + inicio )
+
+    colunas = {}
+    for col in df1.columns:
+        if isinstance( df1[col].dtype, pd.CategoricalDtype ):
+            colunas[col] = union_categoricals( [df1[col], delta[col].astype( 'category' )] )
+        else:
+            colunas[col] = pd.concat( [df1[col], delta[col]], ignore_index=True ).array
+    novo = pd.DataFrame( colunas, index=index )
+
+    if len( df1 ) and delta['Order_Date'].min() < df1['Order_Date'].iloc[-1]:
+        novo = novo.sort_values( 'Order_Date', kind='stable' )
+
+    return novo
+
+
+def append_orders( delta_path, path=DATA_PATH ):
+    """
+        Essa função anexa um lote de pedidos novos ( mesmo formato do train.csv ) ao dataset
+
+        Sequência de passos:
+        1. Remove do lote os IDs repetidos e os IDs que já existem no csv ( inclusive
+           os de linhas descartadas pelo clean_code, que não estão no dataframe )
+        2. Limpa apenas as linhas novas com o clean_code ( inclui a distância )
+        3. Continua o md5 com as linhas novas ( hash da nova versão ) sem reler o arquivo
+        4. Junta as linhas limpas ao dataframe e grava o cache colunar da nova versão
+        5. Atualiza as estruturas derivadas que têm update ( ex.: cubo ) e as grava
+           para a nova versão ( write_derived )
+        6. Anexa as linhas brutas ao csv e publica o snapshot da nova versão
+
+        O cache colunar e as estruturas derivadas são gravados antes do csv mudar,
+        então outros processos que veem o csv novo pelo mtime já encontram os
+        arquivos da nova versão, sem limpar o histórico nem reconstruir o cubo,
+        os rollups e os perfis. Neste processo, as sessões que fixaram a versão
+        anterior continuam nela até o próximo rerun.
+
+        Só as estruturas já carregadas neste processo são atualizadas ( o
+        python -m core.ingest carrega as das páginas antes de anexar ).
+
+        Input: Caminho do csv com o lote e caminho do dataset
+        Output: Quantidade de pedidos anexados ( após a limpeza )
+    """
+    raw = pd.read_csv( delta_path, dtype=str, keep_default_na=False )
+
+    refresh_snapshot( path )
+    store = _store( path )
+    with store['write_lock']:
+        # a versão do arquivo, mesmo que o refresh ainda não a tenha publicado
+        atual = _load_snapshot( path, store ) or store['current']
+        with pinned( path, atual ):
+            # os IDs do lote entram abaixo ( passo 5 ), não pelo update
+            ids = derived( 'raw_ids', lambda df1: _raw_ids( path ), path, update=lambda ids, df1, delta: ids )
+
+        # 1. Deduplicação pelo ID
+        id_lote = raw['ID'].str.strip()
+        novos = ~id_lote.duplicated().to_numpy() & ( ids.get_indexer( id_lote ) == -1 )
+        raw = raw.loc[novos, :]
+        if raw.empty:
+            return 0
+
+        # 2. Limpeza apenas das linhas novas
+        delta = clean_code( raw )
+
+        # 3. Hash da nova versão
+        dados = raw.to_csv( index=False, header=False ).encode( 'utf-8' )
+        with open( path, 'rb' ) as f:
+            f.seek( 0, os.SEEK_END )
+            if f.tell() > 0:
+                f.seek( -1, os.SEEK_END )
+                if f.read( 1 ) != b'\n':
+                    dados = b'\n' + dados
+
+        hasher = atual['hasher'].copy()
+        hasher.update( dados )
+        digest = hasher.hexdigest()
+
+        # 4. Juntando ao dataframe e gravando o cache colunar da nova versão
+        novo = _concat_orders( atual['df'], delta )
+        write_columnar( path, novo, digest )
+
+        # 5. Estruturas derivadas ( os updates criam estruturas novas: a versão
+        #    anterior continua intacta para quem a fixou )
+        with atual['lock']:
+            derivados = { name: update( atual['derived'][name], novo, delta )
+                          for name, update in atual['updaters'].items()
+                          if name in atual['derived'] }
+            updaters = dict( atual['updaters'] )
+        derivados['raw_ids'] = ids.append( pd.Index( id_lote[novos].to_numpy() ) )
+        for name, estrutura in derivados.items():
+            write_derived( path, digest, name, estrutura )
+
+        # 6. Anexando ao csv e publicando
+        with open( path, 'ab' ) as f:
+            f.write( dados )
+
+        _publish( store, _new_snapshot( path, os.stat( path ), hasher, novo, derivados, updaters ) )
+        logger.info( '%d pedidos anexados ao dataset %s ( versão %s )', len( delta ), path, digest[:12] )
+
+        return len( delta )
+
+
+def publish_dataset( source, path=DATA_PATH ):
+    """
+        Essa função troca o csv do dataset por outro de forma atômica
+
+        O arquivo é copiado para um temporário no mesmo diretório e trocado com
+        os.replace: os leitores ( deste e de outros processos ) veem o csv antigo
+        inteiro ou o novo inteiro, nunca um arquivo pela metade. A versão nova é
+        publicada no próximo refresh_snapshot.
+
+        Input: Caminho do csv novo e caminho do dataset
+        Output: None
+    """
+    destino = os.path.abspath( path )
+    fd, temporario = tempfile.mkstemp( prefix='.' + os.path.basename( destino ) + '.', dir=os.path.dirname( destino ) )
+    try:
+        with os.fdopen( fd, 'wb' ) as f, open( source, 'rb' ) as origem:
+            shutil.copyfileobj( origem, f, 1 << 20 )
+            f.flush()
+            os.fsync( f.fileno() )
+        os.replace( temporario, destino )
+    except BaseException:
+        if os.path.exists( temporario ):
+            os.unlink( temporario )
+        raise
@@ -0,0 +1,121 @@
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.data import DATA_PATH, derived
+from core.profiling import span
+
+# Colunas que podem ser filtradas pela barra lateral
+FILTER_COLUMNS = ['Road_traffic_density', 'City', 'Weatherconditions', 'Type_of_vehicle']
+
+
+def build_filter_index( df1 ):
+    """
+        Essa função prepara o dataframe limpo para os filtros da barra lateral
+
+        Sequência de passos:
+        1. Garante as linhas ordenadas por Order_Date ( o clean_code já entrega assim )
+        2. Cria um bitmap ( np.packbits ) por categoria de cada coluna de FILTER_COLUMNS
+
+        Input: Dataframe limpo
+        Output: Dicionário com o dataframe, o array de datas e os bitmaps
+    """
+    if not df1['Order_Date'].is_monotonic_increasing:
+        df1 = df1.sort_values( 'Order_Date', kind='stable' )
+
+    bitmaps = {}
+    for col in FILTER_COLUMNS:
+        serie = df1[col].astype( 'category' )
+        codigos = serie.cat.codes.to_numpy()
+        bitmaps[col] = { cat: np.packbits( codigos == i )
+                         for i, cat in enumerate( serie.cat.categories ) }
+
+    return { 'df': df1, 'dates': df1['Order_Date'].to_numpy(), 'bitmaps': bitmaps }
+
+
+def load_filter_index( path=DATA_PATH ):
+    """
+        Essa função retorna o índice de filtros da versão atual do dataset
+
+        Input: Caminho do csv
+        Output: Dicionário ( ver build_filter_index )
+    """
+    return derived( 'filter_index', build_filter_index, path )
+
+
+def filter_positions( index, date_slider=None, **selections ):
+    """
+        Essa função aplica os filtros da barra lateral sem varrer as colunas
+
+        Sequência de passos:
+        1. A data limite ( exclusiva ) vira um corte por busca binária nas datas ordenadas
+        2. Para cada coluna, faz o OR dos bitmaps dos valores selecionados
+        3. Faz o AND entre as colunas, apenas nos bytes antes do corte da data
+
+        Input:
+            - index: Índice de filtros ( load_filter_index )
+            - date_slider: Data limite ou None
+            - selections: Coluna=lista de valores ( ex.: Road_traffic_density=['Low', 'Jam'] ),
+              None não filtra a coluna
+        Output: slice das linhas antes do corte ( nenhuma descartada ) ou array com as posições
+    """
+    fim = len( index['dates'] )
+    if date_slider is not None:
+        fim = int( np.searchsorted( index['dates'], pd.Timestamp( date_slider ).to_datetime64(), side='left' ) )
+    n_bytes = ( fim + 7 ) // 8
+
+    bits = None
+    for col, valores in selections.items():
+        if valores is None:
+            continue
+
+        mapas = index['bitmaps'][col]
+        col_bits = np.zeros( n_bytes, dtype=np.uint8 )
+        for valor in valores:
+            if valor in mapas:
+                np.bitwise_or( col_bits, mapas[valor][:n_bytes], out=col_bits )
+
+        bits = col_bits if bits is None else np.bitwise_and( bits, col_bits, out=bits )
+
+    if bits is None:
+        return slice( 0, fim )
+
+    mask = np.unpackbits( bits, count=fim ).view( bool )
+    if mask.all():
+        return slice( 0, fim )
+
+    return np.flatnonzero( mask )
+
+
+def filter_orders( index, date_slider=None, columns=None, **selections ):
+    """
+        Essa função retorna os pedidos que passam nos filtros da barra lateral ( filter_positions )
+
+        Quando nenhuma linha antes do corte da data é descartada, o resultado é
+        uma view do dataframe do cache ( sem cópia ) com todas as colunas. Senão
+        só as colunas pedidas em columns são copiadas para as linhas que passaram,
+        então cada consumidor paga apenas pelas colunas que lê. O resultado não
+        deve ser modificado.
+
+        Input:
+            - index: Índice de filtros ( load_filter_index )
+            - date_slider: Data limite ou None
+            - columns: Colunas usadas pelo consumidor ou None ( todas )
+            - selections: Coluna=lista de valores, como no filter_positions
+        Output: Dataframe
+    """
+    with span( 'filter_orders' ) as info:
+        df1 = index['df']
+        linhas = filter_positions( index, date_slider, **selections )
+        if isinstance( linhas, slice ):
+            return df1.iloc[linhas]
+
+        info['copy'] = True
+        if columns is None:
+            return df1.take( linhas )
+
+        colunas = df1.columns.get_indexer( list( dict.fromkeys( columns ) ) )
+        if ( colunas < 0 ).any():
+            raise KeyError( 'Colunas desconhecidas: {}'.format( [c for c in columns if c not in df1.columns] ) )
+        info['columns'] = len( colunas )
+        return df1.iloc[linhas, colunas]
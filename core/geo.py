@@ -0,0 +1,153 @@
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# Raio médio da Terra em km ( mesmo valor do pacote haversine )
+EARTH_RADIUS_KM = 6371.0088
+
+# Pontos a menos de 1 grau de ( 0, 0 ) são coordenadas zeradas no dataset
+NULL_ISLAND_DEG = 1.0
+
+RESTAURANT_COLUMNS = ['Restaurant_latitude', 'Restaurant_longitude']
+DELIVERY_COLUMNS = ['Delivery_location_latitude', 'Delivery_location_longitude']
+
+
+def haversine( lat1, lon1, lat2, lon2, dtype=np.float64 ):
+    """
+        Essa função calcula a distância ( km ) do grande círculo entre dois vetores de pontos
+
+        Todas as operações são feitas sobre os arrays inteiros, sem laço em Python.
+
+        Input: Latitudes e longitudes ( graus ) dos pontos de origem e destino e o dtype
+               do cálculo ( np.float64 ou np.float32 )
+        Output: Array de distâncias em km
+    """
+    lat1 = np.radians( np.asarray( lat1, dtype=dtype ) )
+    lon1 = np.radians( np.asarray( lon1, dtype=dtype ) )
+    lat2 = np.radians( np.asarray( lat2, dtype=dtype ) )
+    lon2 = np.radians( np.asarray( lon2, dtype=dtype ) )
+
+    a = np.sin( ( lat2 - lat1 ) * 0.5 ) ** 2
+    a += np.cos( lat1 ) * np.cos( lat2 ) * np.sin( ( lon2 - lon1 ) * 0.5 ) ** 2
+    np.clip( a, 0, 1, out=a )
+
+    return ( 2 * EARTH_RADIUS_KM ) * np.arcsin( np.sqrt( a ) )
+
+
+def fix_sign( values, reference ):
+    """
+        Essa função corrige coordenadas com o sinal invertido em relação à referência
+
+        Input: Array de coordenadas e array de referência ( ex.: local de entrega )
+        Output: Array corrigido
+    """
+    values = np.asarray( values )
+
+    return np.where( values * np.asarray( reference ) < 0, -values, values )
+
+
+def null_island( lat, lon ):
+    """
+        Essa função marca os pontos com coordenadas zeradas ( próximos de 0, 0 )
+
+        Input: Arrays de latitude e longitude
+        Output: Array booleano
+    """
+    return ( np.abs( lat ) < NULL_ISLAND_DEG ) & ( np.abs( lon ) < NULL_ISLAND_DEG )
+
+
+def delivery_distance( df1, dtype=np.float64 ):
+    """
+        Essa função calcula a distância entre o restaurante e o local de entrega de cada pedido
+
+        Sequência de passos:
+        1. Corrige o sinal das coordenadas do restaurante usando o local de entrega
+        2. Calcula o haversine vetorizado
+        3. Marca como NaN as entregas com coordenadas zeradas
+
+        Input: Dataframe e dtype do cálculo
+        Output: Array de distâncias em km
+    """
+    dest_lat, dest_lon = ( df1[col].to_numpy( dtype=dtype ) for col in DELIVERY_COLUMNS )
+    rest_lat, rest_lon = ( df1[col].to_numpy( dtype=dtype ) for col in RESTAURANT_COLUMNS )
+    rest_lat = fix_sign( rest_lat, dest_lat )
+    rest_lon = fix_sign( rest_lon, dest_lon )
+
+    dist = haversine( rest_lat, rest_lon, dest_lat, dest_lon, dtype=dtype )
+    dist[null_island( rest_lat, rest_lon ) | null_island( dest_lat, dest_lon )] = np.nan
+
+    return dist
+
+
+# Tamanho inicial ( graus ) das células do grid usado nos mapas ( ~1 km )
+BASE_CELL_DEG = 0.01
+
+# Número máximo de células enviadas ao navegador por camada
+MAX_CELLS = 4000
+
+# O primeiro grid ( denso ) tem no máximo DENSE_FACTOR * MAX_CELLS células
+DENSE_FACTOR = 64
+
+
+def bin_points( lat, lon, weights=None, cell_deg=BASE_CELL_DEG, max_cells=MAX_CELLS ):
+    """
+        Essa função agrega pontos em células de um grid regular de latitude/longitude
+
+        Sequência de passos:
+        1. Descarta pontos sem coordenada ou com coordenadas zeradas
+        2. Dobra o tamanho da célula até o retângulo dos pontos caber em um grid
+           denso de DENSE_FACTOR * max_cells células
+        3. Conta os pontos por célula com np.bincount ( uma passada, sem ordenação )
+        4. Enquanto houver mais de max_cells células ocupadas, junta as células 2x2,
+           sem voltar aos pontos originais
+
+        Input: Arrays de latitude e longitude, pesos opcionais ( ex.: tempo de entrega ),
+               tamanho inicial da célula e número máximo de células
+        Output: Dataframe com o centro de cada célula ( lat, lon ), count e weight_mean;
+                o tamanho final da célula em graus fica em attrs['cell_deg']
+    """
+    lat = np.asarray( lat, dtype=np.float64 )
+    lon = np.asarray( lon, dtype=np.float64 )
+    pesos = np.zeros( len( lat ) ) if weights is None else np.asarray( weights, dtype=np.float64 )
+
+    validos = ~np.isnan( lat ) & ~np.isnan( lon ) & ~null_island( lat, lon )
+    lat, lon, pesos = lat[validos], lon[validos], pesos[validos]
+    if len( lat ) == 0:
+        result = pd.DataFrame( columns=['lat', 'lon', 'count', 'weight_mean'] )
+        result.attrs['cell_deg'] = cell_deg
+        return result
+
+    linhas = lambda c: np.floor( ( lat + 90 ) / c ).astype( np.int64 )
+    colunas = lambda c: np.floor( ( lon + 180 ) / c ).astype( np.int64 )
+    tamanho = lambda c: ( ( lat.max() - lat.min() ) / c + 2 ) * ( ( lon.max() - lon.min() ) / c + 2 )
+    while tamanho( cell_deg ) > DENSE_FACTOR * max_cells:
+        cell_deg *= 2
+
+    row, col = linhas( cell_deg ), colunas( cell_deg )
+    row0, col0 = row.min(), col.min()
+    n_cols = col.max() - col0 + 1
+    chave = ( row - row0 ) * n_cols + ( col - col0 )
+
+    count = np.bincount( chave )
+    ocupadas = np.flatnonzero( count )
+    celulas = pd.DataFrame( {
+        'row': ocupadas // n_cols + row0,
+        'col': ocupadas % n_cols + col0,
+        'count': count[ocupadas],
+        'weight': np.bincount( chave, weights=pesos )[ocupadas],
+    } )
+
+    while len( celulas ) > max_cells:
+        cell_deg *= 2
+        celulas = celulas.assign( row=celulas['row'] // 2, col=celulas['col'] // 2 )
+        celulas = celulas.groupby( ['row', 'col'] ).sum().reset_index()
+
+    result = pd.DataFrame( {
+        'lat': ( celulas['row'] + 0.5 ) * cell_deg - 90,
+        'lon': ( celulas['col'] + 0.5 ) * cell_deg - 180,
+        'count': celulas['count'],
+        'weight_mean': celulas['weight'] / celulas['count'],
+    } )
+    result.attrs['cell_deg'] = cell_deg
+
+    return result
@@ -0,0 +1,34 @@
+# Bibliotecas
+import sys
+
+from core.cube import load_cube
+from core.data import DATA_PATH, append_orders
+from core.profiles import load_profiles
+from core.rollups import load_rollups
+
+# Estruturas das páginas mantidas pelo append_orders: carregadas ( do disco,
+# quando a versão atual já as tem gravadas ) antes de cada lote, para serem
+# atualizadas e gravadas para a nova versão em vez de reconstruídas pelo dashboard
+LOADERS = [load_cube, load_rollups, load_profiles]
+
+
+def main():
+    """
+        Anexa lotes de pedidos novos ao dataset sem recarregar o histórico
+
+        Uso:
+            python -m core.ingest lote_1.csv [lote_2.csv ...]
+    """
+    if len( sys.argv ) < 2:
+        sys.exit( 'Uso: python -m core.ingest lote.csv [lote.csv ...]' )
+
+    for loader in LOADERS:
+        loader( DATA_PATH )
+
+    for delta_path in sys.argv[1:]:
+        n = append_orders( delta_path, DATA_PATH )
+        print( '{}: {} pedidos novos'.format( delta_path, n ) )
+
+
+if __name__ == '__main__':
+    main()
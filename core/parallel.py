@@ -0,0 +1,107 @@
+# Bibliotecas
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Bibliotecas necessárias
+import numpy as np
+
+from core.stream import PARTIALS, kpis, merge_partials, partial_aggregates
+
+# Dataframe herdado pelos processos filhos ( preenchido pelo initializer do pool )
+_frame = None
+
+
+def _set_frame( df1 ):
+    global _frame
+    _frame = df1
+
+
+def partitions( df1, n_parts, by='date' ):
+    """
+        Essa função divide o dataframe limpo em partições
+
+        - by='date': faixas contíguas de linhas ( o dataframe está ordenado por
+          Order_Date ), sem separar pedidos do mesmo dia em partições diferentes
+        - by='City': uma partição por cidade
+
+        Input: Dataframe limpo, número de partições e critério
+        Output: Lista de especificações ( ( 'rows', início, fim ) ou ( 'City', cidade ) )
+    """
+    if by == 'City':
+        return [( 'City', city ) for city in df1['City'].unique()]
+
+    if by != 'date':
+        raise ValueError( "Partição desconhecida: {!r} ( use 'date' ou 'City' )".format( by ) )
+
+    datas = df1['Order_Date'].to_numpy()
+    cortes = np.linspace( 0, len( df1 ), n_parts + 1 ).astype( np.int64 )[1:-1]
+    cortes = np.unique( np.searchsorted( datas, datas[np.minimum( cortes, len( df1 ) - 1 )], side='left' ) )
+    limites = [0] + [int( c ) for c in cortes if 0 < c < len( df1 )] + [len( df1 )]
+
+    return [( 'rows', a, b ) for a, b in zip( limites[:-1], limites[1:] ) if b > a]
+
+
+def _select( df1, spec ):
+    if spec[0] == 'City':
+        return df1.loc[df1['City'] == spec[1], :]
+
+    return df1.iloc[spec[1]:spec[2]]
+
+
+def _partial_for( spec, exact, parts, df1=None ):
+    return partial_aggregates( _select( _frame if df1 is None else df1, spec ), exact=exact, parts=parts )
+
+
+def serial_kpis( df1, exact=True, parts=PARTIALS ):
+    """
+        Essa função calcula os KPIs em uma única passada, sem partições ( caminho de referência )
+
+        Input: Dataframe limpo, modo exato e agregados calculados ( PARTIALS )
+        Output: Dicionário com os KPIs ( ver core/stream.py )
+    """
+    return kpis( partial_aggregates( df1, exact=exact, parts=parts ) )
+
+
+def parallel_kpis( df1, workers=None, by='date', executor='process', exact=True, parts=PARTIALS ):
+    """
+        Essa função calcula os KPIs em paralelo, combinando os agregados parciais de cada partição
+
+        Sequência de passos:
+        1. Divide o dataframe em partições ( ver partitions )
+        2. Calcula os agregados parciais de cada partição em um pool
+           - 'process': processos criados com fork herdam o dataframe sem cópia
+             ( copy-on-write ), só a especificação da partição é enviada
+           - 'thread': threads, útil quando o custo está nos kernels NumPy que liberam o GIL
+        3. Combina os parciais com merge_partials e calcula os KPIs
+
+        Com exact=True o resultado é o mesmo do serial_kpis ( a menos da ordem das
+        somas de ponto flutuante ).
+
+        O backend pandas do run_query ( core/query.py ) usa esta função para os
+        KPIs por linha das páginas ( extremos, distância e rankings ), cada um
+        com só o agregado parcial que lê ( parts ).
+
+        Input: Dataframe limpo, número de workers, critério de partição, tipo do pool,
+               modo exato e agregados calculados ( PARTIALS )
+        Output: Dicionário com os KPIs
+    """
+    workers = workers or os.cpu_count() or 1
+    specs = partitions( df1, workers, by=by )
+    if workers == 1 or len( specs ) == 1:
+        return serial_kpis( df1, exact=exact, parts=parts )
+
+    if executor == 'thread':
+        with ThreadPoolExecutor( workers ) as pool:
+            parciais = list( pool.map( functools.partial( _partial_for, exact=exact, parts=parts, df1=df1 ), specs ) )
+    elif executor == 'process':
+        metodos = multiprocessing.get_all_start_methods()
+        contexto = multiprocessing.get_context( 'fork' if 'fork' in metodos else None )
+        with ProcessPoolExecutor( workers, mp_context=contexto,
+                                  initializer=_set_frame, initargs=( df1, ) ) as pool:
+            parciais = list( pool.map( functools.partial( _partial_for, exact=exact, parts=parts ), specs ) )
+    else:
+        raise ValueError( "Executor desconhecido: {!r} ( use 'process' ou 'thread' )".format( executor ) )
+
+    return kpis( functools.reduce( merge_partials, parciais ) )
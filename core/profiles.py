@@ -0,0 +1,201 @@
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.data import DATA_PATH, derived
+
+# Tamanho padrão da página do ranking de entregadores
+PAGE_SIZE = 50
+
+# Colunas do dataframe limpo lidas pelo update_profiles
+PROFILE_COLUMNS = ['Delivery_person_ID', 'City', 'Time_taken(min)', 'Delivery_person_Ratings',
+                   'Type_of_vehicle', 'Delivery_person_Age', 'Vehicle_condition']
+
+# Colunas do ranking: nome -> função ( store, posições ) -> valores dos entregadores nas posições
+METRICS = {
+    'orders': lambda store, pos: store['count'][pos],
+    'time_mean': lambda store, pos: store['time_sum'][pos] / np.maximum( store['count'][pos], 1 ),
+    'time_std': lambda store, pos: _std( store['count'][pos], store['time_sum'][pos], store['time_sumsq'][pos] ),
+    'rating_mean': lambda store, pos: np.where( store['rating_n'][pos] > 0,
+                                                store['rating_sum'][pos] / np.maximum( store['rating_n'][pos], 1 ), np.nan ),
+}
+
+
+def _std( n, total, sumsq ):
+    # Desvio padrão amostral ( ddof=1 ), o mesmo do pandas
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        var = ( sumsq - total ** 2 / n ) / ( n - 1 )
+
+    return np.sqrt( np.where( n > 1, np.maximum( var, 0 ), np.nan ) )
+
+
+def _codes( values, categories ):
+    """
+        Essa função converte valores em códigos inteiros, acrescentando os valores novos
+        ao final da lista de categorias ( os códigos antigos não mudam )
+
+        Input: Valores e pd.Index com as categorias atuais
+        Output: Tupla ( códigos, categorias atualizadas )
+    """
+    codigos = categories.get_indexer( values )
+    novos = codigos < 0
+    if novos.any():
+        categories = categories.append( pd.Index( pd.unique( np.asarray( values )[novos] ) ) )
+        codigos = categories.get_indexer( values )
+
+    return codigos, categories
+
+
+def empty_profiles():
+    """
+        Essa função cria um store de perfis vazio
+
+        Input: Nenhum
+        Output: Dicionário de arrays, uma posição por entregador
+    """
+    return {
+        'ids': pd.Index( [], dtype=object ),
+        'count': np.zeros( 0, np.int64 ),
+        'time_sum': np.zeros( 0, np.float64 ),
+        'time_sumsq': np.zeros( 0, np.float64 ),
+        'rating_n': np.zeros( 0, np.int64 ),
+        'rating_sum': np.zeros( 0, np.float64 ),
+        'age': np.zeros( 0, np.float64 ),
+        'vehicle_condition': np.zeros( 0, np.float64 ),
+        'vehicle_type': np.zeros( 0, np.int32 ),
+        'vehicle_types': pd.Index( [], dtype=object ),
+        # Pares ( entregador, cidade ) distintos, codificados e ordenados
+        'city_pairs': np.zeros( 0, np.int64 ),
+        'cities': pd.Index( [], dtype=object ),
+    }
+
+
+def update_profiles( store, df1 ):
+    """
+        Essa função acrescenta pedidos ao store de perfis sem reprocessar o histórico
+
+        Sequência de passos:
+        1. Codifica os IDs ( entregadores novos recebem os próximos códigos )
+        2. Soma contagens, tempos e avaliações com np.bincount
+        3. Idade, condição e tipo de veículo ficam com o valor do pedido mais recente
+        4. Une os pares ( entregador, cidade ) atendidos
+
+        Input: Store ( empty_profiles ou de uma versão anterior ) e dataframe limpo com os pedidos
+        Output: Novo store ( o store recebido não é alterado )
+    """
+    # IDs sem os espaços do csv original ( 'CITY1RES01DEL01 ' )
+    codigos, ids = _codes( df1['Delivery_person_ID'].str.strip().to_numpy(), store['ids'] )
+    n = len( ids )
+
+    def somar( antigo, pesos=None ):
+        novo = np.zeros( n, dtype=antigo.dtype )
+        novo[:len( antigo )] = antigo
+        return novo + np.bincount( codigos, weights=pesos, minlength=n ).astype( antigo.dtype )
+
+    tempo = df1['Time_taken(min)'].to_numpy( dtype=np.float64 )
+    nota = df1['Delivery_person_Ratings'].to_numpy( dtype=np.float64 )
+    tem_nota = ~np.isnan( nota )
+
+    novo = dict( store, ids=ids )
+    novo['count'] = somar( store['count'] )
+    novo['time_sum'] = somar( store['time_sum'], tempo )
+    novo['time_sumsq'] = somar( store['time_sumsq'], tempo ** 2 )
+    novo['rating_n'] = somar( store['rating_n'], tem_nota.astype( np.float64 ) )
+    novo['rating_sum'] = somar( store['rating_sum'], np.where( tem_nota, nota, 0 ) )
+
+    # Última ocorrência de cada entregador ( as linhas estão ordenadas por data )
+    ultima = len( codigos ) - 1 - np.unique( codigos[::-1], return_index=True )[1]
+    quem = codigos[ultima]
+    tipos, novo['vehicle_types'] = _codes( df1['Type_of_vehicle'].to_numpy()[ultima], store['vehicle_types'] )
+    for name, valores in [( 'age', df1['Delivery_person_Age'].to_numpy( dtype=np.float64 )[ultima] ),
+                          ( 'vehicle_condition', df1['Vehicle_condition'].to_numpy( dtype=np.float64 )[ultima] ),
+                          ( 'vehicle_type', tipos )]:
+        antigo = store[name]
+        coluna = np.full( n, np.nan if antigo.dtype.kind == 'f' else -1, dtype=antigo.dtype )
+        coluna[:len( antigo )] = antigo
+        coluna[quem] = valores
+        novo[name] = coluna
+
+    cidades, novo['cities'] = _codes( df1['City'].astype( object ).to_numpy(), store['cities'] )
+    pares = codigos.astype( np.int64 ) << 32 | cidades.astype( np.int64 )
+    novo['city_pairs'] = np.union1d( store['city_pairs'], pares )
+
+    return novo
+
+
+def build_profiles( df1 ):
+    """
+        Essa função cria o store de perfis de todos os entregadores de um dataframe
+
+        Input: Dataframe limpo
+        Output: Store de perfis ( ver empty_profiles )
+    """
+    return update_profiles( empty_profiles(), df1 )
+
+
+def load_profiles( path=DATA_PATH ):
+    """
+        Essa função retorna o store de perfis da versão atual do dataset
+
+        Os pedidos anexados com o append_orders são somados ao store existente.
+
+        Input: Caminho do csv
+        Output: Store de perfis
+    """
+    return derived( 'profiles', build_profiles, path,
+                    update=lambda store, df1, delta: update_profiles( store, delta ) )
+
+
+def _cities_of( store, code ):
+    # Faixa dos pares do entregador, encontrada por busca binária
+    inicio, fim = np.searchsorted( store['city_pairs'], [code << 32, ( code + 1 ) << 32] )
+
+    return [store['cities'][c] for c in store['city_pairs'][inicio:fim] & 0xFFFFFFFF]
+
+
+def courier_profile( store, courier_id ):
+    """
+        Essa função retorna o perfil de um entregador
+
+        Input: Store de perfis e Delivery_person_ID
+        Output: Dicionário com o perfil ( valores Python ), ou None se o entregador não existir
+    """
+    try:
+        code = store['ids'].get_loc( courier_id.strip() )
+    except KeyError:
+        return None
+
+    perfil = { name: np.asarray( metric( store, code ) ).item() for name, metric in METRICS.items() }
+    perfil.update( {
+        'Delivery_person_ID': store['ids'][code],
+        'age': store['age'][code].item(),
+        'vehicle_condition': store['vehicle_condition'][code].item(),
+        'vehicle_type': store['vehicle_types'][store['vehicle_type'][code]] if store['vehicle_type'][code] >= 0 else None,
+        'cities': _cities_of( store, code ),
+    } )
+
+    return perfil
+
+
+def leaderboard( store, by='rating_mean', ascending=False, page=0, page_size=PAGE_SIZE ):
+    """
+        Essa função retorna uma página do ranking de entregadores
+
+        Só as linhas da página são montadas em um dataframe; o restante do
+        store fica nos arrays.
+
+        Input: Store de perfis, métrica do ranking ( METRICS ), ordem, página e tamanho da página
+        Output: Tupla ( dataframe da página, quantidade de páginas )
+    """
+    valores = METRICS[by]( store, slice( None ) )
+    chave = valores if ascending else -valores
+    # Entregadores sem valor ficam no final; empate pelo ID
+    ordem = np.lexsort( ( store['ids'].to_numpy(), np.nan_to_num( chave, nan=np.inf ) ) )
+    paginas = max( int( np.ceil( len( ordem ) / page_size ) ), 1 )
+    pos = ordem[page * page_size:( page + 1 ) * page_size]
+
+    df_page = pd.DataFrame( { 'Delivery_person_ID': store['ids'][pos] } )
+    for name, metric in METRICS.items():
+        df_page[name] = metric( store, pos )
+
+    return df_page, paginas
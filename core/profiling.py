@@ -0,0 +1,376 @@
+# Bibliotecas
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import deque
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# Liga a instrumentação em todas as sessões ( nas demais, só com ?debug=1 na URL )
+PROFILE_ENABLED = os.environ.get( 'CURRY_PROFILE', '' ).lower() in ( '1', 'true', 'yes' )
+
+# Arquivo JSON Lines onde cada span é gravado ( vazio não grava )
+PROFILE_LOG = os.environ.get( 'CURRY_PROFILE_LOG', '' )
+
+# Mede também o pico de memória alocada de cada span ( tracemalloc, deixa o processo mais lento )
+PROFILE_MEMORY = os.environ.get( 'CURRY_PROFILE_MEMORY', '' ).lower() in ( '1', 'true', 'yes' )
+
+# Durações guardadas por nome de span para os percentis ( as mais antigas saem )
+RESERVOIR = 2000
+
+# Largura ( caracteres ) da barra do waterfall
+WATERFALL_WIDTH = 40
+
+# Percentis mostrados no painel e no resumo do log
+PERCENTILES = [50, 90, 99]
+
+# Cada sessão do Streamlit roda o script em uma thread, então o trace atual é por thread
+# ( as threads dos painéis entram no trace do rerun com fork_trace / bind_trace );
+# os percentis vivem no processo e juntam todas as sessões.
+_local = threading.local()
+_lock = threading.Lock()
+_durations = {}
+
+
+def _rss():
+    # RSS do processo ( Linux ); 0 quando /proc não existe
+    try:
+        with open( '/proc/self/statm' ) as f:
+            return int( f.read().split()[1] ) * os.sysconf( 'SC_PAGE_SIZE' )
+    except OSError:
+        return 0
+
+
+def start_rerun( page, enabled=None ):
+    """
+        Essa função abre o trace de um rerun da página na thread atual
+
+        Input: Nome da página e se a instrumentação está ligada ( None usa PROFILE_ENABLED )
+        Output: Trace ( dicionário ) ou None quando a instrumentação está desligada
+    """
+    if not ( PROFILE_ENABLED if enabled is None else enabled ):
+        _local.trace = None
+        return None
+
+    if PROFILE_MEMORY and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+    trace = { 'id': uuid.uuid4().hex, 'page': page, 'wall_start': time.time(), 't0': time.perf_counter(),
+              'spans': [], 'stack': [], 'attrs': {}, 'lock': threading.Lock(),
+              'thread': threading.current_thread().name }
+    _local.trace = trace
+
+    return trace
+
+
+def current_trace():
+    return getattr( _local, 'trace', None )
+
+
+def fork_trace():
+    """
+        Essa função prepara o trace da thread atual para uma thread de trabalho
+
+        A cópia compartilha os spans do rerun e tem a sua própria pilha, então os
+        spans da outra thread ficam como filhos do span aberto aqui.
+
+        Input: Nenhum
+        Output: Cópia do trace para o bind_trace, ou None sem trace aberto
+    """
+    trace = current_trace()
+
+    return None if trace is None else dict( trace, stack=list( trace['stack'] ) )
+
+
+@contextlib.contextmanager
+def bind_trace( trace ):
+    """
+        Essa função liga a thread atual a um trace do fork_trace durante o with
+
+        Input: Cópia do trace ( fork_trace ) ou None
+        Output: None
+    """
+    anterior = current_trace()
+    _local.trace = trace
+    try:
+        yield
+    finally:
+        _local.trace = anterior
+
+
+@contextlib.contextmanager
+def span( name, **attrs ):
+    """
+        Essa função mede um trecho do rerun ( uso: with span( 'clean_code' ): ... )
+
+        Sem trace aberto na thread ( instrumentação desligada ) não mede nada.
+        O dicionário retornado pelo with recebe atributos durante o trecho
+        ( ex.: cache='hit' ).
+
+        Sequência de passos:
+        1. Guarda o início, o tempo de CPU da thread e o RSS do processo
+        2. Executa o trecho ( spans abertos dentro dele ficam como filhos )
+        3. Guarda a duração, a CPU, a variação do RSS e, com PROFILE_MEMORY, o pico alocado
+
+        Input: Nome do span e atributos
+        Output: Dicionário de atributos do span
+    """
+    trace = current_trace()
+    if trace is None:
+        yield attrs
+        return
+
+    pilha = trace['stack']
+    registro = { 'name': name, 'parent': pilha[-1] if pilha else None, 'depth': len( pilha ), 'attrs': attrs,
+                 'thread': threading.current_thread().name,
+                 'start_s': time.perf_counter() - trace['t0'], 'rss_before': _rss(), 'child_peak': 0 }
+    memoria = tracemalloc.is_tracing()
+    if memoria:
+        atual, pico = tracemalloc.get_traced_memory()
+        # O pico do pai até aqui não pode se perder com o reset
+        if pilha:
+            pai = trace['spans'][pilha[-1]]
+            pai['child_peak'] = max( pai['child_peak'], pico )
+        registro['mem_start'] = atual
+        tracemalloc.reset_peak()
+
+    # Os spans são compartilhados com as threads dos painéis
+    with trace['lock']:
+        pilha.append( len( trace['spans'] ) )
+        trace['spans'].append( registro )
+    cpu = time.thread_time()
+    try:
+        yield attrs
+    finally:
+        registro['duration_s'] = time.perf_counter() - trace['t0'] - registro['start_s']
+        registro['cpu_s'] = time.thread_time() - cpu
+        registro['rss_delta'] = _rss() - registro['rss_before']
+        if memoria and tracemalloc.is_tracing():
+            _, pico = tracemalloc.get_traced_memory()
+            pico = max( pico, registro['child_peak'] )
+            registro['peak_bytes'] = max( pico - registro['mem_start'], 0 )
+            if registro['parent'] is not None:
+                pai = trace['spans'][registro['parent']]
+                pai['child_peak'] = max( pai['child_peak'], pico )
+        pilha.pop()
+
+
+def finish_rerun( trace, **attrs ):
+    """
+        Essa função fecha o trace do rerun, soma as durações aos percentis e grava o log
+
+        Input: Trace ( start_rerun ) e atributos do rerun ( ex.: estado dos filtros )
+        Output: Trace fechado ( o mesmo dicionário ), ou None quando a instrumentação está desligada
+    """
+    if trace is None:
+        return None
+
+    trace['duration_s'] = time.perf_counter() - trace['t0']
+    trace['attrs'].update( attrs )
+    if current_trace() is trace:
+        _local.trace = None
+
+    with _lock:
+        for nome, duracao in [( 'rerun:' + trace['page'], trace['duration_s'] )] + \
+                             [( s['name'], s['duration_s'] ) for s in trace['spans'] if 'duration_s' in s]:
+            _durations.setdefault( nome, deque( maxlen=RESERVOIR ) ).append( duracao )
+
+    if PROFILE_LOG:
+        write_log( trace, PROFILE_LOG )
+
+    return trace
+
+
+def _json_value( value ):
+    if isinstance( value, ( str, int, float, bool ) ) or value is None:
+        return value
+    if isinstance( value, ( list, tuple ) ):
+        return [_json_value( v ) for v in value]
+    if isinstance( value, np.generic ):
+        return value.item()
+
+    return str( value )
+
+
+def span_records( trace ):
+    """
+        Essa função transforma os spans de um trace em registros planos ( um por span )
+
+        Input: Trace fechado
+        Output: Lista de dicionários prontos para JSON
+    """
+    base = { 'trace_id': trace['id'], 'page': trace['page'],
+             'rerun_attrs': { k: _json_value( v ) for k, v in trace['attrs'].items() } }
+    registros = [dict( base, name='rerun:' + trace['page'], parent=None, depth=-1, thread=trace['thread'], start_s=0.0,
+                       duration_s=trace.get( 'duration_s' ), cpu_s=None, rss_delta=None )]
+    for i, s in enumerate( trace['spans'] ):
+        registro = dict( base, span_id=i, name=s['name'], parent=s['parent'], depth=s['depth'],
+                         thread=s.get( 'thread' ), start_s=s['start_s'], duration_s=s.get( 'duration_s' ), cpu_s=s.get( 'cpu_s' ),
+                         rss_delta=s.get( 'rss_delta' ),
+                         attrs={ k: _json_value( v ) for k, v in s['attrs'].items() } )
+        if 'peak_bytes' in s:
+            registro['peak_bytes'] = s['peak_bytes']
+        registros.append( registro )
+
+    return registros
+
+
+def write_log( trace, path ):
+    """
+        Essa função acrescenta os spans de um trace a um arquivo JSON Lines
+
+        Input: Trace fechado e caminho do log
+        Output: None
+    """
+    linhas = ''.join( json.dumps( r ) + '\n' for r in span_records( trace ) )
+    with _lock:
+        with open( path, 'a' ) as f:
+            f.write( linhas )
+
+
+def chrome_trace( trace ):
+    """
+        Essa função converte um trace para o formato Trace Event ( chrome://tracing, Perfetto )
+
+        Input: Trace fechado
+        Output: Dicionário pronto para json.dumps
+    """
+    eventos = [{ 'name': 'rerun:' + trace['page'], 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                 'ts': trace['wall_start'] * 1e6, 'dur': trace.get( 'duration_s', 0 ) * 1e6,
+                 'args': { k: _json_value( v ) for k, v in trace['attrs'].items() } }]
+    # Uma linha por thread ( a do script é a 0 )
+    threads = { trace['thread']: 0 }
+    for s in trace['spans']:
+        threads.setdefault( s.get( 'thread' ), len( threads ) )
+    eventos += [{ 'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': { 'name': str( nome ) } }
+                for nome, tid in threads.items()]
+    for s in trace['spans']:
+        if 'duration_s' not in s:
+            continue
+        args = { k: _json_value( v ) for k, v in s['attrs'].items() }
+        args.update( cpu_s=s['cpu_s'], rss_delta=s['rss_delta'] )
+        if 'peak_bytes' in s:
+            args['peak_bytes'] = s['peak_bytes']
+        eventos.append( { 'name': s['name'], 'ph': 'X', 'pid': os.getpid(), 'tid': threads[s.get( 'thread' )],
+                          'ts': ( trace['wall_start'] + s['start_s'] ) * 1e6, 'dur': s['duration_s'] * 1e6,
+                          'args': args } )
+
+    return { 'traceEvents': eventos, 'displayTimeUnit': 'ms' }
+
+
+def waterfall( trace ):
+    """
+        Essa função monta a tabela do waterfall de um rerun
+
+        Input: Trace fechado
+        Output: Dataframe com um span por linha, na ordem de início ( tempos em ms ),
+                com a barra de cada span em texto ( posição e tamanho relativos ao rerun )
+    """
+    total = max( trace.get( 'duration_s', 0 ), 1e-9 )
+    barra = lambda s: ( ' ' * int( s['start_s'] / total * WATERFALL_WIDTH )
+                        + '█' * max( int( round( s.get( 'duration_s', 0 ) / total * WATERFALL_WIDTH ) ), 1 ) )
+    linhas = [{ 'span': '  ' * s['depth'] + s['name'],
+                'waterfall': barra( s ),
+                'inicio_ms': s['start_s'] * 1e3,
+                'duracao_ms': s.get( 'duration_s', np.nan ) * 1e3,
+                'cpu_ms': s.get( 'cpu_s', np.nan ) * 1e3,
+                'rss_delta_mb': s.get( 'rss_delta', 0 ) / 2**20,
+                'pico_mb': s['peak_bytes'] / 2**20 if 'peak_bytes' in s else np.nan,
+                'atributos': ', '.join( '{}={}'.format( k, v ) for k, v in s['attrs'].items() ) }
+              for s in trace['spans']]
+
+    return pd.DataFrame( linhas, columns=['span', 'waterfall', 'inicio_ms', 'duracao_ms', 'cpu_ms',
+                                          'rss_delta_mb', 'pico_mb', 'atributos'] )
+
+
+def _percentile_table( grupos ):
+    linhas = []
+    for nome, valores in grupos:
+        valores = np.asarray( valores, dtype=np.float64 ) * 1e3
+        linha = { 'span': nome, 'count': len( valores ), 'mean_ms': valores.mean() }
+        linha.update( { 'p{}_ms'.format( p ): v for p, v in zip( PERCENTILES, np.percentile( valores, PERCENTILES ) ) } )
+        linha['max_ms'] = valores.max()
+        linhas.append( linha )
+
+    df_aux = pd.DataFrame( linhas, columns=['span', 'count', 'mean_ms'] +
+                                           ['p{}_ms'.format( p ) for p in PERCENTILES] + ['max_ms'] )
+
+    return df_aux.sort_values( 'p{}_ms'.format( PERCENTILES[-1] ), ascending=False ).reset_index( drop=True )
+
+
+def span_percentiles():
+    """
+        Essa função retorna os percentis de duração de cada span, somando todas as sessões do processo
+
+        Input: Nenhum
+        Output: Dataframe com contagem, média, percentis e máximo ( ms ), os mais lentos primeiro
+    """
+    with _lock:
+        grupos = [( nome, list( valores ) ) for nome, valores in _durations.items() if valores]
+
+    return _percentile_table( grupos )
+
+
+def reset_percentiles():
+    with _lock:
+        _durations.clear()
+
+
+def debug_panel( container, trace ):
+    """
+        Essa função mostra o perfil do rerun em um container do Streamlit ( ex.: st.sidebar.expander )
+
+        Input: Container e trace fechado ( finish_rerun )
+        Output: None
+    """
+    container.markdown( '**Rerun {:.0f} ms**'.format( trace['duration_s'] * 1e3 ) )
+    container.dataframe( waterfall( trace ) )
+    container.markdown( '**Percentis ( todas as sessões )**' )
+    container.dataframe( span_percentiles() )
+    container.download_button( 'Trace ( chrome://tracing )', json.dumps( chrome_trace( trace ) ),
+                               file_name='trace_{}.json'.format( trace['id'] ), mime='application/json' )
+
+
+def summarize_log( path, by=None ):
+    """
+        Essa função resume um log JSON Lines de spans ( de um ou vários processos )
+
+        Input:
+            - path: Caminho do log
+            - by: Atributo do rerun usado para separar os grupos ( ex.: 'state', para achar
+              as combinações de filtro lentas ), ou None
+        Output: Dataframe de percentis por span ( e pelo atributo )
+    """
+    df_aux = pd.read_json( path, lines=True )
+    df_aux = df_aux[df_aux['duration_s'].notna()]
+    chave = df_aux['name']
+    if by is not None:
+        valores = df_aux['rerun_attrs'].map( lambda a: json.dumps( a.get( by ) ) if isinstance( a, dict ) else None )
+        chave = chave + ' | ' + valores.fillna( '' )
+
+    return _percentile_table( ( nome, grupo['duration_s'].to_numpy() ) for nome, grupo in df_aux.groupby( chave ) )
+
+
+def main():
+    """
+        Resumo de um log de spans
+
+        Uso:
+            python -m core.profiling spans.jsonl [atributo do rerun, ex.: state]
+    """
+    if len( sys.argv ) < 2:
+        sys.exit( main.__doc__ )
+
+    with pd.option_context( 'display.width', 200, 'display.max_rows', None, 'display.max_colwidth', 80 ):
+        print( summarize_log( sys.argv[1], sys.argv[2] if len( sys.argv ) > 2 else None ) )
+
+
+if __name__ == '__main__':
+    main()
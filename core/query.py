@@ -0,0 +1,477 @@
+# Bibliotecas
+import os
+import sys
+import threading
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.cache import memoize
+from core.client import API_URL, remote_error_bounds, remote_query
+from core.cube import load_cube, rollup, slice_cube
+from core.data import DATA_PATH, dataset_version, derived, load_data
+from core.filters import filter_orders, load_filter_index
+from core.parallel import parallel_kpis
+from core.profiling import span
+from core.rollups import aggregate, error_bounds, load_rollups, quantile_column
+from core.storage import cache_path, pa, prune_versions
+from core.stream import TOP_N, partial_columns
+from core.topk import TOP_K, top_couriers
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Banco duckdb de cada versão do dataset: train.csv -> train.<hash>.duckdb
+DATABASE_SUFFIX = '.duckdb'
+
+# Backend usado quando run_query não recebe um ( CURRY_QUERY_BACKEND=pandas|duckdb|api;
+# com CURRY_API_URL o padrão é o servidor da API, core/api.py )
+DEFAULT_BACKEND = os.environ.get( 'CURRY_QUERY_BACKEND',
+                                  'api' if API_URL else 'duckdb' if duckdb is not None else 'pandas' )
+
+# KPIs por linha do backend pandas ( extremos, distância e ranking ) calculados em
+# partições ( core/parallel.py ): workers e pool ( thread, ou process com fork )
+KPI_WORKERS = int( os.environ.get( 'CURRY_KPI_WORKERS', os.cpu_count() or 1 ) )
+KPI_EXECUTOR = os.environ.get( 'CURRY_KPI_EXECUTOR', 'thread' )
+
+# Métricas aceitas no ranking de entregadores ( entram no SQL como nome de coluna )
+RANK_METRICS = ['Time_taken(min)', 'distance', 'Delivery_person_Ratings']
+
+# Quantis de tempo e distância das entregas
+DELIVERY_QUANTILES = [0.5, 0.9, 0.99]
+
+# Consultas: nome -> colunas chave ( o resultado vem ordenado por elas )
+QUERIES = {
+    'orders_by_day': ['Order_Date'],
+    'orders_by_week': ['week'],
+    'traffic_order_share': ['Road_traffic_density'],
+    'traffic_order_city': ['City', 'Road_traffic_density'],
+    'order_share_by_week': ['week'],
+    'city_centers': ['City', 'Road_traffic_density'],
+    'extremes': [],
+    'ratings_by_traffic': ['Road_traffic_density'],
+    'ratings_by_weather': ['Weatherconditions'],
+    'top_fastest': ['City'],
+    'top_slowest': ['City'],
+    'unique_couriers': [],
+    'delivery_quantiles': [],
+    'delivery_quantiles_by_city': ['City'],
+    'avg_distance': [],
+    'distance_by_city': ['City'],
+    'time_by_festival': ['Festival'],
+    'time_by_city': ['City'],
+    'time_by_city_traffic': ['City', 'Road_traffic_density'],
+    'time_by_city_order': ['City', 'Type_of_order'],
+}
+
+# Consultas de média e desvio padrão: nome -> ( chaves, medida do cubo, coluna )
+_STATS = {
+    'ratings_by_traffic': ( ['Road_traffic_density'], 'rating', 'Delivery_person_Ratings' ),
+    'ratings_by_weather': ( ['Weatherconditions'], 'rating', 'Delivery_person_Ratings' ),
+    'time_by_festival': ( ['Festival'], 'time', 'Time_taken(min)' ),
+    'time_by_city': ( ['City'], 'time', 'Time_taken(min)' ),
+    'time_by_city_traffic': ( ['City', 'Road_traffic_density'], 'time', 'Time_taken(min)' ),
+    'time_by_city_order': ( ['City', 'Type_of_order'], 'time', 'Time_taken(min)' ),
+}
+
+# Colunas dos quantis: coluna do dataframe limpo -> prefixo no resultado ( time_p50, distance_p90, ... )
+_QUANTILE_PREFIXES = { 'Time_taken(min)': 'time', 'distance': 'distance' }
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Backend pandas ( referência )
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+def _frame( state, path, columns=None ):
+    return filter_orders( load_filter_index( path ), state[0], columns=columns, Road_traffic_density=list( state[1] ) )
+
+
+def _cube( state, path ):
+    return slice_cube( load_cube( path ), state[0], list( state[1] ) )
+
+
+def _pandas_stats( name ):
+    keys, measure, _ = _STATS[name]
+
+    return lambda state, path: rollup( _cube( state, path ), keys, measure=measure )
+
+
+def _rollup( state, path, freq, **kwargs ):
+    return aggregate( load_rollups( path ), state[0], list( state[1] ), freq=freq, **kwargs )
+
+
+def _pandas_order_share_by_week( state, path ):
+    df_aux = _rollup( state, path, 'week', distinct=['couriers'] ).rename( columns={ 'count': 'orders' } )
+    df_aux['order_by_delivery'] = df_aux['orders'] / df_aux['couriers']
+
+    return df_aux[['week', 'week_start', 'orders', 'couriers', 'order_by_delivery']]
+
+
+def _pandas_traffic_order_share( state, path ):
+    df_aux = rollup( _cube( state, path ), ['Road_traffic_density'] )[['Road_traffic_density', 'count']]
+
+    return df_aux.assign( entregas_perc=df_aux['count'] / df_aux['count'].sum() )
+
+
+def _pandas_city_centers( state, path ):
+    colunas = ['Delivery_location_latitude', 'Delivery_location_longitude']
+    df_aux = _rollup( state, path, None, by=['City', 'Road_traffic_density'],
+                      quantiles={ col: [0.5] for col in colunas } )
+
+    return df_aux.rename( columns={ quantile_column( col, 0.5 ): col for col in colunas } )[
+        ['City', 'Road_traffic_density'] + colunas]
+
+
+def _pandas_delivery_quantiles( by ):
+    def consulta( state, path ):
+        df_aux = _rollup( state, path, None, by=by,
+                          quantiles={ col: DELIVERY_QUANTILES for col in _QUANTILE_PREFIXES } )
+        nomes = { quantile_column( col, q ): '{}_p{:g}'.format( prefixo, q * 100 )
+                  for col, prefixo in _QUANTILE_PREFIXES.items() for q in DELIVERY_QUANTILES }
+
+        return df_aux.rename( columns=nomes )[by + list( nomes.values() )]
+
+    return consulta
+
+
+# Locks em listras pelo estado dos filtros: painéis que pedem os mesmos KPIs esperam o
+# primeiro cálculo em vez de repeti-lo, e estados diferentes calculam ao mesmo tempo
+_kpis_locks = [threading.Lock() for _ in range( 64 )]
+
+
+def _pandas_kpis( state, path, parts ):
+    """
+        Essa função retorna os KPIs por linha das páginas para o estado dos filtros
+
+        Os KPIs são calculados com o parallel_kpis ( KPI_WORKERS partições, modo
+        exato ) só com os agregados parciais pedidos ( core/stream.py PARTIALS ) e
+        guardados pelo memoize: avg_distance e distance_by_city leem o mesmo cubo,
+        e os dois rankings as mesmas somas por entregador.
+
+        Input: Estado dos filtros, caminho do csv e agregados parciais ( tupla )
+        Output: Dicionário de KPIs, ou None se nenhum pedido passou nos filtros
+    """
+    df1 = _frame( state, path, partial_columns( parts ) )
+    if df1.empty:
+        return None
+
+    with _kpis_locks[hash( ( state, parts ) ) % len( _kpis_locks )]:
+        return memoize( parallel_kpis, df1, key=state, path=path,
+                        workers=KPI_WORKERS, executor=KPI_EXECUTOR, exact=True, parts=parts )
+
+
+def _pandas_extremes( state, path ):
+    colunas = ['age_min', 'age_max', 'vehicle_condition_min', 'vehicle_condition_max']
+    kpis = _pandas_kpis( state, path, ( 'extremes', ) ) or dict.fromkeys( colunas, np.nan )
+
+    return pd.DataFrame( [{ col: kpis[col] for col in colunas }] )
+
+
+def _pandas_distance_by_city( state, path ):
+    kpis = _pandas_kpis( state, path, ( 'cube', ) )
+    if kpis is None:
+        return pd.DataFrame( columns=['City', 'distance'] )
+
+    return kpis['distance_by_city'][['City', 'mean']].rename( columns={ 'mean': 'distance' } )
+
+
+def _pandas_avg_distance( state, path ):
+    kpis = _pandas_kpis( state, path, ( 'cube', ) )
+
+    return pd.DataFrame( [{ 'distance': np.nan if kpis is None else kpis['avg_distance'] }] )
+
+
+def _pandas_top( which ):
+    # Ranking por tempo com até TOP_N entregadores: vem dos KPIs; os demais são calculados aqui
+    def consulta( state, path, k=TOP_K, metric='Time_taken(min)' ):
+        if metric == 'Time_taken(min)' and k <= TOP_N:
+            kpis = _pandas_kpis( state, path, ( 'couriers', ) )
+            if kpis is not None:
+                return kpis['top_' + which].groupby( 'City', observed=True, sort=False ).head( k ).reset_index( drop=True )
+
+        return top_couriers( _frame( state, path, ['City', 'Delivery_person_ID', metric] ), k=k, metric=metric )[which]
+
+    return consulta
+
+
+_PANDAS = {
+    'orders_by_day': lambda state, path: _rollup( state, path, 'day' )[['Order_Date', 'count']],
+    'orders_by_week': lambda state, path: _rollup( state, path, 'week' )[['week', 'week_start', 'count']],
+    'traffic_order_share': _pandas_traffic_order_share,
+    'traffic_order_city': lambda state, path: rollup( _cube( state, path ), ['City', 'Road_traffic_density'] )[
+        ['City', 'Road_traffic_density', 'count']],
+    'order_share_by_week': _pandas_order_share_by_week,
+    'city_centers': _pandas_city_centers,
+    'extremes': _pandas_extremes,
+    'top_fastest': _pandas_top( 'fastest' ),
+    'top_slowest': _pandas_top( 'slowest' ),
+    'unique_couriers': lambda state, path: _rollup( state, path, None, distinct=['couriers', 'restaurants'] )[
+        ['couriers', 'restaurants']],
+    'delivery_quantiles': _pandas_delivery_quantiles( [] ),
+    'delivery_quantiles_by_city': _pandas_delivery_quantiles( ['City'] ),
+    'avg_distance': _pandas_avg_distance,
+    'distance_by_city': _pandas_distance_by_city,
+}
+_PANDAS.update( { name: _pandas_stats( name ) for name in _STATS } )
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Backend duckdb
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+def _stats_sql( name ):
+    keys, _, coluna = _STATS[name]
+    chaves = ', '.join( '"{}"'.format( k ) for k in keys )
+
+    return ( 'SELECT {keys}, count(*) AS count, avg("{col}") AS mean, stddev_samp("{col}") AS std '
+             'FROM orders {{where}} GROUP BY {keys} ORDER BY {keys}' ).format( keys=chaves, col=coluna )
+
+
+_TOP_SQL = """
+    SELECT City, Delivery_person_ID, "{metric}" FROM (
+        SELECT City, Delivery_person_ID, avg( "{metric}" ) AS "{metric}",
+               row_number() OVER ( PARTITION BY City ORDER BY avg( "{metric}" ) {order}, Delivery_person_ID ) AS rank
+        FROM orders {where}
+        GROUP BY City, Delivery_person_ID
+        HAVING avg( "{metric}" ) IS NOT NULL
+    )
+    WHERE rank <= ?
+    ORDER BY City, rank
+"""
+
+# Quantis exatos ( interpolação linear, igual ao np.quantile ) de tempo e distância
+_QUANTILES_SQL = ', '.join( 'quantile_cont( "{}"::DOUBLE, {} ) AS {}_p{:g}'.format( col, q, prefixo, q * 100 )
+                            for col, prefixo in _QUANTILE_PREFIXES.items() for q in DELIVERY_QUANTILES )
+
+_SQL = {
+    'orders_by_day': 'SELECT Order_Date, count(*) AS count FROM orders {where} GROUP BY 1 ORDER BY 1',
+    'orders_by_week': """
+        SELECT yearweek( Order_Date ) AS week, date_trunc( 'week', Order_Date ) AS week_start, count(*) AS count
+        FROM orders {where} GROUP BY 1, 2 ORDER BY 1
+    """,
+    'traffic_order_share': """
+        SELECT Road_traffic_density, count(*) AS count, count(*)::DOUBLE / sum( count(*) ) OVER () AS entregas_perc
+        FROM orders {where} GROUP BY 1 ORDER BY 1
+    """,
+    'traffic_order_city': """
+        SELECT City, Road_traffic_density, count(*) AS count FROM orders {where} GROUP BY 1, 2 ORDER BY 1, 2
+    """,
+    'order_share_by_week': """
+        SELECT yearweek( Order_Date ) AS week, date_trunc( 'week', Order_Date ) AS week_start,
+               count( ID ) AS orders, count( DISTINCT Delivery_person_ID ) AS couriers,
+               count( ID )::DOUBLE / count( DISTINCT Delivery_person_ID ) AS order_by_delivery
+        FROM orders {where} GROUP BY 1, 2 ORDER BY 1
+    """,
+    'city_centers': """
+        SELECT City, Road_traffic_density,
+               median( Delivery_location_latitude ) AS Delivery_location_latitude,
+               median( Delivery_location_longitude ) AS Delivery_location_longitude
+        FROM orders {where} GROUP BY 1, 2 ORDER BY 1, 2
+    """,
+    'extremes': """
+        SELECT min( Delivery_person_Age ) AS age_min, max( Delivery_person_Age ) AS age_max,
+               min( Vehicle_condition ) AS vehicle_condition_min, max( Vehicle_condition ) AS vehicle_condition_max
+        FROM orders {where}
+    """,
+    'top_fastest': _TOP_SQL.replace( '{order}', 'ASC' ),
+    'top_slowest': _TOP_SQL.replace( '{order}', 'DESC' ),
+    'unique_couriers': """
+        SELECT count( DISTINCT Delivery_person_ID ) AS couriers,
+               count( DISTINCT string_split( Delivery_person_ID::VARCHAR, 'DEL' )[1] ) AS restaurants
+        FROM orders {where}
+    """,
+    'delivery_quantiles': 'SELECT ' + _QUANTILES_SQL + ' FROM orders {where}',
+    'delivery_quantiles_by_city': 'SELECT City, ' + _QUANTILES_SQL + ' FROM orders {where} GROUP BY 1 ORDER BY 1',
+    'avg_distance': 'SELECT avg( distance ) AS distance FROM orders {where}',
+    'distance_by_city': 'SELECT City, avg( distance ) AS distance FROM orders {where} GROUP BY 1 ORDER BY 1',
+}
+_SQL.update( { name: _stats_sql( name ) for name in _STATS } )
+
+
+def _where( state ):
+    """
+        Essa função transforma os filtros da barra lateral em predicados SQL
+
+        O duckdb avalia os predicados na leitura da tabela ( predicate pushdown ):
+        blocos fora do corte de data são pulados pelos mínimos e máximos.
+
+        Input: Estado dos filtros ( filter_state )
+        Output: Tupla ( cláusula WHERE, parâmetros )
+    """
+    date_slider, traffic_options = state
+    clausulas, params = [], []
+    if date_slider is not None:
+        clausulas.append( 'Order_Date < ?' )
+        params.append( pd.Timestamp( date_slider ).to_pydatetime() )
+    if traffic_options is not None:
+        if traffic_options:
+            clausulas.append( 'Road_traffic_density IN ({})'.format( ', '.join( '?' * len( traffic_options ) ) ) )
+            params.extend( traffic_options )
+        else:
+            clausulas.append( 'FALSE' )
+
+    return ( 'WHERE ' + ' AND '.join( clausulas ) if clausulas else '' ), params
+
+
+def build_database( path=DATA_PATH ):
+    """
+        Essa função grava o banco duckdb da versão atual do dataset ( uma única vez por versão )
+
+        Sequência de passos:
+        1. Lê o cache colunar da versão ( Arrow, memory-mapped ) ou, sem ele, o dataframe limpo
+        2. Cria a tabela orders no formato colunar do duckdb, com NaN trocado
+           por NULL nas colunas float ( o pandas ignora NaN nas agregações )
+        3. Grava em um arquivo temporário e renomeia, como o cache colunar
+
+        As linhas já estão ordenadas por Order_Date, então os mínimos e máximos
+        de cada bloco do duckdb deixam o filtro de data pular os blocos fora do corte.
+
+        Input: Caminho do csv
+        Output: Caminho do arquivo .duckdb
+    """
+    digest = dataset_version( path )
+    banco = cache_path( path, digest, DATABASE_SUFFIX )
+    if os.path.exists( banco ):
+        return banco
+
+    feather = cache_path( path, digest )
+    if pa is not None and os.path.exists( feather ):
+        fonte = pa.ipc.open_file( pa.memory_map( feather ) ).read_all()
+    else:
+        fonte = load_data( path )
+
+    tmp = '{}.{}.tmp'.format( banco, os.getpid() )
+    con = duckdb.connect( tmp )
+    try:
+        con.register( 'orders_raw', fonte )
+        tipos = con.execute( 'DESCRIBE orders_raw' ).fetchall()
+        troca = ', '.join( """nullif( "{0}", 'NaN'::{1} ) AS "{0}\"""".format( nome, tipo )
+                           for nome, tipo, *_ in tipos if tipo in ( 'FLOAT', 'DOUBLE' ) )
+        con.execute( 'CREATE TABLE orders AS SELECT * {} FROM orders_raw'.format(
+            'REPLACE ( {} )'.format( troca ) if troca else '' ) )
+    finally:
+        con.close()
+
+    os.replace( tmp, banco )
+    prune_versions( path, DATABASE_SUFFIX )
+
+    return banco
+
+
+def _duckdb_query( name, state, path, k=TOP_K, metric='Time_taken(min)' ):
+    # Conexão somente leitura por versão; cada consulta usa o seu cursor ( thread-safe )
+    con = derived( 'duckdb', lambda df1: duckdb.connect( build_database( path ), read_only=True ), path )
+    where, params = _where( state )
+    sql = _SQL[name]
+    if name in ( 'top_fastest', 'top_slowest' ):
+        if metric not in RANK_METRICS:
+            raise ValueError( 'Métrica {} não suportada'.format( metric ) )
+        sql = sql.replace( '{metric}', metric )
+        params = params + [int( k )]
+
+    cursor = con.cursor()
+    try:
+        return cursor.execute( sql.replace( '{where}', where ), params ).df()
+    finally:
+        cursor.close()
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+# Consulta
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+def available_backends():
+    """
+        Essa função lista os backends disponíveis neste ambiente
+
+        Input: Nenhum
+        Output: Lista de nomes
+    """
+    return ['pandas'] + ( ['duckdb'] if duckdb is not None else [] )
+
+
+def query_error_bounds( backend=None, path=DATA_PATH ):
+    """
+        Essa função retorna os limites de erro das consultas com sketches
+
+        No backend pandas as contagens de distintos e os quantis saem dos sketches
+        dos rollups ( core/rollups.py, aproximados só com CURRY_SKETCHES=approx ); o duckdb
+        calcula os dois de forma exata sobre as linhas filtradas.
+
+        Input: Backend ( None usa o DEFAULT_BACKEND ) e caminho do csv
+        Output: Dicionário com o erro relativo típico dos distintos e o erro de posto dos quantis
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend == 'pandas':
+        return error_bounds( load_rollups( path ) )
+    if backend == 'api':
+        return remote_error_bounds()
+
+    return { 'distinct': 0.0, 'quantile': 0.0 }
+
+
+def run_query( name, state, backend=None, path=DATA_PATH, **params ):
+    """
+        Essa função executa uma consulta das páginas com os filtros da barra lateral
+
+        Sequência de passos:
+        1. Executa a consulta no backend ( pandas: cubo, rollups com sketches e
+           índice de filtros; duckdb: SQL com os filtros como predicados; api:
+           requisição ao servidor de core/api.py, que usa um dos dois )
+        2. Normaliza o resultado: chaves como texto, ordenadas, índice de 0 a n
+
+        Os dois backends retornam as mesmas colunas, então as páginas não
+        dependem de qual está em uso ( tests/test_query.py confere; com os
+        sketches aproximados, benchmarks/bench_query.py confere os limites de
+        query_error_bounds ).
+
+        Input:
+            - name: Nome da consulta ( QUERIES )
+            - state: Estado dos filtros ( filter_state )
+            - backend: 'pandas', 'duckdb', 'api' ou None ( DEFAULT_BACKEND )
+            - path: Caminho do csv
+            - params: Parâmetros da consulta ( k e metric nos rankings )
+        Output: Dataframe
+    """
+    backend = backend or DEFAULT_BACKEND
+    if name not in QUERIES:
+        raise KeyError( 'Consulta desconhecida: {}'.format( name ) )
+
+    with span( 'query:' + name, backend=backend ):
+        if backend == 'pandas':
+            df_aux = _PANDAS[name]( state, path, **params )
+        elif backend == 'duckdb' and duckdb is not None:
+            df_aux = _duckdb_query( name, state, path, **params )
+        elif backend == 'api':
+            df_aux = remote_query( name, state, **params )
+        else:
+            raise ValueError( 'Backend {} não disponível ( {} )'.format( backend, available_backends() ) )
+
+    df_aux = df_aux.copy()
+    for col in df_aux.columns:
+        if isinstance( df_aux[col].dtype, pd.CategoricalDtype ):
+            df_aux[col] = df_aux[col].astype( object )
+    keys = QUERIES[name]
+    if keys:
+        df_aux = df_aux.sort_values( keys, kind='mergesort' )
+
+    return df_aux.reset_index( drop=True )
+
+
+def main():
+    """
+        Etapa de build: gera o banco duckdb da versão atual do csv
+
+        Uso:
+            python -m core.query train.csv
+    """
+    path = sys.argv[1] if len( sys.argv ) > 1 else DATA_PATH
+    if duckdb is None:
+        sys.exit( 'duckdb não está instalado, o banco não pode ser gerado' )
+
+    print( build_database( path ) )
+
+
+if __name__ == '__main__':
+    main()
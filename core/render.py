@@ -0,0 +1,119 @@
+# Bibliotecas
+import concurrent.futures
+import os
+import threading
+
+from core.data import bind_pins, current_pins
+from core.profiling import bind_trace, fork_trace, span
+
+# Threads que calculam os painéis, compartilhadas pelas sessões do processo
+# ( CURRY_RENDER_WORKERS=1 calcula na thread do script, um painel de cada vez )
+RENDER_WORKERS = int( os.environ.get( 'CURRY_RENDER_WORKERS', '4' ) )
+
+# Texto mostrado no lugar do painel enquanto ele é calculado
+LOADING_TEXT = 'Carregando...'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ThreadPoolExecutor( max_workers=RENDER_WORKERS, thread_name_prefix='painel' )
+
+        return _pool
+
+
+def add_panel( panels, name, placeholder, compute, render, *args, **kwargs ):
+    """
+        Essa função registra um painel da página para o render_panels
+
+        O placeholder ( st.empty() ) é criado na posição do painel no layout e
+        mostra LOADING_TEXT até o painel ficar pronto.
+
+        Input:
+            - panels: Lista de painéis do rerun
+            - name: Nome do painel ( span e resultado )
+            - placeholder: Placeholder do Streamlit
+            - compute: Função que calcula o painel ( roda em uma thread do pool,
+              então não pode chamar o st )
+            - render: Função render( placeholder, resultado ), chamada na thread do script
+            - args / kwargs: Argumentos do compute
+        Output: None
+    """
+    placeholder.caption( LOADING_TEXT )
+    panels.append( { 'name': name, 'placeholder': placeholder, 'compute': compute, 'render': render,
+                     'args': args, 'kwargs': kwargs } )
+
+
+def _compute( panel, trace, pins, cancel ):
+    # Painel cancelado depois de entrar na fila ( o rerun foi interrompido )
+    if cancel.is_set():
+        raise concurrent.futures.CancelledError()
+
+    # Mesma versão do dataset da thread do script ( pin_session, core/data.py )
+    with bind_pins( pins ), bind_trace( trace ), span( 'panel:' + panel['name'] ):
+        return panel['compute']( *panel['args'], **panel['kwargs'] )
+
+
+def _show( panel, result ):
+    with span( 'render', chart=panel['name'] ):
+        panel['render']( panel['placeholder'], result )
+
+
+def render_panels( panels, workers=None ):
+    """
+        Essa função calcula os painéis em paralelo e desenha cada um assim que fica pronto
+
+        Sequência de passos:
+        1. Envia os cálculos ao pool, na ordem da página
+        2. Desenha cada painel no seu placeholder na ordem em que os cálculos terminam,
+           então um painel lento não segura os rápidos
+        3. Se o rerun é interrompido ( um filtro mudou: o Streamlit levanta a exceção
+           de rerun na próxima chamada ao st ), cancela os cálculos que não começaram
+
+        O erro de um painel aparece no seu placeholder, sem derrubar os outros.
+
+        Input: Lista de painéis ( add_panel ) e quantidade de threads ( None usa RENDER_WORKERS )
+        Output: Dicionário nome -> resultado dos painéis calculados
+    """
+    resultados = {}
+    workers = RENDER_WORKERS if workers is None else workers
+    with span( 'panels', count=len( panels ), workers=workers ):
+        if workers <= 1 or len( panels ) <= 1:
+            for panel in panels:
+                try:
+                    with span( 'panel:' + panel['name'] ):
+                        resultado = panel['compute']( *panel['args'], **panel['kwargs'] )
+                except Exception as e:
+                    panel['placeholder'].exception( e )
+                    continue
+
+                resultados[panel['name']] = resultado
+                _show( panel, resultado )
+
+            return resultados
+
+        cancel = threading.Event()
+        pool = _executor()
+        pins = current_pins()
+        futures = { pool.submit( _compute, panel, fork_trace(), pins, cancel ): panel for panel in panels }
+        try:
+            for future in concurrent.futures.as_completed( futures ):
+                panel = futures[future]
+                try:
+                    resultado = future.result()
+                except Exception as e:
+                    panel['placeholder'].exception( e )
+                    continue
+
+                resultados[panel['name']] = resultado
+                _show( panel, resultado )
+        finally:
+            cancel.set()
+            for future in futures:
+                future.cancel()
+
+    return resultados
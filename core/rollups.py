@@ -0,0 +1,524 @@
+"""
+    Rollups por célula ( dia, cidade, trânsito ) do backend pandas do run_query:
+    contagens, somas, distintos e quantis das páginas sem voltar às linhas
+
+    Memória: no modo exact ( padrão ) os valores de QUANTILE_COLUMNS ficam por
+    célula como ( valor, contagem ) em float32, até 8 bytes por pedido em cada
+    coluna, cerca de metade do dataframe limpo, e crescem com o dataset. O modo
+    approx ( CURRY_SKETCHES=approx ) troca esses valores por KLL e os pares por
+    HyperLogLog, com memória fixa por célula e erro mostrado nas páginas.
+"""
+# Bibliotecas
+import os
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.data import DATA_PATH, derived
+from core.sketches import HyperLogLog, KLLSketch, hll_positions, weighted_quantile
+
+# Modo dos sketches das células ( CURRY_SKETCHES ). Só o backend pandas do run_query
+# usa os rollups para distintos e quantis; o duckdb calcula os dois de forma exata:
+#   - exact: pares ( célula, entregador ) e os valores de cada célula como ( valor, contagem ) em
+#     float32. A memória cresce com o dataset: até 8 bytes por pedido em cada coluna de
+#     QUANTILE_COLUMNS ( bem menos nas discretas, como o tempo ), cerca de metade do
+#     dataframe limpo; em datasets grandes o approx gasta menos
+#   - approx: HyperLogLog para distintos e KLL para quantis ( memória fixa por célula ); as
+#     páginas mostram esses valores como aproximados ( query_error_bounds )
+SKETCH_MODE = os.environ.get( 'CURRY_SKETCHES', 'exact' )
+
+# Precisão dos HyperLogLog das células ( 2**p bytes por célula, erro típico 1.04 / sqrt( 2**p ) )
+HLL_P = 10
+
+# Parâmetro k dos KLL das células ( ~3k valores por célula, erro de posto ~1.3% com k=200 )
+KLL_K = 200
+
+# Dimensões das células além do dia ( até 256 valores cada ), na ordem dos bits da chave
+ROLLUP_DIMENSIONS = ['City', 'Road_traffic_density']
+
+# Colunas com quantis por célula
+QUANTILE_COLUMNS = ['Time_taken(min)', 'distance', 'Delivery_location_latitude', 'Delivery_location_longitude']
+
+# Contagens de distintos ( o restaurante é o prefixo do ID do entregador, ex.: CITY3RES06DEL03 -> CITY3RES06 )
+DISTINCT_COUNTS = ['couriers', 'restaurants']
+
+# Chave da célula: dia ( desde 1970-01-01 ) << 16 | cidade << 8 | trânsito
+# Chave do par: célula << 32 | entregador
+_DAY_SHIFT = 16
+_DIMENSION_SHIFTS = [8, 0]
+_DIMENSION_BITS = 8
+_PAIR_SHIFT = 32
+_LOW_BITS = ( 1 << _PAIR_SHIFT ) - 1
+
+
+def iso_week_key( datas ):
+    """
+        Essa função calcula a chave da semana ISO de cada data
+
+        A chave é ano ISO * 100 + semana ISO ( ex.: 202206 ), a mesma do
+        aggregate( freq='week' ) e do yearweek do duckdb. Diferente do '%U' do
+        strftime, a mesma semana de anos diferentes não se junta.
+
+        Input: Datas ( array, Series ou DatetimeIndex )
+        Output: Array int64
+    """
+    iso = pd.DatetimeIndex( datas ).isocalendar()
+
+    return iso['year'].to_numpy( dtype=np.int64 ) * 100 + iso['week'].to_numpy( dtype=np.int64 )
+
+
+def restaurant_ids( courier_ids ):
+    """
+        Essa função extrai o restaurante do ID do entregador
+
+        Input: IDs dos entregadores ( ex.: CITY3RES06DEL03 )
+        Output: pd.Index com os IDs dos restaurantes ( ex.: CITY3RES06 )
+    """
+    return pd.Index( courier_ids, dtype=object ).str.split( 'DEL', n=1 ).str[0]
+
+
+def _category_codes( serie, categories ):
+    """
+        Essa função converte uma coluna em códigos inteiros estáveis, acrescentando os
+        valores novos ao final das categorias ( os códigos antigos não mudam )
+
+        Só as categorias da coluna são comparadas; as linhas usam os códigos do pandas.
+
+        Input: Coluna ( categórica ou não ) e pd.Index com as categorias atuais
+        Output: Tupla ( códigos, categorias atualizadas )
+    """
+    serie = serie if isinstance( serie.dtype, pd.CategoricalDtype ) else serie.astype( 'category' )
+    atuais = serie.cat.categories
+    novas = atuais[~atuais.isin( categories )]
+    if len( novas ):
+        categories = categories.append( pd.Index( novas, dtype=object ) )
+
+    mapa = categories.get_indexer( atuais )
+    codigos = serie.cat.codes.to_numpy()
+
+    return np.where( codigos >= 0, mapa[codigos], -1 ), categories
+
+
+def _check_codes( codigos, categories, col, bits ):
+    """
+        Essa função confere se os códigos de uma coluna cabem no seu campo da chave
+
+        Um código negativo ( valor nulo ) ou maior que o campo invadiria o campo
+        vizinho e juntaria células diferentes sem nenhum erro.
+
+        Input: Códigos, categorias, nome da coluna e bits do campo
+        Output: None ( levanta ValueError se não couberem )
+    """
+    if len( categories ) > 1 << bits:
+        raise ValueError( 'Coluna {} com {} valores distintos; a chave dos rollups comporta {}'.format(
+            col, len( categories ), 1 << bits ) )
+    if len( codigos ) and codigos.min() < 0:
+        raise ValueError( 'Coluna {} com valores nulos não entra na chave dos rollups'.format( col ) )
+
+
+def _day_number( values ):
+    return values.astype( 'datetime64[D]' ).astype( np.int64 )
+
+
+def _first_day_after( date_slider ):
+    # Primeiro dia que não passa no filtro Order_Date < date_slider
+    data = pd.Timestamp( date_slider )
+    dia = data.normalize()
+
+    return _day_number( np.datetime64( dia if dia == data else dia + pd.Timedelta( days=1 ), 'D' ) )
+
+
+def _update_values( old, cell_old, cell_new, valores, n_cells, k ):
+    """
+        Essa função junta os valores de uma coluna por célula ( formato CSR )
+
+        Sequência de passos:
+        1. Junta os itens antigos ( já na célula nova de cada um ) e os valores novos ( peso 1 )
+        2. Ordena pela célula e calcula o início de cada célula ( offsets )
+        3. No modo exact, junta os valores repetidos de cada célula em um item com a soma dos pesos
+        4. No modo approx, compacta em um KLL as células que receberam valores e passaram de k itens
+
+        Itens e pesos ficam em float32 ( as colunas do dataframe limpo já são float32
+        ou inteiros pequenos ), com os pesos somados em float64 nas consultas.
+
+        Input: Tupla ( itens, pesos, offsets ) antiga, nova posição das células antigas,
+               célula de cada valor novo, valores, quantidade de células e k ( None no modo exact )
+        Output: Tupla ( itens, pesos, offsets )
+    """
+    itens, pesos, offsets = old
+    ok = ~np.isnan( valores )
+
+    celulas = np.concatenate( [np.repeat( cell_old, np.diff( offsets ) ), cell_new[ok]] )
+    ordem = np.argsort( celulas, kind='stable' )
+    itens = np.concatenate( [itens, valores[ok]] )[ordem]
+    pesos = np.concatenate( [pesos, np.ones( np.count_nonzero( ok ) )] )[ordem]
+    offsets = np.searchsorted( celulas[ordem], np.arange( n_cells + 1 ) )
+    if k is None:
+        return _collapse( itens, pesos, celulas[ordem], n_cells )
+
+    tocadas = np.zeros( n_cells, bool )
+    tocadas[cell_new[ok]] = True
+    partes_itens, partes_pesos = [], []
+    for c in range( n_cells ):
+        i, w = itens[offsets[c]:offsets[c + 1]], pesos[offsets[c]:offsets[c + 1]]
+        # Células com até k itens ficam como estão ( exatas e já dentro do tamanho de um KLL )
+        if tocadas[c] and len( i ) > k:
+            i, w = KLLSketch.from_items( i, w, k, seed=c ).weighted_items()
+        partes_itens.append( i )
+        partes_pesos.append( w )
+
+    tamanhos = np.array( [len( i ) for i in partes_itens], dtype=np.int64 )
+    return ( ( np.concatenate( partes_itens ) if partes_itens else itens ).astype( np.float32 ),
+             ( np.concatenate( partes_pesos ) if partes_pesos else pesos ).astype( np.float32 ),
+             np.r_[0, np.cumsum( tamanhos )] )
+
+
+def _collapse( itens, pesos, celulas, n_cells ):
+    # Um item por ( célula, valor ), com a soma dos pesos: o mesmo quantil com menos memória
+    if len( itens ) == 0:
+        return itens.astype( np.float32 ), pesos.astype( np.float32 ), np.zeros( n_cells + 1, np.int64 )
+
+    ordem = np.lexsort( ( itens, celulas ) )
+    itens, celulas = itens[ordem], celulas[ordem]
+    inicios = np.flatnonzero( np.r_[True, ( np.diff( celulas ) != 0 ) | ( np.diff( itens ) != 0 )] )
+    pesos = np.add.reduceat( pesos[ordem], inicios )
+
+    return ( itens[inicios].astype( np.float32 ), pesos.astype( np.float32 ),
+             np.searchsorted( celulas[inicios], np.arange( n_cells + 1 ) ) )
+
+
+def _counted_quantile( itens, contagens, qs ):
+    """
+        Essa função calcula quantis com interpolação linear de valores com contagens
+
+        Input: Valores, quantas vezes cada um aparece e lista de quantis
+        Output: Quantis ( os mesmos do np.quantile com os valores repetidos )
+    """
+    ordem = np.argsort( itens, kind='stable' )
+    valores = itens[ordem].astype( np.float64 )
+    acumulado = np.cumsum( contagens[ordem], dtype=np.float64 )
+
+    h = ( acumulado[-1] - 1 ) * np.asarray( qs, dtype=np.float64 )
+    baixo = np.floor( h )
+    alto = np.minimum( baixo + 1, acumulado[-1] - 1 )
+    x_baixo = valores[np.searchsorted( acumulado, baixo, side='right' )]
+    x_alto = valores[np.searchsorted( acumulado, alto, side='right' )]
+
+    return x_baixo + ( h - baixo ) * ( x_alto - x_baixo )
+
+
+def empty_rollups( mode=None, p=HLL_P, k=KLL_K ):
+    """
+        Essa função cria um store de rollups vazio
+
+        Input: Modo dos sketches ( 'approx' ou 'exact', None usa o SKETCH_MODE ),
+               precisão do HyperLogLog e k do KLL
+        Output: Dicionário de arrays, uma posição por célula ( dia, cidade, trânsito ), ordenadas pela chave
+    """
+    mode = mode or SKETCH_MODE
+    if mode not in ( 'approx', 'exact' ):
+        raise ValueError( 'Modo dos sketches {} não suportado ( approx ou exact )'.format( mode ) )
+
+    vazio = ( np.zeros( 0 ), np.zeros( 0 ), np.zeros( 1, np.int64 ) )
+    store = {
+        'mode': mode,
+        'p': p,
+        'k': k,
+        'cells': np.zeros( 0, np.int64 ),
+        'count': np.zeros( 0, np.int64 ),
+        'time_sum': np.zeros( 0, np.float64 ),
+        'time_sumsq': np.zeros( 0, np.float64 ),
+        'courier_ids': pd.Index( [], dtype=object ),
+        'restaurant_ids': pd.Index( [], dtype=object ),
+        'restaurant_of': np.zeros( 0, np.int64 ),
+        'pairs': np.zeros( 0, np.int64 ),
+        'hll': { nome: np.zeros( ( 0, 1 << p ), np.uint8 ) for nome in DISTINCT_COUNTS },
+        'quantiles': { col: vazio for col in QUANTILE_COLUMNS },
+    }
+    for col in ROLLUP_DIMENSIONS:
+        store[col] = pd.Index( [], dtype=object )
+
+    return store
+
+
+def update_rollups( store, df1 ):
+    """
+        Essa função acrescenta pedidos ao store de rollups sem reprocessar o histórico
+
+        Sequência de passos:
+        1. Calcula a chave inteira da célula de cada pedido ( dia, cidade, trânsito )
+        2. Junta as células do store e as novas e soma contagem, tempo e tempo ao quadrado
+        3. Une os pares ( célula, entregador ) ou atualiza os HyperLogLog das células
+        4. Junta os valores das colunas de quantis ( compactados em KLL no modo approx )
+
+        Input: Store ( empty_rollups ou de uma versão anterior ) e dataframe limpo com os pedidos
+        Output: Novo store ( o store recebido não é alterado )
+    """
+    novo = dict( store )
+
+    celula = _day_number( df1['Order_Date'].to_numpy() ) << _DAY_SHIFT
+    for shift, col in zip( _DIMENSION_SHIFTS, ROLLUP_DIMENSIONS ):
+        codigos, novo[col] = _category_codes( df1[col], store[col] )
+        _check_codes( codigos, novo[col], col, _DIMENSION_BITS )
+        celula |= codigos.astype( np.int64 ) << shift
+
+    # Células antigas e novas somadas pela chave ( a ordem da chave é a ordem das datas )
+    n_antigas = len( store['cells'] )
+    novo['cells'], inv = np.unique( np.concatenate( [store['cells'], celula] ), return_inverse=True )
+    tempo = df1['Time_taken(min)'].to_numpy( dtype=np.float64 )
+
+    def somar( antigo, valores ):
+        return np.bincount( inv, weights=np.concatenate( [antigo, valores] ), minlength=len( novo['cells'] ) )
+
+    novo['count'] = somar( store['count'], np.ones( len( celula ) ) ).astype( np.int64 )
+    novo['time_sum'] = somar( store['time_sum'], tempo )
+    novo['time_sumsq'] = somar( store['time_sumsq'], tempo ** 2 )
+
+    # Entregadores e o restaurante de cada um ( só os IDs novos passam pelo restaurant_ids )
+    entregador, novo['courier_ids'] = _category_codes( df1['Delivery_person_ID'], store['courier_ids'] )
+    _check_codes( entregador, novo['courier_ids'], 'Delivery_person_ID', _PAIR_SHIFT )
+    novos_ids = novo['courier_ids'][len( store['courier_ids'] ):]
+    restaurante, novo['restaurant_ids'] = _category_codes( pd.Series( restaurant_ids( novos_ids ), dtype=object ),
+                                                           store['restaurant_ids'] )
+    novo['restaurant_of'] = np.concatenate( [store['restaurant_of'], restaurante] )
+
+    pares = np.unique( celula << _PAIR_SHIFT | entregador.astype( np.int64 ) )
+    if store['mode'] == 'exact':
+        novo['pairs'] = np.union1d( store['pairs'], pares )
+    else:
+        # Hash só dos IDs distintos; cada par usa o registrador do seu entregador ( ou restaurante )
+        quem = pares & _LOW_BITS
+        linha = np.searchsorted( novo['cells'], pares >> _PAIR_SHIFT )
+        novo['hll'] = {}
+        for nome, ids, codigos in [( 'couriers', novo['courier_ids'], quem ),
+                                   ( 'restaurants', novo['restaurant_ids'], novo['restaurant_of'][quem] )]:
+            registradores = np.zeros( ( len( novo['cells'] ), 1 << store['p'] ), np.uint8 )
+            registradores[inv[:n_antigas]] = store['hll'][nome]
+            idx, rank = hll_positions( ids.to_numpy(), store['p'] )
+            np.maximum.at( registradores.reshape( -1 ), linha * registradores.shape[1] + idx[codigos], rank[codigos] )
+            novo['hll'][nome] = registradores
+
+    k = store['k'] if store['mode'] == 'approx' else None
+    novo['quantiles'] = { col: _update_values( store['quantiles'][col], inv[:n_antigas], inv[n_antigas:],
+                                               df1[col].to_numpy( dtype=np.float64 ), len( novo['cells'] ), k )
+                          for col in QUANTILE_COLUMNS }
+
+    return novo
+
+
+def build_rollups( df1, mode=None, p=HLL_P, k=KLL_K ):
+    """
+        Essa função cria o store de rollups de um dataframe
+
+        Input: Dataframe limpo, modo dos sketches, precisão do HyperLogLog e k do KLL
+        Output: Store de rollups ( ver empty_rollups )
+    """
+    return update_rollups( empty_rollups( mode, p, k ), df1 )
+
+
+def load_rollups( path=DATA_PATH, mode=None ):
+    """
+        Essa função retorna o store de rollups da versão atual do dataset
+
+        Os pedidos anexados com o append_orders são somados ao store existente.
+        Cada modo tem o seu store, então trocar o SKETCH_MODE não mistura os dois.
+
+        Input: Caminho do csv e modo dos sketches ( None usa o SKETCH_MODE )
+        Output: Store de rollups
+    """
+    mode = mode or SKETCH_MODE
+
+    return derived( 'rollups.' + mode, lambda df1: build_rollups( df1, mode ), path,
+                    update=lambda store, df1, delta: update_rollups( store, delta ) )
+
+
+def error_bounds( store ):
+    """
+        Essa função retorna os limites de erro das contagens de distintos e dos quantis do store
+
+        Input: Store de rollups
+        Output: Dicionário com o erro relativo típico dos distintos e o erro de posto dos quantis ( 0 no modo exact )
+    """
+    if store['mode'] == 'exact':
+        return { 'distinct': 0.0, 'quantile': 0.0 }
+
+    return { 'distinct': HyperLogLog.error_bound( store['p'] ), 'quantile': KLLSketch.error_bound( store['k'] ) }
+
+
+def select_cells( store, date_slider=None, traffic_options=None ):
+    """
+        Essa função aplica os filtros da barra lateral nas células
+
+        As células estão ordenadas por dia, então a data limite é um prefixo
+        ( busca binária ) e só o trânsito é comparado célula a célula.
+
+        Input: Store, data limite ( exclusiva ) ou None e lista de condições de trânsito ou None
+        Output: Posições das células selecionadas
+    """
+    fim = len( store['cells'] )
+    if date_slider is not None:
+        fim = int( np.searchsorted( store['cells'], _first_day_after( date_slider ) << _DAY_SHIFT, side='left' ) )
+
+    pos = np.arange( fim )
+    if traffic_options is not None:
+        codigos = store['Road_traffic_density'].get_indexer( list( traffic_options ) )
+        trafego = store['cells'][:fim] & 0xFF
+        pos = pos[np.isin( trafego, codigos[codigos >= 0] )]
+
+    return pos
+
+
+def _distinct_counts( store, nome, pos, grupo, n_grupos ):
+    # Entregadores ( ou restaurantes ) distintos por grupo, a partir das células selecionadas e do grupo de cada uma
+    if store['mode'] == 'exact':
+        if len( pos ) == 0:
+            return np.zeros( n_grupos, np.int64 )
+
+        # Pares do prefixo de células e a célula de cada par
+        fim = np.searchsorted( store['pairs'], ( store['cells'][pos[-1]] + 1 ) << _PAIR_SHIFT, side='left' )
+        pares = store['pairs'][:fim]
+        grupo_celula = np.full( pos[-1] + 1, -1, np.int64 )
+        grupo_celula[pos] = grupo
+        g = grupo_celula[np.searchsorted( store['cells'], pares >> _PAIR_SHIFT )]
+        manter = g >= 0
+
+        quem = pares[manter] & _LOW_BITS
+        if nome == 'restaurants':
+            quem = store['restaurant_of'][quem]
+        unicos = np.unique( g[manter] << _PAIR_SHIFT | quem )
+        return np.bincount( unicos >> _PAIR_SHIFT, minlength=n_grupos )
+
+    estimativas = np.zeros( n_grupos, np.int64 )
+    if len( pos ) == 0:
+        return estimativas
+
+    ordem = np.argsort( grupo, kind='stable' )
+    inicios = np.flatnonzero( np.r_[True, np.diff( grupo[ordem] ) != 0] )
+    registradores = np.maximum.reduceat( store['hll'][nome][pos[ordem]], inicios, axis=0 )
+    for g, regs in zip( grupo[ordem][inicios], registradores ):
+        sketch = HyperLogLog( store['p'] )
+        sketch.registers = regs
+        estimativas[g] = sketch.estimate()
+
+    return estimativas
+
+
+def _quantiles( store, col, qs, pos, grupo, n_grupos ):
+    # Quantis de uma coluna por grupo: itens das células selecionadas, separados pelo grupo
+    resultado = np.full( ( n_grupos, len( qs ) ), np.nan )
+    if len( pos ) == 0:
+        return resultado
+
+    itens, pesos, offsets = store['quantiles'][col]
+    fim = pos[-1] + 1
+    grupo_celula = np.full( fim, -1, np.int64 )
+    grupo_celula[pos] = grupo
+    g = np.repeat( grupo_celula, np.diff( offsets[:fim + 1] ) )
+    manter = np.flatnonzero( g >= 0 )
+
+    ordem = manter[np.argsort( g[manter], kind='stable' )]
+    limites = np.searchsorted( g[ordem], np.arange( n_grupos + 1 ) )
+    for i in range( n_grupos ):
+        parte = ordem[limites[i]:limites[i + 1]]
+        if len( parte ) == 0:
+            continue
+        if store['mode'] == 'exact':
+            resultado[i] = _counted_quantile( itens[parte], pesos[parte], qs )
+        else:
+            resultado[i] = weighted_quantile( itens[parte], pesos[parte], qs )
+
+    return resultado
+
+
+def quantile_column( col, q ):
+    """
+        Essa função retorna o nome da coluna de um quantil no resultado do aggregate
+
+        Input: Coluna e quantil ( ex.: 'Time_taken(min)', 0.9 )
+        Output: Nome ( ex.: 'Time_taken(min)_p90' )
+    """
+    return '{}_p{:g}'.format( col, round( q * 100, 6 ) )
+
+
+def aggregate( store, date_slider=None, traffic_options=None, freq='day', by=(), distinct=(), quantiles=None ):
+    """
+        Essa função agrega as células por dia, por semana ISO ou no período inteiro
+
+        Sequência de passos:
+        1. Seleciona as células ( select_cells )
+        2. Calcula a chave de cada dia distinto: o próprio dia ou ano ISO * 100 + semana ISO
+           ( ex.: 202206, ver iso_week_key )
+        3. Soma contagem e tempos por grupo
+        4. Conta os distintos e calcula os quantis pedidos juntando os sketches das células
+
+        Input:
+            - store: Store de rollups
+            - date_slider / traffic_options: Filtros da barra lateral ( None não filtra )
+            - freq: 'day', 'week' ou None ( sem quebra por data; sem by, sempre uma linha )
+            - by: Dimensões extras ( ROLLUP_DIMENSIONS )
+            - distinct: Contagens de distintos ( DISTINCT_COUNTS )
+            - quantiles: Dicionário coluna ( QUANTILE_COLUMNS ) -> lista de quantis
+        Output: Dataframe ordenado pela data com Order_Date ( day ) ou week e week_start ( week ),
+                as dimensões de by e as colunas count, time_mean, time_std, uma por contagem
+                de distintos e uma por quantil ( quantile_column )
+    """
+    if freq not in ( 'day', 'week', None ):
+        raise ValueError( 'Frequência {} não suportada ( day, week ou None )'.format( freq ) )
+
+    pos = select_cells( store, date_slider, traffic_options )
+    cells = store['cells'][pos]
+
+    # Datas calculadas só nos dias distintos
+    dias, dia_inv = np.unique( cells >> _DAY_SHIFT, return_inverse=True )
+    datas = pd.to_datetime( dias, unit='D' )
+    chave_dia, inicio_dia = np.zeros( len( dias ), np.int64 ), dias
+    if freq == 'week':
+        chave_dia = iso_week_key( datas )
+        inicio_dia = dias - datas.dayofweek.to_numpy( dtype=np.int64 )
+    elif freq == 'day':
+        chave_dia = dias
+    chave = chave_dia[dia_inv] if len( cells ) else np.zeros( 0, np.int64 )
+
+    # Grupo: chave de tempo e códigos das dimensões de by
+    composta = chave << _DAY_SHIFT
+    for col in by:
+        shift = _DIMENSION_SHIFTS[ROLLUP_DIMENSIONS.index( col )]
+        composta = composta | ( ( cells >> shift ) & 0xFF ) << shift
+    if freq is None and not by:
+        grupos, g = np.zeros( 1, np.int64 ), np.zeros( len( cells ), np.int64 )
+    else:
+        grupos, g = np.unique( composta, return_inverse=True )
+
+    n = np.bincount( g, weights=store['count'][pos], minlength=len( grupos ) )
+    soma = np.bincount( g, weights=store['time_sum'][pos], minlength=len( grupos ) )
+    sumsq = np.bincount( g, weights=store['time_sumsq'][pos], minlength=len( grupos ) )
+
+    # Primeiro dia do grupo: o próprio dia ou a segunda-feira da semana ISO
+    inicio = np.zeros( len( grupos ), np.int64 )
+    inicio[g] = inicio_dia[dia_inv] if len( cells ) else inicio[g]
+
+    df_aux = pd.DataFrame( index=range( len( grupos ) ) )
+    if freq == 'week':
+        df_aux['week'] = grupos >> _DAY_SHIFT
+        df_aux['week_start'] = pd.to_datetime( inicio, unit='D' )
+    elif freq == 'day':
+        df_aux['Order_Date'] = pd.to_datetime( inicio, unit='D' )
+    for col in by:
+        shift = _DIMENSION_SHIFTS[ROLLUP_DIMENSIONS.index( col )]
+        df_aux[col] = store[col].take( ( grupos >> shift ) & 0xFF ).to_numpy()
+
+    df_aux['count'] = n.astype( np.int64 )
+    with np.errstate( invalid='ignore', divide='ignore' ):
+        df_aux['time_mean'] = soma / n
+        var = ( sumsq - soma ** 2 / n ) / ( n - 1 )
+    df_aux['time_std'] = np.sqrt( np.where( n > 1, np.maximum( var, 0 ), np.nan ) )
+
+    for nome in distinct:
+        df_aux[nome] = _distinct_counts( store, nome, pos, g, len( grupos ) )
+    for col, qs in ( quantiles or {} ).items():
+        valores = _quantiles( store, col, list( qs ), pos, g, len( grupos ) )
+        for j, q in enumerate( qs ):
+            df_aux[quantile_column( col, q )] = valores[:, j]
+
+    return df_aux
@@ -0,0 +1,161 @@
+# Bibliotecas necessárias
+import numpy as np
+
+from core.data import DATA_PATH, derived
+from core.geo import DELIVERY_COLUMNS, EARTH_RADIUS_KM, RESTAURANT_COLUMNS, haversine, null_island
+
+# Tamanho ( graus ) das células do índice ( ~5.5 km de latitude )
+CELL_DEG = 0.05
+
+
+def build_grid( lat, lon, cell_deg=CELL_DEG ):
+    """
+        Essa função cria um índice espacial em grid para um conjunto de pontos
+
+        Os pontos são ordenados pela chave da célula ( linha * colunas + coluna ),
+        então os pontos de uma faixa de células da mesma linha ficam contíguos e
+        são encontrados com busca binária.
+
+        Input: Arrays de latitude e longitude e tamanho da célula em graus
+        Output: Dicionário com as chaves ordenadas, as posições originais e as coordenadas
+    """
+    lat = np.asarray( lat, dtype=np.float64 )
+    lon = np.asarray( lon, dtype=np.float64 )
+    n_cols = int( np.ceil( 360 / cell_deg ) ) + 1
+
+    pos = np.flatnonzero( ~np.isnan( lat ) & ~np.isnan( lon ) & ~null_island( lat, lon ) )
+    chaves = ( np.floor( ( lat[pos] + 90 ) / cell_deg ).astype( np.int64 ) * n_cols
+               + np.floor( ( lon[pos] + 180 ) / cell_deg ).astype( np.int64 ) )
+    ordem = np.argsort( chaves, kind='stable' )
+
+    return { 'cell_deg': cell_deg, 'n_cols': n_cols, 'keys': chaves[ordem], 'pos': pos[ordem],
+             'lat': lat[pos][ordem], 'lon': lon[pos][ordem] }
+
+
+def query_radius( grid, lat, lon, radius_km ):
+    """
+        Essa função encontra os pontos a até radius_km de ( lat, lon )
+
+        Sequência de passos:
+        1. Calcula as linhas e colunas de células que cobrem o círculo
+        2. Para cada linha, encontra a faixa de pontos com searchsorted
+        3. Filtra os candidatos pela distância exata ( haversine )
+
+        Input: Índice ( build_grid ), ponto central e raio em km
+        Output: Tupla ( posições dos pontos originais, distâncias em km )
+    """
+    cell = grid['cell_deg']
+    n_cols = grid['n_cols']
+    dlat = np.degrees( radius_km / EARTH_RADIUS_KM )
+    dlon = min( dlat / max( np.cos( np.radians( lat ) ), 1e-6 ), 180 )
+
+    row_min, row_max = ( int( np.floor( ( v + 90 ) / cell ) ) for v in ( lat - dlat, lat + dlat ) )
+    col_min, col_max = ( int( np.floor( ( v + 180 ) / cell ) ) for v in ( lon - dlon, lon + dlon ) )
+    col_min, col_max = max( col_min, 0 ), min( col_max, n_cols - 1 )
+
+    linhas = np.arange( row_min, row_max + 1, dtype=np.int64 ) * n_cols
+    inicio = np.searchsorted( grid['keys'], linhas + col_min, side='left' )
+    fim = np.searchsorted( grid['keys'], linhas + col_max, side='right' )
+
+    candidatos = np.concatenate( [np.arange( a, b ) for a, b in zip( inicio, fim )] ) if len( linhas ) else np.empty( 0, np.int64 )
+    candidatos = candidatos.astype( np.int64 )
+    dist = haversine( lat, lon, grid['lat'][candidatos], grid['lon'][candidatos] )
+    dentro = dist <= radius_km
+
+    return grid['pos'][candidatos[dentro]], dist[dentro]
+
+
+def query_nearest( grid, lat, lon, k ):
+    """
+        Essa função encontra os k pontos mais próximos de ( lat, lon )
+
+        O raio da busca começa no tamanho de uma célula e dobra até encontrar
+        pelo menos k pontos; qualquer ponto mais próximo estaria dentro do raio,
+        então o resultado é exato.
+
+        Input: Índice ( build_grid ), ponto e quantidade de vizinhos
+        Output: Tupla ( posições dos pontos originais, distâncias em km ), da mais próxima à mais distante
+    """
+    raio = np.radians( grid['cell_deg'] ) * EARTH_RADIUS_KM
+    total = len( grid['pos'] )
+    while True:
+        pos, dist = query_radius( grid, lat, lon, raio )
+        if len( pos ) >= min( k, total ) or raio > np.pi * EARTH_RADIUS_KM:
+            break
+        raio *= 2
+
+    ordem = np.argsort( dist, kind='stable' )[:k]
+
+    return pos[ordem], dist[ordem]
+
+
+def build_spatial_index( df1 ):
+    """
+        Essa função cria os índices espaciais dos locais de entrega e dos restaurantes
+
+        Input: Dataframe limpo
+        Output: Dicionário com o dataframe, o índice das entregas, os restaurantes
+                distintos e o índice dos restaurantes
+    """
+    restaurantes = (df1.loc[:, RESTAURANT_COLUMNS]
+                       .drop_duplicates()
+                       .reset_index( drop=True ))
+
+    return {
+        'df': df1,
+        'deliveries': build_grid( df1[DELIVERY_COLUMNS[0]], df1[DELIVERY_COLUMNS[1]] ),
+        'restaurants': restaurantes,
+        'restaurants_grid': build_grid( restaurantes[RESTAURANT_COLUMNS[0]], restaurantes[RESTAURANT_COLUMNS[1]] ),
+    }
+
+
+def load_spatial_index( path=DATA_PATH ):
+    """
+        Essa função retorna os índices espaciais da versão atual do dataset
+
+        Input: Caminho do csv
+        Output: Dicionário ( ver build_spatial_index )
+    """
+    return derived( 'spatial_index', build_spatial_index, path )
+
+
+def orders_within( index, lat, lon, radius_km ):
+    """
+        Essa função retorna os pedidos entregues a até radius_km de ( lat, lon )
+
+        Input: Índice ( load_spatial_index ), ponto e raio em km
+        Output: Dataframe com os pedidos
+    """
+    pos, _ = query_radius( index['deliveries'], lat, lon, radius_km )
+
+    return index['df'].iloc[np.sort( pos )]
+
+
+def nearest_restaurants( index, lat, lon, k=5 ):
+    """
+        Essa função retorna os k restaurantes mais próximos de ( lat, lon )
+
+        Input: Índice ( load_spatial_index ), ponto e quantidade de restaurantes
+        Output: Dataframe com as coordenadas e a distância ( km )
+    """
+    pos, dist = query_nearest( index['restaurants_grid'], lat, lon, k )
+
+    return index['restaurants'].iloc[pos].assign( distance_km=dist ).reset_index( drop=True )
+
+
+def zone_stats( df1 ):
+    """
+        Essa função resume o tempo de entrega e a distância dos pedidos de uma zona
+
+        Input: Dataframe com os pedidos da zona
+        Output: Dicionário com orders, avg_time, std_time, p90_time e avg_distance
+    """
+    tempo = df1['Time_taken(min)']
+
+    return {
+        'orders': len( df1 ),
+        'avg_time': tempo.mean(),
+        'std_time': tempo.std(),
+        'p90_time': tempo.quantile( 0.9 ) if len( tempo ) else np.nan,
+        'avg_distance': df1['distance'].mean(),
+    }
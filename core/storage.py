@@ -0,0 +1,216 @@
+# Bibliotecas
+import json
+import logging
+import os
+import pickle
+import sys
+
+# Bibliotecas necessárias
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = None
+
+logger = logging.getLogger( __name__ )
+
+# O cache colunar fica ao lado do csv, um arquivo por versão ( hash ) do csv:
+# train.csv -> train.<hash>.feather
+CACHE_SUFFIX = '.feather'
+DIGEST_CHARS = 16
+
+# Versões mantidas no disco: a atual e a anterior ( processos que ainda
+# não viram a versão nova continuam encontrando a sua )
+KEEP_VERSIONS = 2
+
+# Muda quando o clean_code passa a gerar colunas ou tipos diferentes, ou quando
+# uma estrutura derivada gravada ( write_derived ) muda de formato
+CACHE_FORMAT = '4'
+
+META_KEY = b'curry'
+
+# Estruturas derivadas atualizadas pelo append_orders ( cubo, rollups, perfis ):
+# train.csv -> train.<hash>.cube.pkl
+DERIVED_SUFFIX = '.{}.pkl'
+
+
+def cache_path( path, digest, suffix=CACHE_SUFFIX ):
+    """
+        Essa função retorna o caminho do cache de uma versão de um csv
+
+        Input: Caminho do csv, hash do seu conteúdo e extensão do arquivo
+        Output: Caminho do arquivo ( .feather por padrão )
+    """
+    return '{}.{}{}'.format( os.path.splitext( path )[0], digest[:DIGEST_CHARS], suffix )
+
+
+def prune_versions( path, suffix=CACHE_SUFFIX, keep=KEEP_VERSIONS ):
+    """
+        Essa função remove os caches de versões antigas de um csv
+
+        Processos que já abriram um arquivo removido continuam lendo a sua
+        cópia ( o sistema só libera o arquivo quando o último processo fecha ).
+
+        Input: Caminho do csv, extensão dos arquivos e quantidade de versões mantidas
+        Output: None
+    """
+    base = os.path.basename( os.path.splitext( path )[0] ) + '.'
+    pasta = os.path.dirname( os.path.abspath( path ) )
+    versoes = []
+    for nome in os.listdir( pasta ):
+        if nome.startswith( base ) and nome.endswith( suffix ) \
+                and len( nome ) == len( base ) + DIGEST_CHARS + len( suffix ):
+            try:
+                versoes.append( ( os.path.getmtime( os.path.join( pasta, nome ) ), os.path.join( pasta, nome ) ) )
+            except OSError:
+                # Removido por outro processo
+                continue
+
+    for _, antigo in sorted( versoes, reverse=True )[keep:]:
+        try:
+            os.remove( antigo )
+        except OSError:
+            pass
+
+
+def read_columnar( path, digest ):
+    """
+        Essa função lê o dataset limpo do cache colunar ( Arrow IPC / Feather v2, memory-mapped )
+
+        O cache só é usado se foi gerado a partir de um csv com o mesmo hash e
+        com o mesmo CACHE_FORMAT. As colunas numéricas e os códigos das categorias
+        apontam direto para o arquivo mapeado ( somente leitura ), então todos os
+        processos do servidor que abrem a mesma versão dividem as mesmas páginas
+        de memória do sistema, em vez de cada um ter a sua cópia.
+
+        Input: Caminho do csv e hash do seu conteúdo
+        Output: Dataframe ou None ( cache ausente, inválido ou pyarrow não instalado )
+    """
+    cache = cache_path( path, digest )
+    if pa is None or not os.path.exists( cache ):
+        return None
+
+    try:
+        reader = pa.ipc.open_file( pa.memory_map( cache ) )
+        meta = json.loads( ( reader.schema.metadata or {} ).get( META_KEY, b'{}' ) )
+        if meta.get( 'format' ) != CACHE_FORMAT or meta.get( 'digest' ) != digest:
+            return None
+
+        # Um bloco por coluna: colunas numéricas sem nulos viram arrays numpy
+        # somente leitura apontando para o arquivo mapeado ( sem cópia ).
+        # Strings voltam como array do Arrow ( compact, core/data.py ), não como objetos Python
+        return reader.read_all().to_pandas( split_blocks=True,
+                                            types_mapper={ pa.string(): pd.StringDtype( 'pyarrow' ) }.get )
+    except ( OSError, ValueError, pa.ArrowException ) as e:
+        logger.warning( 'Cache colunar %s ignorado: %s', cache, e )
+        return None
+
+
+def write_columnar( path, df1, digest ):
+    """
+        Essa função grava o dataset limpo no cache colunar ao lado do csv
+
+        O arquivo é escrito sem compressão ( para poder ser memory-mapped ) em um
+        arquivo temporário e depois renomeado, então leitores nunca veem um
+        arquivo pela metade.
+
+        Input: Caminho do csv, dataframe limpo e hash do csv
+        Output: Caminho do cache ou None se não foi possível gravar
+    """
+    if pa is None:
+        return None
+
+    cache = cache_path( path, digest )
+    tmp = '{}.{}.tmp'.format( cache, os.getpid() )
+    try:
+        table = pa.Table.from_pandas( df1, preserve_index=True )
+        # NaN fica como valor ( não como nulo ), para a coluna ser lida sem cópia
+        for i, field in enumerate( table.schema ):
+            if pa.types.is_floating( field.type ) and table.column( i ).null_count:
+                table = table.set_column( i, field, pa.array( df1[field.name].to_numpy(), type=field.type ) )
+        meta = dict( table.schema.metadata or {} )
+        meta[META_KEY] = json.dumps( { 'format': CACHE_FORMAT, 'digest': digest } ).encode()
+        feather.write_feather( table.replace_schema_metadata( meta ), tmp, compression='uncompressed' )
+        os.replace( tmp, cache )
+        prune_versions( path )
+    except ( OSError, ValueError, pa.ArrowException ) as e:
+        logger.warning( 'Não foi possível gravar o cache colunar %s: %s', cache, e )
+        if os.path.exists( tmp ):
+            os.remove( tmp )
+        return None
+
+    return cache
+
+
+def read_derived( path, digest, name ):
+    """
+        Essa função lê uma estrutura derivada gravada para uma versão do csv ( write_derived )
+
+        Input: Caminho do csv, hash do seu conteúdo e nome da estrutura
+        Output: Estrutura ou None ( arquivo ausente, de outro CACHE_FORMAT ou inválido )
+    """
+    arquivo = cache_path( path, digest, DERIVED_SUFFIX.format( name ) )
+    if not os.path.exists( arquivo ):
+        return None
+
+    try:
+        with open( arquivo, 'rb' ) as f:
+            meta = pickle.load( f )
+            if meta.get( 'format' ) != CACHE_FORMAT or meta.get( 'digest' ) != digest:
+                return None
+            return pickle.load( f )
+    except ( OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError ) as e:
+        logger.warning( 'Estrutura derivada %s ignorada: %s', arquivo, e )
+        return None
+
+
+def write_derived( path, digest, name, obj ):
+    """
+        Essa função grava uma estrutura derivada de uma versão do csv ao lado dele
+
+        Outro processo que abre a mesma versão ( ex.: o dashboard depois do
+        python -m core.ingest ) lê a estrutura em vez de recalculá-la sobre o
+        histórico inteiro. Gravada em um temporário e renomeada, como o cache colunar.
+
+        Input: Caminho do csv, hash do seu conteúdo, nome e estrutura
+        Output: Caminho do arquivo ou None se não foi possível gravar
+    """
+    sufixo = DERIVED_SUFFIX.format( name )
+    arquivo = cache_path( path, digest, sufixo )
+    tmp = '{}.{}.tmp'.format( arquivo, os.getpid() )
+    try:
+        with open( tmp, 'wb' ) as f:
+            pickle.dump( { 'format': CACHE_FORMAT, 'digest': digest }, f, protocol=pickle.HIGHEST_PROTOCOL )
+            pickle.dump( obj, f, protocol=pickle.HIGHEST_PROTOCOL )
+        os.replace( tmp, arquivo )
+        prune_versions( path, sufixo )
+    except ( OSError, pickle.PicklingError, TypeError ) as e:
+        logger.warning( 'Não foi possível gravar a estrutura derivada %s: %s', arquivo, e )
+        if os.path.exists( tmp ):
+            os.remove( tmp )
+        return None
+
+    return arquivo
+
+
+def main():
+    """
+        Etapa de build: gera ( ou valida ) o cache colunar do csv
+
+        Uso:
+            python -m core.storage train.csv
+    """
+    from core.data import DATA_PATH, cache_stats, dataset_version, load_data
+
+    path = sys.argv[1] if len( sys.argv ) > 1 else DATA_PATH
+    if pa is None:
+        sys.exit( 'pyarrow não está instalado, o cache colunar não pode ser gerado' )
+
+    df1 = load_data( path )
+    print( '{}: {} linhas, {}'.format( cache_path( path, dataset_version( path ) ), len( df1 ), cache_stats() ) )
+
+
+if __name__ == '__main__':
+    main()
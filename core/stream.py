@@ -0,0 +1,270 @@
+# Bibliotecas
+import functools
+import sys
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+from core.cube import DIMENSIONS, MEASURES, build_cube, merge_cubes, rollup
+from core.data import DATA_PATH, clean_code, read_raw
+from core.rollups import iso_week_key
+from core.sketches import ExactDistinct, ExactQuantiles, HyperLogLog, KLLSketch
+from core.topk import top_k_by_group
+
+# Memória máxima ( aproximada ) usada por chunk durante a leitura e a limpeza
+DEFAULT_MEMORY_MB = 256
+
+# Durante a limpeza um chunk ocupa algumas vezes o seu tamanho em memória
+CLEAN_OVERHEAD = 4
+
+# Quantidade de entregadores no ranking de cada cidade
+TOP_N = 10
+
+# Agregados parciais: quem precisa só de alguns KPIs pede só os seus ( parts )
+PARTIALS = ( 'cube', 'extremes', 'couriers', 'weekly_couriers', 'centers' )
+
+# Colunas lidas por cada agregado parcial ( Order_Date e City também particionam, core/parallel.py )
+PARTIAL_COLUMNS = {
+    'cube': DIMENSIONS + list( MEASURES.values() ),
+    'extremes': ['Delivery_person_Age', 'Vehicle_condition'],
+    'couriers': ['City', 'Delivery_person_ID', 'Time_taken(min)', 'Delivery_person_Ratings'],
+    'weekly_couriers': ['Order_Date', 'Delivery_person_ID'],
+    'centers': ['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude'],
+}
+
+
+def chunk_rows( path=DATA_PATH, memory_mb=DEFAULT_MEMORY_MB ):
+    """
+        Essa função estima quantas linhas do csv cabem em um chunk dentro do limite de memória
+
+        Input: Caminho do csv e limite de memória em MB
+        Output: Número de linhas por chunk
+    """
+    amostra = read_raw( path, nrows=1000 )
+    por_linha = amostra.memory_usage( deep=True ).sum() / max( len( amostra ), 1 )
+
+    return max( int( memory_mb * 2**20 / ( por_linha * CLEAN_OVERHEAD ) ), 1000 )
+
+
+def partial_columns( parts=PARTIALS ):
+    """
+        Essa função lista as colunas do dataframe limpo lidas pelos agregados parciais
+
+        Input: Agregados parciais ( PARTIALS )
+        Output: Lista de colunas
+    """
+    colunas = ['Order_Date', 'City'] + [col for part in parts for col in PARTIAL_COLUMNS[part]]
+
+    return list( dict.fromkeys( colunas ) )
+
+
+def partial_aggregates( df1, exact=False, parts=PARTIALS ):
+    """
+        Essa função calcula os agregados parciais de um chunk limpo
+
+        Todos os agregados podem ser combinados com merge_partials, então o
+        resultado de vários chunks é o mesmo de processar o dataset inteiro
+        ( exato para contagens, somas e extremos; aproximado para os sketches,
+        a não ser com exact=True, que guarda os valores em vez dos sketches ).
+
+        Input: Dataframe limpo ( um chunk ), modo exato e agregados calculados ( PARTIALS )
+        Output: Dicionário com os agregados parciais
+    """
+    distinct = ExactDistinct if exact else HyperLogLog
+    quantiles = ExactQuantiles if exact else KLLSketch
+    partial = {}
+
+    # Contagens, somas e somas dos quadrados por célula ( core/cube.py )
+    if 'cube' in parts:
+        partial['cube'] = build_cube( df1 )
+
+    # Menor e maior idade e condição de veículo
+    if 'extremes' in parts:
+        partial['extremes'] = { col: ( df1[col].min(), df1[col].max() )
+                                for col in ['Delivery_person_Age', 'Vehicle_condition'] }
+
+    # Somas por cidade e entregador ( avaliação média e ranking de velocidade )
+    if 'couriers' in parts:
+        aux = pd.DataFrame( {
+            'City': df1['City'],
+            'Delivery_person_ID': df1['Delivery_person_ID'],
+            'count': 1,
+            'time_sum': df1['Time_taken(min)'].astype( np.int64 ),
+            'rating_n': df1['Delivery_person_Ratings'].notna().astype( np.int64 ),
+            'rating_sum': df1['Delivery_person_Ratings'].astype( np.float64 ),
+        } )
+        partial['couriers'] = aux.groupby( ['City', 'Delivery_person_ID'], observed=True ).sum().reset_index()
+
+    # Entregadores distintos por semana ISO ( chave calculada só nos dias distintos )
+    if 'weekly_couriers' in parts:
+        dias, dia_inv = np.unique( df1['Order_Date'].to_numpy(), return_inverse=True )
+        semanas = iso_week_key( dias )[dia_inv] if len( df1 ) else np.zeros( 0, np.int64 )
+        partial['weekly_couriers'] = { int( week ): distinct().update( ids )
+                                       for week, ids in df1['Delivery_person_ID'].groupby( semanas, observed=True ) }
+
+    # Mediana da localização de entrega por cidade e tráfego
+    if 'centers' in parts:
+        partial['centers'] = {}
+        for key, grupo in df1.groupby( ['City', 'Road_traffic_density'], observed=True ):
+            partial['centers'][key] = ( quantiles().update( grupo['Delivery_location_latitude'] ),
+                                        quantiles().update( grupo['Delivery_location_longitude'] ) )
+
+    return partial
+
+
+def _merge_dicts( a, b, merge ):
+    result = dict( a )
+    for key, value in b.items():
+        result[key] = merge( result[key], value ) if key in result else value
+
+    return result
+
+
+def _merge_couriers( a, b ):
+    return (pd.concat( [a, b], ignore_index=True )
+              .groupby( ['City', 'Delivery_person_ID'], observed=True )
+              .sum()
+              .reset_index())
+
+
+_MERGES = {
+    'cube': merge_cubes,
+    'extremes': lambda a, b: _merge_dicts( a, b, lambda x, y: ( min( x[0], y[0] ), max( x[1], y[1] ) ) ),
+    'couriers': _merge_couriers,
+    'weekly_couriers': lambda a, b: _merge_dicts( a, b, lambda x, y: x.merge( y ) ),
+    'centers': lambda a, b: _merge_dicts( a, b, lambda x, y: ( x[0].merge( y[0] ), x[1].merge( y[1] ) ) ),
+}
+
+
+def merge_partials( a, b ):
+    """
+        Essa função combina os agregados parciais de dois chunks ( ou partições )
+
+        Input: Dois dicionários de partial_aggregates ( com os mesmos parts )
+        Output: Dicionário combinado
+    """
+    return { name: _MERGES[name]( a[name], b[name] ) for name in a }
+
+
+def kpis( partial ):
+    """
+        Essa função calcula os KPIs das visões Empresa, Entregadores e Restaurantes
+        a partir dos agregados combinados
+
+        Só os KPIs dos agregados presentes são calculados ( ver parts no partial_aggregates ).
+
+        Input: Dicionário de agregados ( partial_aggregates / merge_partials )
+        Output: Dicionário com os KPIs ( números e dataframes )
+    """
+    out = {}
+
+    if 'cube' in partial:
+        cube = partial['cube']
+
+        # Visão Empresa
+        out['orders_by_day'] = rollup( cube, ['Order_Date'] )[['Order_Date', 'count']]
+
+        # Semanas ISO com as mesmas colunas da consulta orders_by_week ( core/query.py )
+        dias = out['orders_by_day']
+        semanas = dias.assign( week=iso_week_key( dias['Order_Date'] ),
+                               week_start=dias['Order_Date'] - pd.to_timedelta( dias['Order_Date'].dt.dayofweek, unit='D' ) )
+        out['orders_by_week'] = semanas.groupby( ['week', 'week_start'] )['count'].sum().reset_index()
+
+        share = rollup( cube, ['Road_traffic_density'] )[['Road_traffic_density', 'count']]
+        out['traffic_order_share'] = share.assign( entregas_perc=share['count'] / share['count'].sum() )
+        out['traffic_order_city'] = rollup( cube, ['City', 'Road_traffic_density'] )[['City', 'Road_traffic_density', 'count']]
+
+        if 'weekly_couriers' in partial:
+            entregadores = pd.Series( { week: hll.estimate() for week, hll in partial['weekly_couriers'].items() },
+                                      name='couriers', dtype=np.float64 )
+            por_semana = out['orders_by_week'].rename( columns={ 'count': 'orders' } ).join( entregadores, on='week' )
+            out['order_share_by_week'] = por_semana.assign( order_by_delivery=por_semana['orders'] / por_semana['couriers'] )
+
+        # Visão Entregadores
+        out['ratings_by_traffic'] = rollup( cube, ['Road_traffic_density'], measure='rating' )
+        out['ratings_by_weather'] = rollup( cube, ['Weatherconditions'], measure='rating' )
+
+        # Visão Restaurantes
+        out['distance_by_city'] = rollup( cube, ['City'], measure='distance' )
+        # média das distâncias conhecidas ( distance_n ), sem arredondar, como a consulta avg_distance
+        out['avg_distance'] = cube['distance_sum'].sum() / cube['distance_n'].sum()
+        out['time_by_festival'] = rollup( cube, ['Festival'] )
+        out['time_by_city'] = rollup( cube, ['City'] )
+        out['time_by_city_traffic'] = rollup( cube, ['City', 'Road_traffic_density'] )
+        out['time_by_city_order'] = rollup( cube, ['City', 'Type_of_order'] )
+
+    if 'centers' in partial:
+        out['country_maps'] = pd.DataFrame(
+            [( city, traffic, lat.quantile( 0.5 ), lon.quantile( 0.5 ) )
+             for ( city, traffic ), ( lat, lon ) in partial['centers'].items()],
+            columns=['City', 'Road_traffic_density', 'Delivery_location_latitude', 'Delivery_location_longitude']
+        ).sort_values( ['City', 'Road_traffic_density'] ).reset_index( drop=True )
+
+    if 'extremes' in partial:
+        out['age_min'], out['age_max'] = partial['extremes']['Delivery_person_Age']
+        out['vehicle_condition_min'], out['vehicle_condition_max'] = partial['extremes']['Vehicle_condition']
+
+    if 'couriers' in partial:
+        couriers = partial['couriers']
+        por_entregador = couriers.groupby( 'Delivery_person_ID', observed=True )[['rating_sum', 'rating_n']].sum().sort_index()
+        out['ratings_per_delivery'] = ( por_entregador['rating_sum'] / por_entregador['rating_n'] ).rename(
+            'Delivery_person_Ratings' ).reset_index()
+
+        velocidade = couriers.assign( **{ 'Time_taken(min)': couriers['time_sum'] / couriers['count'] } )
+        velocidade = velocidade[['City', 'Delivery_person_ID', 'Time_taken(min)']]
+        for name, largest in [( 'top_fastest', False ), ( 'top_slowest', True )]:
+            out[name] = top_k_by_group( velocidade, 'City', 'Time_taken(min)', TOP_N,
+                                        largest=largest, tiebreak='Delivery_person_ID' )
+
+    if 'weekly_couriers' in partial:
+        todos = functools.reduce( lambda a, b: a.merge( b ), partial['weekly_couriers'].values() )
+        out['unique_couriers'] = todos.estimate()
+
+    return out
+
+
+def stream_kpis( path=DATA_PATH, date_slider=None, traffic_options=None, memory_mb=DEFAULT_MEMORY_MB ):
+    """
+        Essa função calcula os KPIs lendo o csv em chunks, sem carregar o dataset inteiro
+
+        Sequência de passos:
+        1. Lê o csv em chunks com o tamanho definido pelo limite de memória
+        2. Limpa cada chunk com o mesmo clean_code do dashboard
+        3. Aplica os filtros da barra lateral no chunk
+        4. Calcula e combina os agregados parciais
+
+        Input: Caminho do csv, filtros ( None não filtra ) e limite de memória em MB
+        Output: Dicionário com os KPIs ( ver kpis ) ou None se nenhum pedido passou nos filtros
+    """
+    total = None
+    for chunk in read_raw( path, chunksize=chunk_rows( path, memory_mb ) ):
+        df1 = clean_code( chunk )
+        if date_slider is not None:
+            df1 = df1.loc[df1['Order_Date'] < date_slider, :]
+        if traffic_options is not None:
+            df1 = df1.loc[df1['Road_traffic_density'].isin( traffic_options ), :]
+        if df1.empty:
+            continue
+
+        parcial = partial_aggregates( df1 )
+        total = parcial if total is None else merge_partials( total, parcial )
+
+    return None if total is None else kpis( total )
+
+
+def main():
+    """
+        Uso:
+            python -m core.stream train.csv [memória em MB]
+    """
+    path = sys.argv[1] if len( sys.argv ) > 1 else DATA_PATH
+    memory_mb = int( sys.argv[2] ) if len( sys.argv ) > 2 else DEFAULT_MEMORY_MB
+
+    for name, value in stream_kpis( path, memory_mb=memory_mb ).items():
+        print( '# {}'.format( name ) )
+        print( value )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+
+# Quantidade padrão de entregadores por cidade
+TOP_K = 10
+
+
+def grouped_top_k( groups, values, k, largest=False, tiebreak=None ):
+    """
+        Essa função seleciona os k menores ( ou maiores ) valores de cada grupo
+
+        Sequência de passos:
+        1. Agrupa as posições por grupo ( ordenação estável de códigos inteiros )
+        2. Seleção parcial: em k rodadas, o menor valor restante de cada grupo é
+           encontrado com np.minimum.reduceat e retirado; o valor da última rodada
+           é o limite do grupo
+        3. Ordena só os candidatos ( valores até o limite ) por grupo, valor e desempate
+
+        O custo é k passadas lineares sobre os dados mais a ordenação dos poucos
+        candidatos, sem laço em Python por grupo e sem ordenar o resultado inteiro.
+
+        Input: Códigos inteiros dos grupos, valores, k, largest ( maiores valores ) e
+               chave de desempate opcional ( mesmo tamanho de values )
+        Output: Array de posições, em ordem de grupo e depois de ranking
+    """
+    groups = np.asarray( groups )
+    values = np.asarray( values, dtype=np.float64 )
+    chave = -values if largest else values
+    tiebreak = np.arange( len( values ) ) if tiebreak is None else np.asarray( tiebreak )
+
+    # Valores ausentes ficam fora do ranking
+    validos = np.flatnonzero( ~np.isnan( chave ) )
+    if len( validos ) == 0 or k <= 0:
+        return np.empty( 0, np.int64 )
+    # Códigos de até 16 bits são ordenados com radix sort
+    codigos = groups[validos]
+    if codigos.min() >= 0 and codigos.max() < 2 ** 16:
+        codigos = codigos.astype( np.uint16 )
+    ordem = validos[np.argsort( codigos, kind='stable' )]
+    grupo = groups[ordem]
+    inicios = np.flatnonzero( np.r_[True, grupo[1:] != grupo[:-1]] )
+    linha_grupo = np.repeat( np.arange( len( inicios ) ), np.diff( np.r_[inicios, len( ordem )] ) )
+
+    # Limite de cada grupo: o k-ésimo menor valor distinto ( infinito se o grupo tiver menos )
+    valores = chave[ordem]
+    restante = valores.copy()
+    for _ in range( k ):
+        limite = np.minimum.reduceat( restante, inicios )
+        restante[restante == limite[linha_grupo]] = np.inf
+    candidatos = ordem[valores <= limite[linha_grupo]]
+
+    # Ranking dos candidatos dentro de cada grupo
+    candidatos = candidatos[np.lexsort( ( tiebreak[candidatos], chave[candidatos], groups[candidatos] ) )]
+    grupo = groups[candidatos]
+    inicio = np.flatnonzero( np.r_[True, grupo[1:] != grupo[:-1]] )
+    rank = np.arange( len( candidatos ) ) - np.repeat( inicio, np.diff( np.r_[inicio, len( candidatos )] ) )
+
+    return candidatos[rank < k]
+
+
+def top_k_by_group( df1, group, value, k=TOP_K, largest=False, tiebreak=None ):
+    """
+        Essa função retorna as k linhas com menor ( ou maior ) value em cada grupo
+
+        Input: Dataframe, coluna do grupo, coluna do ranking, k, largest e coluna de desempate
+        Output: Dataframe com as linhas selecionadas, grupos em ordem crescente
+    """
+    codigos = pd.Categorical( df1[group] )
+    # Desempate pela ordem dos valores ( não pela ordem das categorias )
+    desempate = None if tiebreak is None else pd.factorize( df1[tiebreak].to_numpy(), sort=True )[0]
+    # Grupos em ordem alfabética
+    codigos = codigos.reorder_categories( sorted( codigos.categories ) ).codes
+
+    pos = grouped_top_k( codigos, df1[value], k, largest=largest, tiebreak=desempate )
+
+    return df1.iloc[pos].reset_index( drop=True )
+
+
+def top_couriers( df1, k=TOP_K, metric='Time_taken(min)' ):
+    """
+        Essa função retorna os entregadores mais rápidos e mais lentos de cada cidade
+
+        Sequência de passos:
+        1. Média da métrica por ( City, Delivery_person_ID ), calculada uma única vez
+        2. Seleção dos k menores e dos k maiores valores de cada cidade ( grouped_top_k )
+
+        Input: Dataframe, k e coluna da métrica
+        Output: Dicionário com os dataframes 'fastest' e 'slowest'
+    """
+    df2 = (df1.loc[:, ['City', 'Delivery_person_ID', metric]]
+              .groupby( ['City', 'Delivery_person_ID'], observed=True )
+              .mean()
+              .reset_index())
+
+    return { 'fastest': top_k_by_group( df2, 'City', metric, k, tiebreak='Delivery_person_ID' ),
+             'slowest': top_k_by_group( df2, 'City', metric, k, largest=True, tiebreak='Delivery_person_ID' ) }
@@ -1,240 +1,219 @@
 
 # Bibliotecas
 import folium
-import re
 import plotly.express as px
-import plotly.graph_objects as go
-from haversine import haversine
 
 # Bibliotecas necessárias
 import pandas as pd
 import streamlit as st
 from PIL import Image
 
-from streamlit_folium import folium_static
+import streamlit.components.v1 as components
+from folium.plugins import HeatMap
+
+from core.cache import filter_state, memoize
+from core.charts import downsample, figure_html, max_points, show_figure, viewport_width
+from core.data import pin_session
+from core.filters import filter_orders, load_filter_index
+from core.geo import DELIVERY_COLUMNS, RESTAURANT_COLUMNS, bin_points
+from core.profiling import PROFILE_ENABLED, debug_panel, finish_rerun, span, start_rerun
+from core.query import run_query
+from core.render import add_panel, render_panels
+from core.spatial import load_spatial_index, nearest_restaurants, orders_within, zone_stats
 
 st.set_page_config( page_title='Visão Empresa', page_icon='Gráfico', layout='wide')
 
+# Instrumentação opcional ( core/profiling.py ): CURRY_PROFILE=1 no servidor ou ?debug=1 na URL
+trace = start_rerun( 'visao_empresa', enabled=PROFILE_ENABLED or st.experimental_get_query_params().get( 'debug' ) == ['1'] )
+
+# Versão do dataset fixa durante o rerun ( core/data.py ): um csv novo aparece na próxima interação
+pin_session( st.session_state )
+
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # Funções
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-def country_maps( df1 ):
+def city_centers( state ):
+    """
+        Essa função retorna a localização central ( mediana ) das entregas de cada cidade por tráfego
+
+        Input: Estado dos filtros ( filter_state )
+        Output: Dataframe com City, Road_traffic_density e as coordenadas
+    """
+    data_plot = run_query( 'city_centers', state )
+
+    return data_plot
+
+def country_maps( df1, state ):
     """  
         Essa função faz uma maração de pontos em um mapa localizando cada cidade por tráfego
 
         Sequência de passos:
         1. Criação da várivael dataplot para criar o filtro de cada cidade por tráfego
-        2. Criação da váriavel map_ para criar o mapa
-        3. Criação do for para fazer a interação do dataplot no map_ para fazer a marção de pontos
+        2. Agregação das entregas e dos restaurantes em células de um grid ( core/geo.py )
+        3. Criação da váriavel map_ com as camadas de calor das células
+        4. Marcação de um ponto por cidade e tráfego
+
+        As camadas de calor recebem uma linha por célula, não por pedido, então o
+        tamanho do mapa enviado ao navegador não cresce com o número de entregas.
 
-        Input: Dataframe
+        Input: Dataframe e estado dos filtros ( filter_state )
         Output: Map   
     """
     # Localização central de cada cidade por tipo de tráfego
-    data_plot = (df1.loc[:, ['City', 
-                          'Road_traffic_density',
-                          'Delivery_location_latitude',
-                          'Delivery_location_longitude']]
-                  .groupby( ['City', 'Road_traffic_density'])
-                  .median()
-                  .reset_index())
+    data_plot = city_centers( state )
+
+    # Densidade de entregas e de restaurantes por célula
+    entregas = bin_points( df1['Delivery_location_latitude'], df1['Delivery_location_longitude'] )
+    restaurantes = bin_points( df1['Restaurant_latitude'], df1['Restaurant_longitude'] )
 
     # Desenhar o mapa
     map_ = folium.Map()
-    for index, location_info in data_plot.iterrows():
-        folium.Marker( 
-                [location_info['Delivery_location_latitude'],
-                location_info['Delivery_location_longitude']],
-                popup=location_info[
-                ['City', 'Road_traffic_density']] ).add_to( map_ )
+    for name, celulas in [( 'Entregas', entregas ), ( 'Restaurantes', restaurantes )]:
+        HeatMap( celulas[['lat', 'lon', 'count']].to_numpy().tolist(),
+                 name=name, radius=12 ).add_to( map_ )
+
+    for city, traffic, lat, lon in zip( data_plot['City'], data_plot['Road_traffic_density'],
+                                        data_plot['Delivery_location_latitude'],
+                                        data_plot['Delivery_location_longitude'] ):
+        folium.Marker( [lat, lon], popup='{} {}'.format( city, traffic ) ).add_to( map_ )
+
+    folium.LayerControl().add_to( map_ )
+    if len( entregas ):
+        map_.fit_bounds( [[entregas['lat'].min(), entregas['lon'].min()],
+                          [entregas['lat'].max(), entregas['lon'].max()]] )
 
-    folium_static( map_, width=1024, height=600 )
+    return map_
 
-    return None
+def country_maps_html( df1, state ):
+    """
+        Essa função renderiza o mapa em HTML ( o mesmo que o folium_static faz a cada rerun )
+
+        Input: Dataframe e estado dos filtros ( filter_state )
+        Output: String HTML
+    """
+    return folium.Figure().add_child( country_maps( df1, state ) ).render()
 
-def order_share_by_week( df1 ):
+def order_share_by_week( state, width ):
     """ 
         Essa função retorna um gráfico de linha filtrado por qtd de pedidos por entregador por semana
         
         Sequência de passos:
-        1. Criação da variável df_aux1 para filtrar as entregas por semana
-        2. Criação da variável df_aux2 para filtrar os entregadores únicos por semana
-        3. Criação da variável df_aux para por efetuar o cálculo entre as váriaveis df_aux1 e df_aux2
-        4. Criação da variável fig que retorna um grpafico de linha
+        1. Criação da variável df_aux com os pedidos, os entregadores únicos e a razão
+           entre eles por semana ( uma única consulta, sem merge de dataframes intermediários )
+        2. Redução da série para a largura do gráfico ( LTTB, core/charts.py )
+        3. Criação da variável fig que retorna um grpafico de linha
         
-        Input: Dataframe
-        Output: Graphic Line
+        Input: Estado dos filtros ( filter_state ) e largura do gráfico ( px )
+        Output: Graphic Line ( HTML, figure_html )
     """
     # Quantidade de pedidos por entregador por Semana
-    df_aux1 = (df1.loc[:, ['ID', 'week_of_year']]
-                  .groupby( 'week_of_year' )
-                  .count()
-                  .reset_index())
-    df_aux2 = (df1.loc[:, ['Delivery_person_ID', 'week_of_year']]
-                  .groupby( 'week_of_year')
-                  .nunique()
-                  .reset_index())
-    df_aux = pd.merge( df_aux1, df_aux2, how='inner' )
-
-    df_aux['order_by_delivery'] = df_aux['ID'] / df_aux['Delivery_person_ID']
+    df_aux = run_query( 'order_share_by_week', state )
+    df_aux = downsample( df_aux, 'week_start', 'order_by_delivery', max_points( width ) )
 
     # gráfico de linha
-    fig = px.line( df_aux, x='week_of_year', y='order_by_delivery' )
+    fig = px.line( df_aux, x='week_start', y='order_by_delivery' )
 
-    return fig      
+    return figure_html( fig )
 
-def order_by_week( df1 ):
+def order_by_week( state, width ):
     """ 
         Essa função cálcula a qtd de pedidos por semana e retorna um gráfico em linha
         
         Sequência de passos:
-        1. Criação da variável df_aux para filtrar as entrefas por semana
-        2. Ciação da variável fig que retorna uma gráfico de linha
+        1. Criação da variável df_aux com os pedidos por semana ISO ( week_start é a segunda-feira )
+        2. Redução da série para a largura do gráfico ( LTTB, core/charts.py )
+        3. Ciação da variável fig que retorna uma gráfico de linha
         
-        Input: Dataframe
-        Output: Graphic Line
+        Input: Estado dos filtros ( filter_state ) e largura do gráfico ( px )
+        Output: Graphic Line ( HTML, figure_html )
     """
     # Quantidade de pedidos por semana
-    df_aux = (df1.loc[:, ['ID', 'week_of_year']]
-                 .groupby('week_of_year')
-                 .count()
-                 .reset_index())
+    df_aux = run_query( 'orders_by_week', state )
+    df_aux = downsample( df_aux, 'week_start', 'count', max_points( width ) )
+
     # Gráfico
-    fig = px.line( df_aux, x='week_of_year', y='ID' )
+    fig = px.line( df_aux, x='week_start', y='count' )
 
-    return fig
+    return figure_html( fig )
         
-def traffic_order_city( df1 ):
+def traffic_order_city( state ):
     """ 
         Essa função retorna um gráfico de bolhas onde o filtro é pelo volume de pedidos, cidade e tráfego
         
         Sequência de passos:
-        1. Crição da variável cols para filtrar as colunas do dataframe
-        2. Criação da variável df_aux para filtrar as colunas City e Road_traffic_density
-        3. Criação da variável fig que retorna um gráfico de bolhas
+        1. Criação da variável df_aux com os pedidos por City e Road_traffic_density
+        2. Criação da variável fig que retorna um gráfico de bolhas
         
-        Input: Dataframe
-        Output: Graphic Scatter
+        Input: Estado dos filtros ( filter_state )
+        Output: Graphic Scatter ( HTML, figure_html )
     """
     # Comparação do volume de pedidos por cidade e tipo de tráfego
-    cols = ['ID', 'City', 'Road_traffic_density']
-    df_aux = (df1.loc[:, cols]
-                 .groupby(['City', 'Road_traffic_density'])
-                 .count()
-                 .reset_index())
+    df_aux = run_query( 'traffic_order_city', state )
 
     # Gráfico de Pizza
-    fig = px.scatter( df_aux, x='City', y='Road_traffic_density', size='ID', color='City' )
+    fig = px.scatter( df_aux, x='City', y='Road_traffic_density', size='count', color='City' )
 
-    return fig
+    return figure_html( fig )
 
-def traffic_order_share( df1 ):
+def traffic_order_share( state ):
     """ 
         Essa função retorna um gráfico de pizza filtrando a porcentagem dos pedidos pelo tráfego
         
         Sequência de passos:
-        1. Criação da variável df_aux para filtrar Road_traffic_density
-        2. Criação da coluna entregas_perc no dataframe para armarzenar a porcentagem de df_aux
-        3. Criação da variável fig que retorna um gráfico de pizza
+        1. Criação da variável df_aux com os pedidos e a porcentagem ( entregas_perc ) por Road_traffic_density
+        2. Criação da variável fig que retorna um gráfico de pizza
         
-        Input: Dataframe
-        Output: Graphic Pie
+        Input: Estado dos filtros ( filter_state )
+        Output: Graphic Pie ( HTML, figure_html )
     """
     # Distribuição dos pedidos por tipo de tráfego
-    df_aux = (df1.loc[:, ['ID', 'Road_traffic_density']]
-                 .groupby( 'Road_traffic_density' )
-                 .count()
-                 .reset_index())
-    df_aux['entregas_perc'] = df_aux['ID'] / df_aux['ID'].sum()
+    df_aux = run_query( 'traffic_order_share', state )
 
     # Gráfico de Pizza
     fig = px.pie( df_aux, values='entregas_perc', names='Road_traffic_density' )
 
-    return fig
+    return figure_html( fig )
 
-def order_metric( df1 ):
+def order_metric( state, width ):
     """ 
     Essa função retorna um gráfico de barras filtrando a qtd de pedidos por dia
     
     Sequência de passos:
-    1. Criação da variável cols para filtrar as colunas
-    2. Criação da variãvel df_aux para filtrar Order_Date
+    1. Criação da variãvel df_aux com os pedidos por Order_Date
+    2. Redução para a largura do gráfico: mínimo e máximo de cada intervalo de dias
+       ( core/charts.py ), então os picos continuam visíveis em vários anos de dados
     3. Criação da variável  fig que retorna um gráfico de pizza
     
-    Input: Dataframe
-    Output: Graphic Pie
+    Input: Estado dos filtros ( filter_state ) e largura do gráfico ( px )
+    Output: Graphic Bar ( HTML, figure_html )
     """
     # Quantidade de pedidos por dia
-    cols = ['ID', 'Order_Date']
-    df_aux = (df1.loc[:, cols]
-                .groupby(['Order_Date'])
-                .count()
-                .reset_index())
+    df_aux = run_query( 'orders_by_day', state )
+    df_aux = downsample( df_aux, 'Order_Date', 'count', max_points( width ), method='minmax' )
     # Gráfico de linha
-    fig = px.bar( df_aux, x='Order_Date', y='ID')
+    fig = px.bar( df_aux, x='Order_Date', y='count')
 
-    return fig
+    return figure_html( fig )
 
-def clean_code( df1 ):
-    """
-        Esta função tem a responsabilidade de limpar o dataframe
-        
-        Tipos de limpeza
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Reoção dos espaços das variáveis de texo
-        4. Formatação da coluna de datas
-        5. Lipeza da coluna de tempo ( remoção do texto da variável numérica )
-        
-        Input: Dataframe
-        Output: Dataframe     
+def show_chart( placeholder, html ):
     """
-    
-    # 1. Convertendo a coluna Age de texto para número
-    linhas_selecionadas = df1['Delivery_person_Age'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype( int )
-
-    # 2. Convertendo a coluna Ratings de texto para número decimal (float) 
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype( float )
-
-    # 3. Convertendo a coluna order_date de texto para data
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format='%d-%m-%Y')
-
-    # 4. Convertendo multiple_deliveries de texto para numero inteiro 9( int )
-    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype( int )
+        Essa função desenha um gráfico no placeholder de um painel
 
-    # Removendo linhas NaN
-    linhas_selecionadas = df1['Road_traffic_density'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-
-    linhas_selecionadas = df1['City'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-
-    # inserindo a coluna semana no data frame
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime( '%U')
+        Input: Placeholder ( st.empty() ) e HTML da figura ( figure_html )
+        Output: None
+    """
+    show_figure( placeholder, html )
 
-    # 5. Removendo os espaços deentro de strings/texto/object
-    # df1 = df1.reset_index( drop=True )
-    # for i in range( len( df1 )):
-    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
+def show_map( placeholder, html ):
+    """
+        Essa função desenha o HTML do mapa no placeholder de um painel
 
-    df1.loc[:, 'ID'] = df1.loc[:, 'ID'].str.strip()
-    df1.loc[:, 'Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1.loc[:, 'Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1.loc[:, 'Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1.loc[:, 'City'] = df1.loc[:, 'City'].str.strip()
-    df1.loc[:, 'Festival'] = df1.loc[:, 'Festival'].str.strip()
-    
-    # Limpando a coluna de time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min)' )[1] )
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype( int )
-    
-    return df1
+        Input: Placeholder ( st.empty() ) e HTML do mapa ( country_maps_html )
+        Output: None
+    """
+    with placeholder.container():
+        components.html( html, width=1024, height=610 )
 
 # _-_-_-_-_-_- Inicío da Estrutura lógica do código _-_-_-_-_-_-
 
@@ -242,13 +221,9 @@ def clean_code( df1 ):
 # Import dataset
 # =-=-=-=-=-=-=-=-=-==-=-=-=-=
 
-df = pd.read_csv( 'train.csv' )
-
-# =-=-=-=-=-=-=-=-=-==-=-=-=-=
-# Limpando os dados
-# =-=-=-=-=-=-=-=-=-==-=-=-=-=
-
-df1 = clean_code( df )
+# As consultas rodam no backend de core/query.py ( com CURRY_API_URL, no servidor
+# de core/api.py ). Só a aba geográfica usa as linhas, então o dataset limpo
+# ( core/data.py ) e os bitmaps dos filtros ( core/filters.py ) são lidos nela
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 #     Barra Lateral
@@ -284,51 +259,108 @@ traffic_options = st.sidebar.multiselect(
 st.sidebar.markdown( """___""" )
 st.sidebar.markdown( '### Powered by Comunidade DS' )
 
-# Filtro Data
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
+# Chave dos resultados em cache ( core/cache.py ) e filtros das consultas ( core/query.py )
+state = filter_state( date_slider, traffic_options )
 
-# Filtro de traânsito
-linhas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[linhas_selecionadas, :]
+# Largura dos gráficos ( ?width= na URL ): define quantos pontos as séries temporais enviam
+largura = viewport_width( st.experimental_get_query_params() )
 
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 #     Layout no Streamlit
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-tab1, tab2, tab3= st.tabs( ['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'])
+# Só a aba escolhida é calculada ( o st.tabs calcula o conteúdo de todas as abas em cada rerun )
+aba = st.radio( 'Aba', ['Visão Gerencial', 'Visão Tática', 'Visão Geográfica'], horizontal=True,
+                label_visibility='collapsed' )
+
+# Painéis da aba: calculados em paralelo e desenhados assim que ficam prontos ( core/render.py )
+paineis = []
 
-with tab1:
+if aba == 'Visão Gerencial':
     with st.container():
         # Oder Metric
-        fig = order_metric( df1 )
         st.markdown( '# Orders by Day' )
-        st.plotly_chart(fig, use_container_with=True)
+        add_panel( paineis, 'order_metric', st.empty(), memoize, show_chart, order_metric, state, largura, key=state )
             
     col1, col2 = st.columns( 2 )
     with st.container():
         with col1:
-            fig = traffic_order_share( df1 )
             st.header( 'Traffic Order Share' )
-            st.plotly_chart( fig, use_container_with=True )
+            add_panel( paineis, 'traffic_order_share', st.empty(), memoize, show_chart,
+                       traffic_order_share, state, key=state )
   
         with col2:
-            fig = traffic_order_city( df1 )
             st.header( 'Traffic Order CIty' )
-            st.plotly_chart( fig, container_with=True )
+            add_panel( paineis, 'traffic_order_city', st.empty(), memoize, show_chart,
+                       traffic_order_city, state, key=state )
 
-with tab2:
+elif aba == 'Visão Tática':
     with st.container():
-        fig = order_by_week( df1 )
         st.markdown( "# Order by Week" )
-        st.plotly_chart( fig, use_container_width=True )
+        add_panel( paineis, 'order_by_week', st.empty(), memoize, show_chart, order_by_week, state, largura, key=state )
 
     with st.container(): 
-        fig = order_share_by_week( df1 )
         st.markdown( "# Order Share by Week" )
-        st.plotly_chart( fig, use_container_width=True )
+        add_panel( paineis, 'order_share_by_week', st.empty(), memoize, show_chart,
+                   order_share_by_week, state, largura, key=state )
     
-with tab3:
+else:
         st.markdown( '# Country Maps' )
-        country_maps( df1 )
+        # Filtros de data ( busca binária ) e de trânsito ( bitmaps ), usados pelo mapa de calor:
+        # só as coordenadas são copiadas
+        with span( 'load_filter_index' ):
+            filter_index = load_filter_index()
+        df1 = filter_orders( filter_index, date_slider, columns=DELIVERY_COLUMNS + RESTAURANT_COLUMNS,
+                             Road_traffic_density=traffic_options )
+
+        # HTML do mapa renderizado uma única vez por estado dos filtros
+        add_panel( paineis, 'country_maps_html', st.empty(), memoize, show_map, country_maps_html, df1, state, key=state )
+
+        st.markdown( '# Zone Drill-down' )
+        # Preenchido depois dos painéis: os widgets rodam na thread do script
+        zona_container = st.container()
+
+render_panels( paineis )
+
+if aba == 'Visão Geográfica':
+    with zona_container:
+        # Zonas centradas nos mesmos pontos marcados no mapa
+        centros = memoize( city_centers, state, key=state )
+        col1, col2 = st.columns( 2 )
+        with col1:
+            zona = st.selectbox( 'Centro da zona', centros.index,
+                                 format_func=lambda i: '{} - {}'.format( centros.loc[i, 'City'],
+                                                                         centros.loc[i, 'Road_traffic_density'] ) )
+        with col2:
+            raio = st.slider( 'Raio ( km )', min_value=1, max_value=50, value=10 )
+
+        if zona is not None:
+            lat = centros.loc[zona, 'Delivery_location_latitude']
+            lon = centros.loc[zona, 'Delivery_location_longitude']
+
+            # Busca no índice espacial e os filtros da barra lateral só nos pedidos da zona
+            spatial = load_spatial_index()
+            df_zona = orders_within( spatial, lat, lon, raio )
+            df_zona = df_zona[( df_zona['Order_Date'] < date_slider )
+                              & df_zona['Road_traffic_density'].isin( traffic_options )]
+            stats = zone_stats( df_zona )
+
+            col1, col2, col3, col4 = st.columns( 4 )
+            col1.metric( 'Pedidos', stats['orders'] )
+            col2.metric( 'Tempo médio', '{:.2f}'.format( stats['avg_time'] ) )
+            col3.metric( 'Tempo p90', '{:.2f}'.format( stats['p90_time'] ) )
+            col4.metric( 'Distância média', '{:.2f}'.format( stats['avg_distance'] ) )
+
+            st.markdown( '##### Restaurantes mais próximos' )
+            with span( 'render', chart='nearest_restaurants' ):
+                st.dataframe( nearest_restaurants( spatial, lat, lon, k=5 ) )
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#     Debug ( só com a instrumentação ligada )
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+trace = finish_rerun( trace, state=state )
+if trace is not None:
+    debug_panel( st.sidebar.expander( 'Debug: perfil do rerun' ), trace )
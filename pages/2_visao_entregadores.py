@@ -1,97 +1,63 @@
 
-# Bibliotecas
-import folium
-import re
-import plotly.express as px
-import plotly.graph_objects as go
-from haversine import haversine
-
 # Bibliotecas necessárias
+import numpy as np
 import pandas as pd
 import streamlit as st
 from PIL import Image
 
-from streamlit_folium import folium_static
+from core.cache import filter_state, memoize
+from core.charts import show_table
+from core.data import pin_session
+from core.filters import filter_orders, load_filter_index
+from core.profiles import METRICS, PAGE_SIZE, PROFILE_COLUMNS, build_profiles, courier_profile, leaderboard, load_profiles
+from core.profiling import PROFILE_ENABLED, debug_panel, finish_rerun, span, start_rerun
+from core.query import RANK_METRICS, run_query
+from core.render import add_panel, render_panels
+from core.topk import TOP_K
 
 st.set_page_config( page_title='VIsão Entregadores', page_icon='Entregadores', layout='wide')
 
+# Instrumentação opcional ( core/profiling.py ): CURRY_PROFILE=1 no servidor ou ?debug=1 na URL
+trace = start_rerun( 'visao_entregadores', enabled=PROFILE_ENABLED or st.experimental_get_query_params().get( 'debug' ) == ['1'] )
+
+# Versão do dataset fixa durante o rerun ( core/data.py ): um csv novo aparece na próxima interação
+pin_session( st.session_state )
+
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # Funções
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
-def top_delivers( df1, top_asc ):
-    df2 = (df1.loc[:, ['Delivery_person_ID', 'City', 'Time_taken(min)']]
-              .groupby(['City', 'Delivery_person_ID'])
-              .mean()
-              .sort_values( ['City', 'Time_taken(min)'], ascending=top_asc).reset_index())
+def show_extremes( placeholder, extremos ):
+    """
+        Essa função mostra as idades e condições de veículo extremas no placeholder de um painel
 
-    df_aux01 = df2.loc[df2['City'] == 'Metropolitian', :].head(10)
-    df_aux02 = df2.loc[df2['City'] == 'Urban', :].head(10)
-    df_aux03 = df2.loc[df2['City'] == 'Semi-Urban', :].head(10)
+        Input: Placeholder ( st.empty() ) e resultado da consulta extremes
+        Output: None
+    """
+    extremos = extremos.iloc[0]
+    col1, col2, col3, col4 = placeholder.container().columns( 4, gap='large' )
+    col1.metric( 'Maior idade', extremos['age_max'] )
+    col2.metric( 'Menor idade', extremos['age_min'] )
+    col3.metric( 'Melhor condição de veículo', extremos['vehicle_condition_max'] )
+    col4.metric( 'Pior condição de veículo', extremos['vehicle_condition_min'] )
+
+def show_ratings( placeholder, df_aux ):
+    """
+        Essa função mostra a avaliação média e o desvio padrão por grupo no placeholder de um painel
 
-    df3 = pd.concat( [df_aux01, df_aux02, df_aux03] ).reset_index(  drop=True )
+        Input: Placeholder ( st.empty() ) e resultado de ratings_by_traffic / ratings_by_weather
+        Output: None
+    """
+    # mudança do nome das colunas
+    df_aux = df_aux.rename( columns={ 'mean': 'delivery_mean', 'std': 'delivery_std' } ).drop( columns='count' )
+    placeholder.dataframe( df_aux )
 
-    return df3
+def show_fastest( placeholder, df_aux ):
+    # Até k entregadores por cidade: a tabela vai ao navegador página a página
+    show_table( placeholder, df_aux, key='top_fastest' )
 
-def clean_code( df1 ):
-    """
-        Esta função tem a responsabilidade de limpar o dataframe
-        
-        Tipos de limpeza
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Reoção dos espaços das variáveis de texo
-        4. Formatação da coluna de datas
-        5. Lipeza da coluna de tempo ( remoção do texto da variável numérica )
-        
-        Input: Dataframe
-        Output: Dataframe     
-    """
-    
-    # 1. Convertendo a coluna Age de texto para número
-    linhas_selecionadas = df1['Delivery_person_Age'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype( int )
-
-    # 2. Convertendo a coluna Ratings de texto para número decimal (float) 
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype( float )
-
-    # 3. Convertendo a coluna order_date de texto para data
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format='%d-%m-%Y')
-
-    # 4. Convertendo multiple_deliveries de texto para numero inteiro 9( int )
-    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype( int )
-
-    # Removendo linhas NaN
-    linhas_selecionadas = df1['Road_traffic_density'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-
-    linhas_selecionadas = df1['City'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-
-    # inserindo a coluna semana no data frame
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime( '%U')
-
-    # 5. Removendo os espaços deentro de strings/texto/object
-    # df1 = df1.reset_index( drop=True )
-    # for i in range( len( df1 )):
-    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
-
-    df1.loc[:, 'ID'] = df1.loc[:, 'ID'].str.strip()
-    df1.loc[:, 'Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1.loc[:, 'Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1.loc[:, 'Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1.loc[:, 'City'] = df1.loc[:, 'City'].str.strip()
-    df1.loc[:, 'Festival'] = df1.loc[:, 'Festival'].str.strip()
-    
-    # Limpando a coluna de time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min)' )[1] )
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype( int )
-    
-    return df1
+def show_slowest( placeholder, df_aux ):
+    show_table( placeholder, df_aux, key='top_slowest' )
 
 # _-_-_-_-_-_- Inicío da Estrutura lógica do código _-_-_-_-_-_-
 
@@ -99,13 +65,9 @@ def clean_code( df1 ):
 # Import dataset
 # =-=-=-=-=-=-=-=-=-==-=-=-=-=
 
-df = pd.read_csv( 'train.csv' )
-
-# =-=-=-=-=-=-=-=-=-==-=-=-=-=
-# Limpando os dados
-# =-=-=-=-=-=-=-=-=-==-=-=-=-=
-
-df1 = clean_code( df )
+# As consultas rodam no backend de core/query.py ( com CURRY_API_URL, no servidor
+# de core/api.py ). Só os perfis dos entregadores usam as linhas, então o dataset
+# limpo ( core/data.py ) e os bitmaps dos filtros ( core/filters.py ) são lidos neles
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 #     Barra Lateral
@@ -142,14 +104,8 @@ traffic_options = st.sidebar.multiselect(
 st.sidebar.markdown( """___""" )
 st.sidebar.markdown( '### Powered by Comunidade DS' )
 
-# Filtro Data
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
-
-# Filtro de traânsito
-linhas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[linhas_selecionadas, :]
-
+# Chave dos resultados em cache ( core/cache.py ) e filtros das consultas ( core/query.py )
+state = filter_state( date_slider, traffic_options )
 
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
@@ -158,26 +114,15 @@ df1 = df1.loc[linhas_selecionadas, :]
 
 tab1, tab2, tab3 = st.tabs( ['Visão Gerencial', '', ''] )
 
+# Painéis calculados em paralelo e desenhados assim que ficam prontos ( core/render.py )
+paineis = []
+
 with tab1:
     with st.container():
         st.title('Overall Matrics')
         
-        col1, col2, col3, col4 = st.columns( 4, gap='large' )
-        with col1:
-            maior_idade = df1.loc[:, 'Delivery_person_Age'].max()
-            col1.metric( 'Maior idade', maior_idade )
-            
-        with col2:
-            menor_idade = df1.loc[:, 'Delivery_person_Age'].min()
-            col2.metric( 'Menor idade', menor_idade )
-        
-        with col3:
-            melhor_condicao = df1.loc[:, 'Vehicle_condition'].max()
-            col3.metric( 'Melhor condição de veículo', melhor_condicao )
-            
-        with col4:
-            pior_condicao = df1.loc[:, 'Vehicle_condition'].min()
-            col4.metric( 'Pior condição de veículo', pior_condicao )
+        # Idades e condições de veículo extremas em uma única consulta
+        add_panel( paineis, 'extremes', st.empty(), memoize, show_extremes, run_query, 'extremes', state, key=state )
             
     with st.container():
         st.markdown( """---""" )
@@ -186,50 +131,77 @@ with tab1:
         col1, col2 = st.columns( 2 )
         with col1:
             st.markdown( '##### Avaliação médias por Enregador' )
-            df_avg_ratings__per_delivery = (df1.loc[:, ['Delivery_person_ID', 'Delivery_person_Ratings']]
-                                                     .groupby(['Delivery_person_ID'])
-                                                     .mean()
-                                                     .reset_index())
-            st.dataframe( df_avg_ratings__per_delivery )
+            # Preenchido depois dos painéis: os widgets rodam na thread do script
+            leaderboard_container = st.container()
             
         with col2:
             st.markdown( '##### Avaliação média por trâsito' )
-            avaliacao_por_trafego = (df1.loc[:, ['Delivery_person_Ratings', 'Road_traffic_density']]
-                                        .groupby('Road_traffic_density')
-                                        .agg({ 'Delivery_person_Ratings': ['mean', 'std'] }))
-            # mudança do nome das colunas
-            avaliacao_por_trafego.columns = ['delivery_mean', 'delivery_std']
-            # resetando o index
-            avaliacao_por_trafego = avaliacao_por_trafego.reset_index()
-            st.dataframe( avaliacao_por_trafego )
+            add_panel( paineis, 'ratings_by_traffic', st.empty(), memoize, show_ratings,
+                       run_query, 'ratings_by_traffic', state, key=state )
 
-            
             st.markdown( '##### Avaliação média por clima' )
-            avg_por_clima = ( df1.loc[:, ['Delivery_person_Ratings', 'Weatherconditions']]
-                                 .groupby('Weatherconditions')
-                                 .agg({ 'Delivery_person_Ratings': ['mean', 'std'] }))
-
-            # troca nome das colunas
-            avg_por_clima.columns = ['delivery_mean', 'delivery_std']
-            # reseta o index
-            avg_por_clima.reset_index()
-            st.dataframe( avg_por_clima )
+            add_panel( paineis, 'ratings_by_weather', st.empty(), memoize, show_ratings,
+                       run_query, 'ratings_by_weather', state, key=state )
 
     with st.container():
         st.markdown( """---""" )
         st.title( 'Velocidade de Entregas' )
         
+        col1, col2 = st.columns( 2 )
+        with col1:
+            top_k = st.number_input( 'Entregadores por cidade', min_value=1, max_value=100, value=TOP_K )
+        with col2:
+            metrica = st.selectbox( 'Métrica do ranking', RANK_METRICS )
+
+        # Ranking de cada cidade calculado pelo backend de consultas ( k e métrica na chave do cache )
         col1, col2 = st.columns( 2 )
         
         with col1:
             st.markdown( '##### Top Entregadores mais rápidos' )
-            df3 = top_delivers( df1, top_asc=True )
-            st.dataframe( df3 )
+            add_panel( paineis, 'top_fastest', st.empty(), memoize, show_fastest,
+                       run_query, 'top_fastest', state, key=state, k=int( top_k ), metric=metrica )
             
         with col2:
             st.markdown( '##### Top Entregadores mais lentos' )
-            f3 = top_delivers( df1, top_asc=False )
-            st.dataframe( df3 )
-            
-        
-            
\ No newline at end of file
+            add_panel( paineis, 'top_slowest', st.empty(), memoize, show_slowest,
+                       run_query, 'top_slowest', state, key=state, k=int( top_k ), metric=metrica )
+
+render_panels( paineis )
+
+with leaderboard_container:
+    # Filtros de data ( busca binária ) e de trânsito ( bitmaps ), usados pelos perfis:
+    # só as colunas do update_profiles são copiadas
+    with span( 'load_filter_index' ):
+        filter_index = load_filter_index()
+    df1 = filter_orders( filter_index, date_slider, columns=PROFILE_COLUMNS, Road_traffic_density=traffic_options )
+
+    # Sem filtros ativos o store mantido pelo append_orders é usado direto
+    if len( df1 ) == len( filter_index['df'] ):
+        profiles = load_profiles()
+    else:
+        profiles = memoize( build_profiles, df1, key=state )
+
+    ordenar_por = st.selectbox( 'Ordenar por', list( METRICS ), index=list( METRICS ).index( 'rating_mean' ) )
+    paginas = max( int( np.ceil( len( profiles['ids'] ) / PAGE_SIZE ) ), 1 )
+    pagina = st.number_input( 'Página ( de {} )'.format( paginas ), min_value=1, max_value=paginas, value=1 )
+    df_pagina, _ = leaderboard( profiles, by=ordenar_por, ascending=ordenar_por.startswith( 'time' ),
+                                page=int( pagina ) - 1 )
+    with span( 'render', chart='leaderboard' ):
+        st.dataframe( df_pagina )
+
+    entregador = st.text_input( 'Buscar entregador ( Delivery_person_ID )' )
+    if entregador:
+        perfil = courier_profile( profiles, entregador )
+        if perfil is None:
+            st.warning( 'Entregador não encontrado' )
+        else:
+            st.json( perfil )
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#     Debug ( só com a instrumentação ligada )
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+trace = finish_rerun( trace, state=state )
+if trace is not None:
+    debug_panel( st.sidebar.expander( 'Debug: perfil do rerun' ), trace )
@@ -1,10 +1,7 @@
 
 # Bibliotecas
-import folium
-import re
 import plotly.express as px
 import plotly.graph_objects as go
-from haversine import haversine
 
 # Bibliotecas necessárias
 import pandas as pd
@@ -12,56 +9,63 @@ import numpy as np
 import streamlit as st
 from PIL import Image
 
-from streamlit_folium import folium_static
+from core.cache import filter_state, memoize
+from core.charts import figure_html, show_figure, show_table
+from core.data import pin_session
+from core.profiling import PROFILE_ENABLED, debug_panel, finish_rerun, start_rerun
+from core.query import query_error_bounds, run_query
+from core.render import add_panel, render_panels
 
 st.set_page_config( page_title='VIsão Restaurantes', page_icon='Restaurante', layout='wide')
 
+# Instrumentação opcional ( core/profiling.py ): CURRY_PROFILE=1 no servidor ou ?debug=1 na URL
+trace = start_rerun( 'visao_restaurantes', enabled=PROFILE_ENABLED or st.experimental_get_query_params().get( 'debug' ) == ['1'] )
+
+# Versão do dataset fixa durante o rerun ( core/data.py ): um csv novo aparece na próxima interação
+pin_session( st.session_state )
+
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 # Funções
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 
 # O tempo médio e o desvio padrão de entrega por cidade e tipo de tráfego.
-def avg_std_time_on_traffic( df1 ):
-    cols = ['Time_taken(min)', 'City', 'Road_traffic_density']
-    df_aux = (df1.loc[:, cols]
-                 .groupby(['City', 'Road_traffic_density'])
-                 .agg( { 'Time_taken(min)': ['mean', 'std'] } ))
-
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
+def avg_std_time_on_traffic( state ):
+    df_aux = run_query( 'time_by_city_traffic', state )
+    df_aux = df_aux.rename( columns={ 'mean': 'avg_time', 'std': 'std_time' } )
 
     # Gráfico de pizza
     fig = px.sunburst(df_aux, path=['City', 'Road_traffic_density'], values='avg_time',
                       color='std_time', color_continuous_scale='RdBu',
                       color_continuous_midpoint=np.average(df_aux['std_time']))
-    return fig
+    return figure_html( fig )
 
-def avg_std_time_graph( df1 ):
+def avg_std_time_graph( state ):
                 # O tempo médio e o desvio padrão de entrega por cidade.
-                df_aux = (df1.loc[:, ['Time_taken(min)', 'City']]
-                             .groupby('City')
-                             .agg( { 'Time_taken(min)': ['mean', 'std'] } ))
-                df_aux.columns = ['avg_time', 'std_time']
-                df_aux = df_aux.reset_index()
+                df_aux = run_query( 'time_by_city', state )
+                df_aux = df_aux.rename( columns={ 'mean': 'avg_time', 'std': 'std_time' } )
+
+                # Tempo p90 por cidade ( sketches dos rollups no backend pandas )
+                df_p90 = run_query( 'delivery_quantiles_by_city', state )
 
-                # Gráfico de barras com desvio padrão
+                # Gráfico de barras com desvio padrão e marcador do p90
                 fig = go.Figure()
                 fig.add_trace( go.Bar( name='Control', 
                                         x=df_aux['City'],
                                         y=df_aux['avg_time'], 
                                         error_y=dict(type='data', 
                                         array=df_aux['std_time']) ) )
+                fig.add_trace( go.Scatter( name='p90', x=df_p90['City'], y=df_p90['time_p90'], mode='markers' ) )
                 fig = fig.update_layout(barmode='group')
 
-                return fig
+                return figure_html( fig )
 
-def avg_std_time_delivery(df1, festival, op):
+def avg_std_time_delivery(state, festival, op):
     """
         Essa função calcula o tempo médio e o desvio padrão do tempo de entrega.
         Parâmetros:
         Input:
-            - df: Dataframe com os dados necessário para o cálculo
+            - state: Estado dos filtros ( filter_state )
             - op: Tipo de operações que precisa ser calculado
                 'avg_time': Calcula o tempo médio
                 'std_time': Calcula o desvio padrão do tempo
@@ -69,105 +73,123 @@ def avg_std_time_delivery(df1, festival, op):
             - df: Dataframe com 2 colunas e 1 lina
     """
 
-    df_aux = (df1.loc[:, ['Time_taken(min)', 'Festival']]
-                 .groupby('Festival')
-                 .agg( {'Time_taken(min)': ['mean', 'std']} ))
-
-    df_aux.columns = ['avg_time', 'std_time']
-    df_aux = df_aux.reset_index()
+    df_aux = run_query( 'time_by_festival', state )
+    df_aux = df_aux.rename( columns={ 'mean': 'avg_time', 'std': 'std_time' } )
 
     linhas_selecionadas = df_aux['Festival'] == festival
-    df_aux = np.round( df_aux.loc[linhas_selecionadas, 'avg_time'], 2)
+    df_aux = np.round( df_aux.loc[linhas_selecionadas, op], 2)
     
     return df_aux
 
-def distance( df1, fig ): 
+def delivery_quantiles( state ):
+    """
+        Essa função retorna os quantis de tempo e distância das entregas e a precisão deles
+
+        Sequência de passos:
+        1. Consulta p50, p90 e p99 do tempo e da distância ( delivery_quantiles )
+        2. Monta o texto de ajuda das métricas com o erro de posto dos sketches ( 0 quando exatos )
+
+        Input: Estado dos filtros ( filter_state )
+        Output: Tupla ( dicionário coluna -> valor, texto de ajuda )
+    """
+    df_aux = run_query( 'delivery_quantiles', state )
+    erro = query_error_bounds()['quantile']
+    ajuda = ( 'Aproximado ( KLL ): posto com erro de até {:.1%}'.format( erro ) if erro
+              else 'Exato' )
+
+    return df_aux.iloc[0].round( 2 ).to_dict(), ajuda
+
+def distance( state, fig ):
+    """
+        Essa função usa a coluna distance ( calculada uma única vez no clean_code )
+
+        Input:
+            - state: Estado dos filtros ( filter_state )
+            - fig: False retorna a distância média, True retorna o gráfico por cidade
+        Output: Distância média ou Graphic Pie ( HTML, figure_html )
+    """
     if fig == False:
         # Distância média das entregas
-        cols = ['Delivery_location_latitude', 'Delivery_location_longitude', 
-                'Restaurant_latitude', 'Restaurant_longitude']
-        df1['distance'] = df1.loc[:, cols].apply( lambda x: 
-                            haversine( 
-                                (x['Restaurant_latitude'], x['Restaurant_longitude']), 
-                                (x['Delivery_location_latitude'], x['Delivery_location_longitude']) ), axis=1 )
-        avg_distance = np.round( df1['distance'].mean(), 2 )
+        avg_distance = np.round( run_query( 'avg_distance', state )['distance'].iloc[0], 2 )
 
         return avg_distance
     else:
-        # Tempo médio de entrega por cidade
-        cols = ['Delivery_location_latitude', 'Delivery_location_longitude',
-                'Restaurant_latitude', 'Restaurant_longitude']
-        df1['distance'] = df1.loc[:, cols].apply( lambda x: 
-                        haversine( 
-                            (x['Restaurant_latitude'], x['Restaurant_longitude']), 
-                            (x['Delivery_location_latitude'], x['Delivery_location_longitude']) ), axis=1 )
-        # Calculo da média
-        avg_distance = df1.loc[:, ['City', 'distance']].groupby( 'City' ).mean().reset_index()
+        # Distância média por cidade
+        avg_distance = run_query( 'distance_by_city', state )
         fig = go.Figure( data=[ go.Pie( labels=avg_distance['City'], 
                                         values=avg_distance['distance'], 
                                         pull=[0, 0.1, 0] ) ] )
-        return fig
-        
-            
-def clean_code( df1 ):
+        return figure_html( fig )
+
+def distinct_label( rotulo ):
     """
-        Esta função tem a responsabilidade de limpar o dataframe
-        
-        Tipos de limpeza
-        1. Remoção dos dados NaN
-        2. Mudança do tipo da coluna de dados
-        3. Reoção dos espaços das variáveis de texo
-        4. Formatação da coluna de datas
-        5. Lipeza da coluna de tempo ( remoção do texto da variável numérica )
-        
-        Input: Dataframe
-        Output: Dataframe     
+        Essa função marca o rótulo de uma contagem de distintos quando ela é aproximada
+
+        Input: Rótulo da métrica
+        Output: Rótulo, com o erro típico dos sketches ( CURRY_SKETCHES=approx no backend pandas )
     """
-    
-    # 1. Convertendo a coluna Age de texto para número
-    linhas_selecionadas = df1['Delivery_person_Age'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
+    erro = query_error_bounds()['distinct']
+
+    return '{} ( aprox. ±{:.1%} )'.format( rotulo, erro ) if erro else rotulo
 
-    df1['Delivery_person_Age'] = df1['Delivery_person_Age'].astype( int )
+def overall_metrics( state ):
+    """
+        Essa função calcula as métricas da primeira linha da página
+
+        Input: Estado dos filtros ( filter_state )
+        Output: Lista de tuplas ( rótulo, valor ), na ordem das colunas
+    """
+    return [( distinct_label( 'Entregadores únicos' ), run_query( 'unique_couriers', state )['couriers'].iloc[0] ),
+            ( 'A distância média das entregas', memoize( distance, state, fig=False, key=state ) ),
+            ( 'Tempo médio de Entrega c/ Festival', memoize( avg_std_time_delivery, state, 'Yes', 'avg_time', key=state ) ),
+            ( 'Desvio padrão médio de entrega c/ Festival', memoize( avg_std_time_delivery, state, 'Yes', 'std_time', key=state ) ),
+            ( 'Tempo médio de Entrega c/ Festival', memoize( avg_std_time_delivery, state, 'No', 'avg_time', key=state ) ),
+            ( 'Desvio padrão médio de entrega c/ Festival', memoize( avg_std_time_delivery, state, 'No', 'std_time', key=state ) )]
+
+def quantile_metrics( state ):
+    """
+        Essa função calcula as métricas de restaurantes e quantis da segunda linha da página
 
-    # 2. Convertendo a coluna Ratings de texto para número decimal (float) 
-    df1['Delivery_person_Ratings'] = df1['Delivery_person_Ratings'].astype( float )
+        Input: Estado dos filtros ( filter_state )
+        Output: Tupla ( lista de tuplas ( rótulo, valor ), texto de ajuda dos quantis )
+    """
+    # Restaurantes únicos ( prefixo do ID do entregador )
+    restaurant_uniques = run_query( 'unique_couriers', state )['restaurants'].iloc[0]
+    quantis, ajuda = memoize( delivery_quantiles, state, key=state )
 
-    # 3. Convertendo a coluna order_date de texto para data
-    df1['Order_Date'] = pd.to_datetime( df1['Order_Date'], format='%d-%m-%Y')
+    return [( distinct_label( 'Restaurantes únicos' ), restaurant_uniques ),
+            ( 'Tempo de entrega p50', quantis['time_p50'] ),
+            ( 'Tempo de entrega p90', quantis['time_p90'] ),
+            ( 'Tempo de entrega p99', quantis['time_p99'] ),
+            ( 'Distância p90', quantis['distance_p90'] )], ajuda
 
-    # 4. Convertendo multiple_deliveries de texto para numero inteiro 9( int )
-    linhas_selecionadas = df1['multiple_deliveries'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
-    df1['multiple_deliveries'] = df1['multiple_deliveries'].astype( int )
+def time_by_city_order( state ):
+    df_aux = run_query( 'time_by_city_order', state )
+    return df_aux.rename( columns={ 'mean': 'avg_mean', 'std': 'avg_std' } ).drop( columns='count' )
 
-    # Removendo linhas NaN
-    linhas_selecionadas = df1['Road_traffic_density'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
+def show_metrics( placeholder, metricas ):
+    """
+        Essa função mostra uma linha de métricas no placeholder de um painel
 
-    linhas_selecionadas = df1['City'] != 'NaN '
-    df1 = df1.loc[linhas_selecionadas, :].copy()
+        Input: Placeholder ( st.empty() ) e lista de tuplas ( rótulo, valor )
+        Output: None
+    """
+    colunas = placeholder.container().columns( len( metricas ) )
+    for col, ( rotulo, valor ) in zip( colunas, metricas ):
+        col.metric( rotulo, valor )
 
-    # inserindo a coluna semana no data frame
-    df1['week_of_year'] = df1['Order_Date'].dt.strftime( '%U')
+def show_quantiles( placeholder, resultado ):
+    metricas, ajuda = resultado
+    # a ajuda ( precisão dos sketches ) vale só para os quantis
+    colunas = placeholder.container().columns( len( metricas ) )
+    for i, ( col, ( rotulo, valor ) ) in enumerate( zip( colunas, metricas ) ):
+        col.metric( rotulo, valor, help=ajuda if i > 0 else None )
 
-    # 5. Removendo os espaços deentro de strings/texto/object
-    # df1 = df1.reset_index( drop=True )
-    # for i in range( len( df1 )):
-    #  df1.loc[i, 'ID'] = df1.loc[i, 'ID'].strip()
+def show_chart( placeholder, html ):
+    show_figure( placeholder, html, use_container_width=False )
 
-    df1.loc[:, 'ID'] = df1.loc[:, 'ID'].str.strip()
-    df1.loc[:, 'Road_traffic_density'] = df1.loc[:, 'Road_traffic_density'].str.strip()
-    df1.loc[:, 'Type_of_order'] = df1.loc[:, 'Type_of_order'].str.strip()
-    df1.loc[:, 'Type_of_vehicle'] = df1.loc[:, 'Type_of_vehicle'].str.strip()
-    df1.loc[:, 'City'] = df1.loc[:, 'City'].str.strip()
-    df1.loc[:, 'Festival'] = df1.loc[:, 'Festival'].str.strip()
-    
-    # Limpando a coluna de time taken
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].apply( lambda x: x.split( '(min)' )[1] )
-    df1['Time_taken(min)'] = df1['Time_taken(min)'].astype( int )
-    
-    return df1
+def show_time_table( placeholder, df_aux ):
+    show_table( placeholder, df_aux, key='time_by_city_order' )
 
 # _-_-_-_-_-_- Inicío da Estrutura lógica do código _-_-_-_-_-_-
 
@@ -175,13 +197,8 @@ def clean_code( df1 ):
 # Import dataset
 # =-=-=-=-=-=-=-=-=-==-=-=-=-=
 
-df = pd.read_csv( 'train.csv' )
-
-# =-=-=-=-=-=-=-=-=-==-=-=-=-=
-# Limpando os dados
-# =-=-=-=-=-=-=-=-=-==-=-=-=-=
-
-df1 = clean_code( df )
+# As consultas rodam no backend de core/query.py ( duckdb, ou pandas como referência ),
+# sobre o dataset limpo uma única vez por versão ( core/data.py )
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 #     Barra Lateral
@@ -218,13 +235,8 @@ traffic_options = st.sidebar.multiselect(
 st.sidebar.markdown( """___""" )
 st.sidebar.markdown( '### Powered by Comunidade DS' )
 
-# Filtro Data
-linhas_selecionadas = df1['Order_Date'] < date_slider
-df1 = df1.loc[linhas_selecionadas, :]
-
-# Filtro de traânsito
-linhas_selecionadas = df1['Road_traffic_density'].isin( traffic_options )
-df1 = df1.loc[linhas_selecionadas, :]
+# Chave dos resultados em cache ( core/cache.py ) e filtros das consultas ( predicados )
+state = filter_state( date_slider, traffic_options )
 
 # =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
 #     Layout no Streamlit
@@ -232,56 +244,42 @@ df1 = df1.loc[linhas_selecionadas, :]
 
 tab1, tab2, tab3 = st.tabs( ['Visão Gerencial', '_', '_'] )
 
+# Painéis calculados em paralelo e desenhados assim que ficam prontos ( core/render.py )
+paineis = []
+
 with tab1:
     with st.container():
-        col1, col2, col3, col4, col5, col6 = st.columns( 6 )
-        with col1:
-            # Entregadores únicos do dataframe
-            delivery_person_uniques = len(df1.loc[:, 'Delivery_person_ID'].unique())
-            col1.metric( 'Entregadores únicos', delivery_person_uniques )
-             
-        with col2:
-            avg_distance = distance( df1, fig=False )
-            col2.metric( 'A distância média das entregas', avg_distance )
-
-        with col3:
-            df_aux = avg_std_time_delivery( df1, 'Yes', 'avg_time' )
-            col3.metric( 'Tempo médio de Entrega c/ Festival', df_aux )
-            
-        with col4:
-            df_aux = avg_std_time_delivery( df1, 'Yes', 'std_time' )
-            col4.metric( 'Desvio padrão médio de entrega c/ Festival', df_aux )
-
-        with col5:
-            df_aux = avg_std_time_delivery( df1, 'No', 'avg_time' )
-            col5.metric( 'Tempo médio de Entrega c/ Festival', df_aux )
-            
-        with col6:
-            df_aux = avg_std_time_delivery( df1, 'No', 'std_time' )
-            col6.metric( 'Desvio padrão médio de entrega c/ Festival', df_aux )
+        add_panel( paineis, 'overall_metrics', st.empty(), memoize, show_metrics, overall_metrics, state, key=state )
         
     with st.container():
-            # Tempo médio de entrega por cidade
-            avg_distance = distance( df1, fig=True )
-            st.plotly_chart( avg_distance )
+        add_panel( paineis, 'quantile_metrics', st.empty(), memoize, show_quantiles, quantile_metrics, state, key=state )
+
+    with st.container():
+        # Tempo médio de entrega por cidade
+        add_panel( paineis, 'distance', st.empty(), memoize, show_chart, distance, state, fig=True, key=state )
     
     with st.container():
         col1, col2 = st.columns( 2 )
         
         with col1:
-            fig = avg_std_time_graph( df1 )
-            st.plotly_chart( fig )
+            add_panel( paineis, 'avg_std_time_graph', st.empty(), memoize, show_chart,
+                       avg_std_time_graph, state, key=state )
             
         with col2:
             # O tempo médio e o desvio padrão de entrega por cidade e tipo de tráfego.
-            fig = avg_std_time_on_traffic( df1 )
-            st.plotly_chart( fig )
+            add_panel( paineis, 'avg_std_time_on_traffic', st.empty(), memoize, show_chart,
+                       avg_std_time_on_traffic, state, key=state )
 
     with st.container():
-        cols = ['Time_taken(min)', 'City', 'Type_of_order']
-        df_aux = df1.loc[:, cols].groupby(['City', 'Type_of_order']).agg( { 'Time_taken(min)': ['mean', 'std'] } )
+        add_panel( paineis, 'time_by_city_order', st.empty(), memoize, show_time_table, time_by_city_order, state, key=state )
 
-        df_aux.columns = ['avg_mean', 'avg_std']
-        df_aux = df_aux.reset_index()
-        
-        st.dataframe( df_aux )
+render_panels( paineis )
+
+
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+#     Debug ( só com a instrumentação ligada )
+# =-=-=-=-=-=-=-=-=-=-=-=-=-=-=
+
+trace = finish_rerun( trace, state=state )
+if trace is not None:
+    debug_panel( st.sidebar.expander( 'Debug: perfil do rerun' ), trace )
@@ -0,0 +1,17 @@
+# Bibliotecas necessárias
+import pytest
+
+from benchmarks.synthetic import synthetic_csv
+from core.data import clean_code, read_raw
+
+
+@pytest.fixture( scope='session' )
+def dataset( tmp_path_factory ):
+    # Pedidos entre dois anos: as semanas ISO 2021-52 e 2022-01 não podem se juntar
+    return synthetic_csv( 20_000, str( tmp_path_factory.mktemp( 'dados' ) / 'train.csv' ),
+                          start_date='2021-12-13', days=40 )
+
+
+@pytest.fixture( scope='session' )
+def df1( dataset ):
+    return clean_code( read_raw( dataset ) )
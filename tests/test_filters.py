@@ -0,0 +1,43 @@
+"""
+    Filtros da barra lateral ( core/filters.py ): posições, views e colunas copiadas
+"""
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.filters import build_filter_index, filter_orders, filter_positions
+
+CORTE = pd.Timestamp( 2022, 1, 4 )
+
+
+@pytest.fixture( scope='module' )
+def index( df1 ):
+    return build_filter_index( df1 )
+
+
+def test_positions_match_mask( index, df1 ):
+    linhas = filter_positions( index, CORTE, Road_traffic_density=['Jam', 'Low'] )
+    mascara = ( df1['Order_Date'] < CORTE ) & df1['Road_traffic_density'].isin( ['Jam', 'Low'] )
+    assert np.array_equal( linhas, np.flatnonzero( mascara.to_numpy() ) )
+
+    # sem descarte antes do corte: só o corte da data
+    tudo = filter_positions( index, CORTE, Road_traffic_density=list( df1['Road_traffic_density'].unique() ) )
+    assert tudo == slice( 0, int( ( df1['Order_Date'] < CORTE ).sum() ) )
+
+
+def test_only_requested_columns_are_copied( index, df1 ):
+    colunas = ['City', 'Delivery_person_ID', 'Time_taken(min)']
+    parcial = filter_orders( index, CORTE, columns=colunas + ['City'], Road_traffic_density=['Jam'] )
+    completo = filter_orders( index, CORTE, Road_traffic_density=['Jam'] )
+
+    assert list( parcial.columns ) == colunas
+    pd.testing.assert_frame_equal( parcial, completo[colunas] )
+
+    # sem descarte o resultado é uma view com todas as colunas
+    view = filter_orders( index, CORTE, columns=colunas )
+    assert list( view.columns ) == list( df1.columns )
+    assert np.shares_memory( view['Time_taken(min)'].to_numpy(), df1['Time_taken(min)'].to_numpy() )
+
+    with pytest.raises( KeyError ):
+        filter_orders( index, CORTE, columns=['coluna'], Road_traffic_density=['Jam'] )
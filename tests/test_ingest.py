@@ -0,0 +1,60 @@
+"""
+    Lotes anexados com o append_orders ( core/data.py ): deduplicação pelos IDs do
+    csv e estruturas derivadas gravadas para a nova versão ( core/storage.py )
+"""
+# Bibliotecas necessárias
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_csv
+from core import cube, data
+from core.cube import load_cube
+from core.data import append_orders, dataset_version, load_data
+
+
+@pytest.fixture
+def base( tmp_path ):
+    # 2000 pedidos no dataset e os 500 seguintes no lote
+    linhas = pd.read_csv( synthetic_csv( 2_500, str( tmp_path / 'fonte.csv' ) ), dtype=str, keep_default_na=False )
+    path = str( tmp_path / 'train.csv' )
+    linhas.iloc[:2_000].to_csv( path, index=False )
+
+    lote = linhas.iloc[2_000:].copy()
+    # uma linha que o clean_code descarta e uma que já está no dataset
+    lote.iloc[0, lote.columns.get_loc( 'City' )] = data.NA_SENTINEL
+    lote = pd.concat( [lote, linhas.iloc[:1]] )
+    lote.to_csv( str( tmp_path / 'lote.csv' ), index=False )
+
+    yield path, str( tmp_path / 'lote.csv' )
+    data._stores.pop( path, None )
+
+
+def test_dropped_rows_are_not_appended_again( base ):
+    path, lote = base
+    antes = len( load_data( path ) )
+
+    # as 500 linhas novas vão para o csv; só as que passam no clean_code contam
+    assert 0 < append_orders( lote, path ) < 500
+    assert len( load_data( path ) ) < antes + 500
+    tamanho = len( open( path ).read().splitlines() )
+    assert tamanho == 1 + 2_000 + 500
+
+    # reenviar o lote não anexa nada, nem a linha descartada pelo clean_code
+    assert append_orders( lote, path ) == 0
+    assert len( open( path ).read().splitlines() ) == tamanho
+
+
+def test_other_process_reads_updated_structures( base, monkeypatch ):
+    path, lote = base
+    load_cube( path )
+    n = len( load_data( path ) ) + append_orders( lote, path )
+    esperado = load_cube( path )
+    versao = dataset_version( path )
+
+    # outro processo: nada em memória e o cubo não pode ser reconstruído
+    data._stores.pop( path )
+    monkeypatch.setattr( cube, 'build_cube', lambda df1: pytest.fail( 'cubo reconstruído' ) )
+
+    assert dataset_version( path ) == versao
+    assert len( load_data( path ) ) == n
+    pd.testing.assert_frame_equal( load_cube( path ), esperado )
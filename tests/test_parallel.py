@@ -0,0 +1,84 @@
+"""
+    Paridade entre o cálculo serial e o particionado dos KPIs ( core/parallel.py )
+    e entre o backend pandas do run_query e o cálculo direto nas linhas
+"""
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import query
+from core.cache import filter_state
+from core.parallel import parallel_kpis, serial_kpis
+from core.stream import PARTIALS
+from core.topk import top_couriers
+
+TRAFFIC = ['High', 'Jam', 'Low', 'Medium']
+
+
+def assert_same_kpis( expected, got ):
+    assert expected.keys() == got.keys()
+    for name in expected:
+        a, b = expected[name], got[name]
+        if isinstance( a, pd.DataFrame ):
+            pd.testing.assert_frame_equal( a.reset_index( drop=True ), b.reset_index( drop=True ),
+                                           check_categorical=False, rtol=1e-9 )
+        else:
+            assert np.isclose( a, b, rtol=1e-9 ), name
+
+
+@pytest.mark.parametrize( 'by', ['date', 'City'] )
+@pytest.mark.parametrize( 'executor', ['thread', 'process'] )
+def test_parallel_matches_serial( df1, by, executor ):
+    assert_same_kpis( serial_kpis( df1 ), parallel_kpis( df1, workers=4, by=by, executor=executor ) )
+
+
+@pytest.mark.parametrize( 'parts', [( name, ) for name in PARTIALS] + [( 'cube', 'weekly_couriers' )] )
+def test_parts_match_full( df1, parts ):
+    completo = serial_kpis( df1 )
+    parcial = parallel_kpis( df1, workers=3, executor='thread', parts=parts )
+    assert parcial and set( parcial ) < set( completo )
+    assert_same_kpis( { name: completo[name] for name in parcial }, parcial )
+
+
+def test_weeks_match_rollups( dataset, df1 ):
+    kpis = parallel_kpis( df1, workers=3, executor='thread' )
+    state = filter_state( pd.Timestamp( 2100, 1, 1 ), TRAFFIC )
+    esperado = query.run_query( 'order_share_by_week', state, 'pandas', dataset )
+
+    semanas = kpis['orders_by_week']
+    assert semanas['week'].is_unique
+    assert semanas['week'].tolist() == esperado['week'].tolist()
+    assert semanas['count'].tolist() == esperado['orders'].tolist()
+    assert { 202152, 202201 } <= set( semanas['week'] )
+    # modo exato: entregadores distintos por semana ISO contados direto nas linhas
+    iso = df1['Order_Date'].dt.isocalendar()
+    distintos = df1.groupby( iso['year'] * 100 + iso['week'] )['Delivery_person_ID'].nunique()
+    assert kpis['order_share_by_week']['couriers'].tolist() == distintos.astype( float ).tolist()
+
+
+@pytest.mark.parametrize( 'traffic', [TRAFFIC, ['Jam'], []] )
+def test_pandas_backend_matches_rows( dataset, traffic ):
+    state = filter_state( pd.Timestamp( 2022, 1, 10 ), traffic )
+    linhas = query._frame( state, dataset )
+
+    extremos = query.run_query( 'extremes', state, 'pandas', dataset ).iloc[0]
+    assert np.array_equal( extremos.to_numpy( dtype=float ),
+                           np.array( [linhas['Delivery_person_Age'].min(), linhas['Delivery_person_Age'].max(),
+                                      linhas['Vehicle_condition'].min(), linhas['Vehicle_condition'].max()], dtype=float ),
+                           equal_nan=True )
+
+    media = query.run_query( 'avg_distance', state, 'pandas', dataset )['distance'].iloc[0]
+    # os KPIs somam em float64 ( a coluna é float32 )
+    assert np.isclose( media, linhas['distance'].astype( np.float64 ).mean(), rtol=1e-9, equal_nan=True )
+
+    por_cidade = query.run_query( 'distance_by_city', state, 'pandas', dataset )
+    direto = linhas['distance'].astype( np.float64 ).groupby( linhas['City'].astype( str ) ).mean()
+    assert por_cidade['City'].astype( str ).tolist() == direto.index.tolist()
+    assert np.allclose( por_cidade['distance'].to_numpy( dtype=float ), direto.to_numpy(), rtol=1e-9 )
+
+    for k in [3, query.TOP_N, query.TOP_N + 5]:
+        ranking = top_couriers( linhas, k=k )
+        for nome in ['fastest', 'slowest']:
+            pd.testing.assert_frame_equal( query.run_query( 'top_' + nome, state, 'pandas', dataset, k=k ).reset_index( drop=True ),
+                                           ranking[nome].reset_index( drop=True ), check_dtype=False, check_categorical=False )
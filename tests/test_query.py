@@ -0,0 +1,33 @@
+"""
+    Paridade entre os backends pandas e duckdb do run_query ( core/query.py )
+"""
+# Bibliotecas necessárias
+import pandas as pd
+import pytest
+
+from core import query
+from core.cache import filter_state
+
+TRAFFIC = ['High', 'Jam', 'Low', 'Medium']
+
+# Estados de filtro ( o dataset vai de 2021-12-13 a 2022-01-21 )
+STATES = {
+    'todos': filter_state( pd.Timestamp( 2100, 1, 1 ), TRAFFIC ),
+    'um_nivel': filter_state( pd.Timestamp( 2100, 1, 1 ), ['Jam'] ),
+    'sem_transito': filter_state( pd.Timestamp( 2100, 1, 1 ), [] ),
+    'virada_do_ano': filter_state( pd.Timestamp( 2022, 1, 4 ), ['High', 'Low', 'Medium'] ),
+}
+
+# Parâmetros extras: os rankings também rodam fora do caminho dos KPIs
+PARAMS = [( name, {} ) for name in query.QUERIES] + [
+    ( name, { 'k': query.TOP_N + 5, 'metric': 'distance' } ) for name in ['top_fastest', 'top_slowest']]
+
+
+@pytest.mark.skipif( query.duckdb is None, reason='duckdb não instalado' )
+@pytest.mark.parametrize( 'state', STATES.values(), ids=STATES.keys() )
+@pytest.mark.parametrize( 'name, params', PARAMS, ids=['{}{}'.format( n, '-' + p['metric'] if p else '' ) for n, p in PARAMS] )
+def test_backends_match( dataset, name, params, state ):
+    esperado = query.run_query( name, state, 'pandas', dataset, **params )
+    obtido = query.run_query( name, state, 'duckdb', dataset, **params )
+
+    pd.testing.assert_frame_equal( esperado, obtido, check_dtype=False, rtol=1e-5 )
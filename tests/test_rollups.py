@@ -0,0 +1,76 @@
+"""
+    Sketches dos rollups: só o backend pandas os usa, exatos por padrão e, no
+    modo approx, dentro dos limites de query_error_bounds
+"""
+# Bibliotecas
+import os
+
+# Bibliotecas necessárias
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import query, rollups
+from core.cache import filter_state
+
+STATE = filter_state( pd.Timestamp( 2022, 1, 10 ), ['High', 'Jam', 'Low', 'Medium'] )
+
+
+def _unique( dataset, backend ):
+    return query.run_query( 'unique_couriers', STATE, backend, dataset ).iloc[0]
+
+
+@pytest.mark.skipif( 'CURRY_SKETCHES' in os.environ, reason='modo dos sketches definido no ambiente' )
+def test_default_mode_is_exact( dataset ):
+    assert rollups.SKETCH_MODE == 'exact'
+    assert query.query_error_bounds( 'pandas', dataset ) == { 'distinct': 0.0, 'quantile': 0.0 }
+
+    linhas = query._frame( STATE, dataset )
+    assert _unique( dataset, 'pandas' )['couriers'] == linhas['Delivery_person_ID'].nunique()
+
+
+@pytest.mark.skipif( query.duckdb is None, reason='duckdb não instalado' )
+def test_duckdb_ignores_sketch_mode( dataset, monkeypatch ):
+    monkeypatch.setattr( rollups, 'SKETCH_MODE', 'approx' )
+    assert query.query_error_bounds( 'duckdb', dataset ) == { 'distinct': 0.0, 'quantile': 0.0 }
+
+    linhas = query._frame( STATE, dataset )
+    assert _unique( dataset, 'duckdb' )['couriers'] == linhas['Delivery_person_ID'].nunique()
+
+
+def test_approx_within_bounds( dataset, monkeypatch ):
+    monkeypatch.setattr( rollups, 'SKETCH_MODE', 'approx' )
+    limites = query.query_error_bounds( 'pandas', dataset )
+    assert limites['distinct'] > 0 and limites['quantile'] > 0
+
+    linhas = query._frame( STATE, dataset )
+    exato = linhas['Delivery_person_ID'].nunique()
+    assert abs( _unique( dataset, 'pandas' )['couriers'] / exato - 1 ) <= 4 * limites['distinct']
+
+    p90 = query.run_query( 'delivery_quantiles', STATE, 'pandas', dataset )['time_p90'].iloc[0]
+    # valores inteiros: o posto do p90 é um intervalo ( empates )
+    tempos = linhas['Time_taken(min)'].to_numpy()
+    folga = 2 * limites['quantile'] + 1 / len( tempos )
+    assert np.mean( tempos < p90 ) - folga <= 0.9 <= np.mean( tempos <= p90 ) + folga
+
+
+@pytest.mark.parametrize( 'valores', ['distintos', 'nulo'] )
+def test_codes_must_fit_cell_key( df1, valores ):
+    df_aux = df1.head( 300 ).copy()
+    if valores == 'distintos':
+        df_aux['City'] = pd.Categorical( ['cidade{}'.format( i ) for i in range( len( df_aux ) )] )
+    else:
+        df_aux['City'] = df_aux['City'].astype( object ).where( np.arange( len( df_aux ) ) > 0 )
+
+    with pytest.raises( ValueError, match='City' ):
+        rollups.build_rollups( df_aux, 'exact' )
+
+
+def test_exact_quantiles_match_rows( dataset ):
+    # no modo exact os valores repetidos viram contagens, sem mudar o quantil
+    esperado = query.run_query( 'delivery_quantiles', STATE, 'pandas', dataset ).iloc[0]
+    linhas = query._frame( STATE, dataset )
+    for col, prefixo in [( 'Time_taken(min)', 'time' ), ( 'distance', 'distance' )]:
+        valores = linhas[col].dropna().to_numpy( dtype=np.float64 )
+        for q in query.DELIVERY_QUANTILES:
+            assert np.isclose( esperado['{}_p{:g}'.format( prefixo, q * 100 )], np.quantile( valores, q ), rtol=1e-6 )